@@ -0,0 +1,133 @@
+"""
+Chunking benchmark: index size versus retrieval recall.
+
+Builds a synthetic corpus of text files with the paragraph shapes that
+hurt the old reader (one-line fragments and very long walls of text),
+plants one fact per query in it, and chunks the corpus with the legacy
+paragraph splitter and with the token-aware chunker at several sizes.
+Chunks are embedded with a local hashed TF-IDF model, truncated at the
+embedding model's input limit, so the run is free and deterministic.
+recall@k is the share of queries whose fact appears in one of the top k
+chunks.
+
+Usage:
+    python benchmarks/bench_chunking.py --documents 40 --sizes 200 400 800
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "src")]
+
+from embeddings.tokens import count_tokens  # noqa: E402
+from file_processing.chunker import chunk_segments  # noqa: E402
+from file_processing.txt_reader import iter_txt_segments, read_txt  # noqa: E402
+from benchmarks.stub_server import inverse_document_frequency, tfidf_embeddings  # noqa: E402
+
+VOCABULARY = (
+    "system pressure valve pump motor sensor filter cable panel housing bracket "
+    "inspect replace check clean adjust tighten measure record report install "
+    "daily weekly monthly annual routine scheduled manual automatic primary backup "
+    "left right upper lower front rear main auxiliary internal external"
+).split()
+
+
+def sentence(rng: random.Random) -> str:
+    words = [rng.choice(VOCABULARY) for _ in range(rng.randint(6, 24))]
+    return " ".join(words).capitalize() + "."
+
+
+def build_corpus(directory: str, documents: int, seed: int):
+    """Write synthetic documents and return the planted (question, fact) pairs"""
+    rng = random.Random(seed)
+    queries = []
+    for d in range(documents):
+        paragraphs = []
+        for p in range(rng.randint(20, 60)):
+            shape = rng.random()
+            if shape < 0.25:
+                # One-line fragment, e.g. a heading
+                paragraphs.append(" ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(2, 5))).title())
+            elif shape < 0.35:
+                # Wall of text without paragraph breaks
+                paragraphs.append(" ".join(sentence(rng) for _ in range(rng.randint(150, 400))))
+            else:
+                paragraphs.append(" ".join(sentence(rng) for _ in range(rng.randint(2, 8))))
+
+        for f in range(3):
+            part = f"part-{d}-{f}"
+            code = rng.randint(1000, 9999)
+            fact = f"The torque setting for {part} is {code} newton metres."
+            target = rng.randrange(len(paragraphs))
+            sentences = paragraphs[target].split(". ")
+            sentences.insert(rng.randrange(len(sentences) + 1), fact[:-1])
+            paragraphs[target] = ". ".join(sentences)
+            queries.append((f"What is the torque setting for {part}?", fact[:-1]))
+
+        with open(os.path.join(directory, f"manual-{d}.txt"), "w", encoding="utf-8") as file:
+            file.write("\n\n".join(paragraphs))
+    return queries
+
+
+def evaluate(chunks, queries, top_k: int) -> dict:
+    start = time.perf_counter()
+    idf = inverse_document_frequency(tfidf_embeddings(chunks))
+    vectors = tfidf_embeddings(chunks, idf)
+    query_vectors = tfidf_embeddings([question for question, _ in queries], idf)
+    scores = query_vectors @ vectors.T
+    top = np.argsort(-scores, axis=1)[:, :top_k]
+    hits = sum(
+        any(fact in chunks[index] for index in top[row])
+        for row, (_, fact) in enumerate(queries)
+    )
+    tokens = [count_tokens(chunk) for chunk in chunks]
+    return {
+        "chunks": len(chunks),
+        "avg_tokens": round(sum(tokens) / len(tokens), 1),
+        "max_tokens": max(tokens),
+        "over_8191_tokens": sum(1 for count in tokens if count > 8191),
+        # Float32 vectors at the production embedding size plus the stored text
+        "index_mb_3072d": round((len(chunks) * 3072 * 4 + sum(len(c.encode("utf-8")) for c in chunks)) / 2**20, 2),
+        f"recall_at_{top_k}": round(hits / len(queries), 3),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Chunking strategy benchmark")
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 400, 800])
+    parser.add_argument("--overlap", type=float, default=0.15, help="Overlap as a fraction of the chunk size")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        queries = build_corpus(directory, args.documents, args.seed)
+        files = sorted(os.path.join(directory, name) for name in os.listdir(directory))
+
+        legacy = [chunk for path in files for chunk in read_txt(path)]
+        results["legacy_paragraphs"] = evaluate(legacy, queries, args.top_k)
+
+        for size in args.sizes:
+            overlap = int(size * args.overlap)
+            chunks = [
+                text
+                for path in files
+                for text, _ in chunk_segments(iter_txt_segments(path), size, overlap)
+            ]
+            results[f"tokens_{size}_overlap_{overlap}"] = evaluate(chunks, queries, args.top_k)
+
+    print(json.dumps({"documents": args.documents, "queries": len(queries), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Concurrency benchmark for /api/query and /api/chat.
+
+Serves the API with uvicorn on a local port, backed by the stub Azure
+OpenAI server and a temporary embedded Qdrant collection, then fires N
+concurrent requests.
+With a non-blocking request path the wall time of the concurrent run
+should be close to the latency of a single request, not N times it.
+With --stream the answers are requested as server-sent events and the
+time to the first answer token is reported as well.
+
+Usage:
+    python benchmarks/bench_concurrency.py --concurrency 20 --completion-latency 0.5
+    python benchmarks/bench_concurrency.py --stream --completion-latency 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def configure_environment(stub_url: str, data_dir: str) -> None:
+    """Point the app at the stub server and throwaway storage; must run before importing config"""
+    os.environ.update({
+        "LLM_PROVIDER": "azure",
+        "AZURE_OPENAI_ENDPOINT": stub_url,
+        "AZURE_OPENAI_API_KEY": "stub",
+        "QDRANT_PATH": os.path.join(data_dir, "qdrant"),
+        "MANIFEST_PATH": os.path.join(data_dir, "manifest.sqlite3"),
+        "EMBEDDING_CACHE_PATH": os.path.join(data_dir, "embeddings.sqlite3"),
+        "WATCH_DIRECTORY": os.path.join(data_dir, "documents"),
+    })
+    sys.path[:0] = [ROOT, os.path.join(ROOT, "src")]
+
+
+def serve_app(app):
+    """Run an ASGI app with uvicorn in a background thread and return the server"""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def run(concurrency: int, endpoint: str, stream: bool = False) -> dict:
+    import httpx
+    from fastapi import FastAPI
+
+    from api.endpoints import router as api_router
+    from benchmarks.stub_server import fake_embedding
+    from config import VECTOR_SIZE
+    from database.qdrant_client import QdrantDB
+
+    # Seed a small collection to search
+    db = QdrantDB()
+    texts = [f"Section {i}: maintenance procedure for part P-{1000 + i}." for i in range(200)]
+    db.add_texts(
+        texts,
+        [fake_embedding(text, VECTOR_SIZE) for text in texts],
+        [{"source": f"manual-{i // 20}.txt", "title": f"manual-{i // 20}.txt", "chunk_id": i} for i in range(len(texts))]
+    )
+
+    app = FastAPI()
+    app.include_router(api_router, prefix="/api")
+    # A real server rather than an in-process transport, which would buffer streamed responses
+    server = serve_app(app)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    def payload(i: int) -> dict:
+        question = f"How do I service part P-{1000 + i}? (request {i})"
+        if endpoint == "chat":
+            return {"messages": [{"role": "user", "content": question}], "top_k": 5, "stream": stream}
+        return {"query": question, "top_k": 5, "stream": stream}
+
+    first_tokens = []
+
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+        async def timed_request(i: int) -> float:
+            start = time.perf_counter()
+            if not stream:
+                response = await client.post(f"/api/{endpoint}", json=payload(i))
+                response.raise_for_status()
+                return time.perf_counter() - start
+
+            first_token = None
+            async with client.stream("POST", f"/api/{endpoint}", json=payload(i)) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line == "event: token" and first_token is None:
+                        first_token = time.perf_counter() - start
+                    elif line == "event: error":
+                        raise RuntimeError(f"Request {i} failed")
+            if i >= 0:
+                first_tokens.append(first_token)
+            return time.perf_counter() - start
+
+        # Warm up connections and measure a single request on its own
+        await timed_request(-1)
+        single = await timed_request(-2)
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(timed_request(i) for i in range(concurrency)))
+        wall = time.perf_counter() - start
+
+    server.should_exit = True
+    results = {
+        "endpoint": f"/api/{endpoint}",
+        "concurrency": concurrency,
+        "single_request_seconds": round(single, 4),
+        "concurrent_wall_seconds": round(wall, 4),
+        "slowest_request_seconds": round(max(latencies), 4),
+        "sum_of_latencies_seconds": round(sum(latencies), 4),
+        # 1.0 means fully concurrent, `concurrency` means fully serialized
+        "wall_over_single": round(wall / single, 2),
+    }
+    if stream:
+        first_tokens.sort()
+        results["median_time_to_first_token_seconds"] = round(first_tokens[len(first_tokens) // 2], 4)
+        results["slowest_time_to_first_token_seconds"] = round(first_tokens[-1], 4)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Concurrent query/chat benchmark against a stub model API")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--endpoint", choices=["query", "chat"], default="chat")
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--completion-latency", type=float, default=0.5)
+    parser.add_argument("--stream", action="store_true", help="Request server-sent events and report time to first token")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from benchmarks.stub_server import serve
+
+    server = serve(embedding_latency=args.embedding_latency, completion_latency=args.completion_latency)
+    with tempfile.TemporaryDirectory() as data_dir:
+        configure_environment(f"http://127.0.0.1:{server.server_port}", data_dir)
+        results = asyncio.run(run(args.concurrency, args.endpoint, args.stream))
+    server.shutdown()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
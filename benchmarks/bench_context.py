@@ -0,0 +1,166 @@
+"""
+Context packing benchmark: prompt tokens, fact coverage and answer latency.
+
+Builds the synthetic manuals of the chunking benchmark, adds near-duplicate
+revisions of each one (the same pages with a new revision line, like
+re-issued manuals), chunks everything with the token-aware chunker and
+retrieves the top k chunks per question with the hashed TF-IDF model.
+Each question's chunks are turned into a prompt context twice: verbatim,
+as before, and packed by ContextBuilder. The answer is then generated
+through the stub Azure OpenAI server, whose time to answer grows with the
+prompt length (--prompt-latency-per-1k-tokens), so the latency column
+shows what the saved tokens are worth with a prefill-bound model.
+fact_in_context is the share of questions whose planted fact made it into
+the context.
+
+Usage:
+    python benchmarks/bench_context.py --documents 20 --revisions 2 --top-k 10
+    python benchmarks/bench_context.py --budgets 1000 2000 3000 --prompt-latency-per-1k-tokens 0.3
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "src")]
+
+from benchmarks.bench_chunking import build_corpus  # noqa: E402
+from benchmarks.bench_concurrency import configure_environment  # noqa: E402
+from benchmarks.stub_server import inverse_document_frequency, serve, tfidf_embeddings  # noqa: E402
+
+
+def add_revisions(directory: str, revisions: int, seed: int) -> None:
+    """Write near-duplicate copies of every manual with a revision line on top"""
+    rng = random.Random(seed)
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), encoding="utf-8") as file:
+            text = file.read()
+        stem, extension = os.path.splitext(name)
+        for revision in range(1, revisions + 1):
+            header = f"Revision {revision}, issued {2020 + revision}-{rng.randint(1, 12):02d}."
+            with open(os.path.join(directory, f"{stem}-rev{revision}{extension}"), "w", encoding="utf-8") as file:
+                file.write(f"{header}\n\n{text}")
+
+
+def load_chunks(directory: str):
+    from file_processing.chunker import chunk_segments
+    from file_processing.txt_reader import iter_txt_segments
+
+    chunks = []
+    for name in sorted(os.listdir(directory)):
+        for chunk_id, (text, metadata) in enumerate(chunk_segments(iter_txt_segments(os.path.join(directory, name)))):
+            chunks.append({
+                "text": text,
+                "metadata": {"source": name, "title": name, "chunk_id": chunk_id, "page": metadata.get("page")},
+            })
+    return chunks
+
+
+def retrieve(chunks, queries, top_k: int):
+    """Top k chunks per question, best first, with their similarity as score"""
+    texts = [chunk["text"] for chunk in chunks]
+    idf = inverse_document_frequency(tfidf_embeddings(texts))
+    scores = tfidf_embeddings([question for question, _ in queries], idf) @ tfidf_embeddings(texts, idf).T
+    results = []
+    for row in scores:
+        top = np.argsort(-row)[:top_k]
+        results.append([{**chunks[index], "score": float(row[index])} for index in top])
+    return results
+
+
+async def answer_latency(model, queries, contexts) -> list:
+    latencies = []
+    for (question, _), context in zip(queries, contexts):
+        model._format_context = lambda docs, context=context: context
+        start = time.perf_counter()
+        await model.aquery(question, [])
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def summarize(queries, contexts, latencies) -> dict:
+    from embeddings.tokens import count_tokens
+
+    tokens = np.array([count_tokens(context) for context in contexts])
+    milliseconds = np.array(latencies) * 1000
+    return {
+        "avg_context_tokens": round(float(tokens.mean()), 1),
+        "max_context_tokens": int(tokens.max()),
+        "fact_in_context": round(sum(fact in context for (_, fact), context in zip(queries, contexts)) / len(queries), 3),
+        "answer_p50_ms": round(float(np.percentile(milliseconds, 50)), 1),
+        "answer_p99_ms": round(float(np.percentile(milliseconds, 99)), 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Context packing benchmark")
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--revisions", type=int, default=2, help="Near-duplicate copies of every manual")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=30, help="Questions to generate answers for")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[1500, 3000])
+    parser.add_argument("--completion-latency", type=float, default=0.2)
+    parser.add_argument("--prompt-latency-per-1k-tokens", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        stub = serve(
+            embedding_latency=0.0,
+            completion_latency=args.completion_latency,
+            prompt_latency_per_1k_tokens=args.prompt_latency_per_1k_tokens
+        )
+        configure_environment(f"http://127.0.0.1:{stub.server_port}", directory)
+        from models.context import ContextBuilder, format_passages
+        from models.gpt4 import DocumentQueryModel
+
+        corpus = os.path.join(directory, "corpus")
+        os.makedirs(corpus)
+        queries = build_corpus(corpus, args.documents, args.seed)
+        add_revisions(corpus, args.revisions, args.seed)
+        chunks = load_chunks(corpus)
+        rng = random.Random(args.seed)
+        queries = rng.sample(queries, min(args.queries, len(queries)))
+        retrieved = retrieve(chunks, queries, args.top_k)
+
+        model = DocumentQueryModel()
+        results = {}
+        verbatim = [format_passages([(doc["metadata"]["source"], doc["text"]) for doc in docs]) for docs in retrieved]
+        latencies = asyncio.run(answer_latency(model, queries, verbatim))
+        results["verbatim"] = summarize(queries, verbatim, latencies)
+
+        for budget in args.budgets:
+            builder = ContextBuilder(token_budget=budget)
+            # The builder logs one line per request; keep stdout for the JSON report
+            with contextlib.redirect_stdout(sys.stderr):
+                packed = [builder.build(docs) for docs in retrieved]
+            latencies = asyncio.run(answer_latency(model, queries, [context.text for context in packed]))
+            results[f"packed_{budget}"] = {
+                **summarize(queries, [context.text for context in packed], latencies),
+                "avg_saved_tokens": round(sum(context.saved_tokens for context in packed) / len(packed), 1),
+                "dropped_redundant": sum(context.dropped_redundant for context in packed),
+                "dropped_over_budget": sum(context.dropped_over_budget for context in packed),
+                "merged": sum(context.merged for context in packed),
+            }
+        stub.shutdown()
+
+    print(json.dumps({
+        "documents": args.documents * (args.revisions + 1),
+        "chunks": len(chunks),
+        "queries": len(queries),
+        "top_k": args.top_k,
+        "prompt_latency_per_1k_tokens": args.prompt_latency_per_1k_tokens,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
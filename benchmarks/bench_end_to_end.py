@@ -0,0 +1,359 @@
+"""
+End-to-end benchmark: ingestion stages and concurrent query load.
+
+Generates a synthetic corpus of TXT and PDF manuals with the chunking
+benchmark's generator (a share of them written as PDFs, one page per 60
+lines), then runs every document through the ingestion stages one at a
+time: process_document (extract and chunk), get_embeddings and
+QdrantDB.add_texts, timing each stage. The API is then served on a local
+port and loaded with concurrent /api/query and /api/chat requests asking
+for the planted facts.
+
+The model backend is either the local provider (--provider local: no
+network, so the numbers are the pipeline's own cost) or the stub Azure
+OpenAI server (--provider stub: HTTP client, batching, latency and, with
+--requests-per-minute, 429 retries).
+
+The report has, per ingestion stage, documents, chunks, MB or chunks per
+second and p50/p95/p99 latency per document; per endpoint, requests per
+second, p50/p95/p99 latency, errors and the share of answers containing
+the planted fact (only meaningful with the local provider, whose answers
+quote the context); peak RSS after each phase, and the index size on disk.
+With --qdrant-url the index lives in throwaway collections on a Qdrant
+server instead of the embedded Qdrant, and its size is not reported.
+It is printed and, with --output, written to a JSON file together with
+the git commit and arguments of the run. --baseline compares every metric
+with an earlier report.
+
+Usage:
+    python benchmarks/bench_end_to_end.py --documents 40 --output results.json
+    python benchmarks/bench_end_to_end.py --provider stub --completion-latency 0.3 --concurrency 16
+    python benchmarks/bench_end_to_end.py --output new.json --baseline results.json
+    python benchmarks/bench_end_to_end.py --qdrant-url http://localhost:6333 --baseline results.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "src")]
+
+from benchmarks.bench_concurrency import configure_environment, serve_app  # noqa: E402
+from benchmarks.stub_server import serve  # noqa: E402
+
+PDF_LINES_PER_PAGE = 60
+PDF_LINE_WIDTH = 95
+
+
+def write_pdf(path: str, text: str) -> int:
+    """Write text as a minimal PDF with Helvetica text pages; returns the page count"""
+    lines = []
+    for paragraph in text.split("\n\n"):
+        lines.extend(textwrap.wrap(paragraph, PDF_LINE_WIDTH))
+        lines.append("")
+    pages = [lines[i:i + PDF_LINES_PER_PAGE] for i in range(0, len(lines), PDF_LINES_PER_PAGE)] or [[]]
+
+    # Objects 1-3 are the catalog, the page tree and the font; pages follow as (content, page) pairs
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in pages:
+        escaped = (line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in page)
+        stream = ("BT /F1 10 Tf 12 TL 50 770 Td " + " ".join(f"({line}) Tj T*" for line in escaped) + " ET").encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as file:
+        file.write(data)
+    return len(pages)
+
+
+def build_documents(directory: str, documents: int, pdf_share: float, seed: int):
+    """Write the synthetic manuals, converting a share of them to PDF; returns the planted (question, fact) pairs"""
+    from benchmarks.bench_chunking import build_corpus
+
+    queries = build_corpus(directory, documents, seed)
+    rng = random.Random(seed)
+    for name in sorted(os.listdir(directory)):
+        if rng.random() < pdf_share:
+            path = os.path.join(directory, name)
+            with open(path, encoding="utf-8") as file:
+                write_pdf(os.path.splitext(path)[0] + ".pdf", file.read())
+            os.remove(path)
+    return queries
+
+
+def percentiles(seconds) -> dict:
+    milliseconds = np.array(seconds) * 1000
+    if not len(milliseconds):
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    return {
+        f"p{p}_ms": round(float(np.percentile(milliseconds, p)), 2)
+        for p in (50, 95, 99)
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of the process so far, None where the resource module is missing (Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def directory_mb(path: str) -> float:
+    total = 0
+    for folder, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(folder, name)) for name in files)
+    return round(total / 2**20, 2)
+
+
+def ingest(corpus: str, db, provider) -> dict:
+    """Run every document through extraction, embedding and indexing, timing each stage"""
+    from file_processing.document_processor import process_document
+
+    stages = {stage: [] for stage in ("extract", "embed", "index")}
+    chunks = 0
+    size = 0
+    start = time.perf_counter()
+    for name in sorted(os.listdir(corpus)):
+        path = os.path.join(corpus, name)
+        size += os.path.getsize(path)
+
+        began = time.perf_counter()
+        processed = process_document(path)
+        stages["extract"].append(time.perf_counter() - began)
+        texts = [text for text, _ in processed]
+
+        began = time.perf_counter()
+        embeddings = provider.get_embeddings(texts)
+        stages["embed"].append(time.perf_counter() - began)
+        if len(embeddings) != len(texts):
+            raise RuntimeError(f"Embedding {name} failed")
+
+        began = time.perf_counter()
+        db.add_texts(texts, embeddings, [metadata for _, metadata in processed])
+        stages["index"].append(time.perf_counter() - began)
+        chunks += len(texts)
+    wall = time.perf_counter() - start
+
+    documents = len(stages["extract"])
+    report = {"documents": documents, "chunks": chunks, "corpus_mb": round(size / 2**20, 2), "wall_seconds": round(wall, 2)}
+    for stage, latencies in stages.items():
+        seconds = sum(latencies)
+        report[stage] = {
+            "seconds": round(seconds, 3),
+            "documents_per_second": round(documents / seconds, 1) if seconds else None,
+            "chunks_per_second": round(chunks / seconds, 1) if seconds else None,
+            **percentiles(latencies),
+        }
+    extract_seconds = sum(stages["extract"])
+    report["extract"]["mb_per_second"] = round(size / 2**20 / extract_seconds, 2) if extract_seconds else None
+    return report
+
+
+async def load(port: int, endpoint: str, queries, concurrency: int) -> dict:
+    """Send one request per question, at most concurrency at a time"""
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors, found = [], 0, 0
+
+    async def ask(client, question: str, fact: str) -> None:
+        nonlocal errors, found
+        if endpoint == "chat":
+            payload = {"messages": [{"role": "user", "content": question}], "top_k": 5}
+        else:
+            payload = {"query": question, "top_k": 5}
+        async with semaphore:
+            began = time.perf_counter()
+            try:
+                response = await client.post(f"/api/{endpoint}", json=payload)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - began)
+        # PDF text comes back with line breaks inside sentences
+        if " ".join(fact.split()) in " ".join(response.json()["answer"].split()):
+            found += 1
+
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=300, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(ask(client, question, fact) for question, fact in queries))
+        wall = time.perf_counter() - start
+
+    return {
+        "requests": len(queries),
+        "concurrency": concurrency,
+        "requests_per_second": round(len(queries) / wall, 1),
+        **percentiles(latencies),
+        "errors": errors,
+        "fact_in_answer": round(found / len(queries), 3),
+    }
+
+
+def flatten(report, prefix: str = "") -> dict:
+    """Numeric leaves of a nested report as dotted keys"""
+    values = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[f"{prefix}{key}"] = value
+    return values
+
+
+def compare(results: dict, baseline: dict) -> dict:
+    """Relative change of every metric present in both reports"""
+    current, previous = flatten(results), flatten(baseline.get("results", {}))
+    return {
+        key: {
+            "baseline": previous[key],
+            "current": current[key],
+            "change": round((current[key] - previous[key]) / previous[key], 3) if previous[key] else None,
+        }
+        for key in current
+        if key in previous
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end ingestion and query benchmark")
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--pdf-share", type=float, default=0.5, help="Share of the documents written as PDF")
+    parser.add_argument("--queries", type=int, default=100, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--endpoints", nargs="+", choices=["query", "chat"], default=["query", "chat"])
+    parser.add_argument("--provider", choices=["local", "stub"], default="local")
+    parser.add_argument("--vector-size", type=int, default=1024)
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Stub provider only")
+    parser.add_argument("--completion-latency", type=float, default=0.3, help="Stub provider only")
+    parser.add_argument("--requests-per-minute", type=int, default=0, help="Stub provider quota, 0 = unlimited")
+    parser.add_argument("--answer-cache", action="store_true", help="Keep the semantic answer cache on")
+    parser.add_argument("--qdrant-url", help="Qdrant server to index into instead of the embedded Qdrant")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        stub = serve(
+            embedding_latency=args.embedding_latency,
+            completion_latency=args.completion_latency,
+            requests_per_minute=args.requests_per_minute
+        )
+        configure_environment(f"http://127.0.0.1:{stub.server_port}", directory)
+        os.environ.update({
+            "LLM_PROVIDER": "azure" if args.provider == "stub" else "local",
+            "VECTOR_SIZE": str(args.vector_size),
+            "EMBEDDING_CACHE_ENABLED": "false",
+            "ANSWER_CACHE_ENABLED": str(args.answer_cache).lower(),
+        })
+        if args.qdrant_url:
+            # Collections of their own, dropped at the end
+            os.environ.update({"QDRANT_URL": args.qdrant_url, "COLLECTION_NAME": f"bench_e2e_{os.getpid()}"})
+        # Imported once the environment is set; they load config
+        from fastapi import FastAPI
+        from qdrant_client.http import models
+
+        from api.endpoints import router as api_router
+        from config import CATALOG_COLLECTION_NAME, COLLECTION_NAME
+        from database.qdrant_client import QdrantDB
+        from embeddings.provider import get_provider
+
+        corpus = os.path.join(directory, "corpus")
+        os.makedirs(corpus)
+        queries = build_documents(corpus, args.documents, args.pdf_share, args.seed)
+        queries = random.Random(args.seed).sample(queries, min(args.queries, len(queries)))
+
+        db = QdrantDB()
+        # Per-request log lines would drown the report
+        with contextlib.redirect_stdout(sys.stderr):
+            ingestion = ingest(corpus, db, get_provider())
+        ingestion["peak_rss_mb"] = peak_rss_mb()
+        ingestion["index_mb"] = None if args.qdrant_url else directory_mb(os.path.join(directory, "qdrant"))
+
+        app = FastAPI()
+        app.include_router(api_router, prefix="/api")
+        server = serve_app(app)
+        port = server.servers[0].sockets[0].getsockname()[1]
+        endpoints = {}
+        with contextlib.redirect_stdout(sys.stderr):
+            for endpoint in args.endpoints:
+                endpoints[endpoint] = asyncio.run(load(port, endpoint, queries, args.concurrency))
+        server.should_exit = True
+
+        results = {
+            "ingestion": ingestion,
+            "endpoints": endpoints,
+            "peak_rss_mb": peak_rss_mb(),
+            "stub_server": dict(stub.stats) if args.provider == "stub" else None,
+        }
+        stub.shutdown()
+        if args.qdrant_url:
+            aliases = {alias.alias_name: alias.collection_name for alias in db.client.get_aliases().aliases}
+            db.client.update_collection_aliases(change_aliases_operations=[
+                models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=COLLECTION_NAME))
+            ])
+            db.client.delete_collection(collection_name=aliases[COLLECTION_NAME])
+            db.client.delete_collection(collection_name=CATALOG_COLLECTION_NAME)
+        db.client.close()
+
+    report = {
+        "benchmark": "end_to_end",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "arguments": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        report["baseline_commit"] = baseline.get("commit")
+        report["changes"] = compare(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
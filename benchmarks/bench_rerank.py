@@ -0,0 +1,143 @@
+"""
+Two-stage retrieval benchmark: recall, retrieval latency and prompt size.
+
+Indexes the synthetic manuals of the chunking benchmark in a temporary
+embedded Qdrant collection and asks for the torque setting of each planted
+part. The dense vectors come from a hashed TF-IDF model that ignores tokens
+containing digits, the way embedding models blur part numbers and codes,
+so every "torque setting" chunk looks alike to dense search. This is the
+case where a bigger top_k is tempting.
+
+Each configuration is either a single-stage search returning top_k chunks,
+or a two-stage search that fetches N candidates with their vectors in one
+Qdrant call and reranks them with LocalReranker down to top_k.
+
+The report has one entry per configuration:
+- recall_at_k: share of questions whose fact is in the chunks sent to the model.
+- mrr: mean reciprocal rank of that chunk.
+- p50/p99_ms: retrieval latency, with the rerank share reported separately.
+- avg_prompt_tokens: tokens of the chunks that would go to the model.
+
+Usage:
+    python benchmarks/bench_rerank.py --documents 40 --candidates 20 50 100
+    python benchmarks/bench_rerank.py --modes dense hybrid --top-k 5
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "src")]
+
+from benchmarks.stub_server import TFIDF_DIMENSIONS, inverse_document_frequency, tfidf_embeddings  # noqa: E402
+
+
+def index_corpus(db, directory: str):
+    from file_processing.chunker import chunk_segments
+    from file_processing.txt_reader import iter_txt_segments
+
+    texts, metadatas = [], []
+    for name in sorted(os.listdir(directory)):
+        for chunk_id, (text, _) in enumerate(chunk_segments(iter_txt_segments(os.path.join(directory, name)))):
+            texts.append(text)
+            metadatas.append({"source": name, "title": name, "chunk_id": chunk_id})
+
+    idf = inverse_document_frequency(tfidf_embeddings(texts, skip_digits=True))
+    vectors = tfidf_embeddings(texts, idf, skip_digits=True)
+    for start in range(0, len(texts), 256):
+        db.add_texts(
+            texts[start:start + 256],
+            vectors[start:start + 256].tolist(),
+            metadatas[start:start + 256]
+        )
+    return len(texts), idf
+
+
+def run(db, reranker, queries, query_vectors, mode: str, top_k: int, candidates: int) -> dict:
+    from embeddings.tokens import count_tokens
+
+    latencies, rerank_latencies, ranks, tokens = [], [], [], []
+    for (question, fact), vector in zip(queries, query_vectors):
+        start = time.perf_counter()
+        results = db.search(vector, candidates or top_k, question, mode, with_vectors=bool(candidates))
+        searched = time.perf_counter()
+        if candidates:
+            results = reranker.rerank(question, vector, results, top_k)
+        latencies.append(time.perf_counter() - start)
+        rerank_latencies.append(time.perf_counter() - searched)
+
+        rank = next((i + 1 for i, result in enumerate(results) if fact in result["text"]), None)
+        ranks.append(rank)
+        tokens.append(sum(count_tokens(result["text"]) for result in results))
+
+    milliseconds = np.array(latencies) * 1000
+    return {
+        "mode": mode,
+        "candidates": candidates or top_k,
+        "top_k": top_k,
+        f"recall_at_{top_k}": round(sum(rank is not None for rank in ranks) / len(ranks), 3),
+        "mrr": round(sum(1 / rank for rank in ranks if rank) / len(ranks), 3),
+        "p50_ms": round(float(np.percentile(milliseconds, 50)), 2),
+        "p99_ms": round(float(np.percentile(milliseconds, 99)), 2),
+        "rerank_p50_ms": round(float(np.percentile(np.array(rerank_latencies) * 1000, 50)), 2),
+        "avg_prompt_tokens": round(sum(tokens) / len(tokens), 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Two-stage retrieval benchmark")
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--large-top-k", type=int, default=20, help="Single-stage baseline with a bigger top_k")
+    parser.add_argument("--candidates", type=int, nargs="+", default=[20, 50, 100])
+    parser.add_argument("--modes", nargs="+", choices=["dense", "sparse", "hybrid"], default=["dense", "hybrid"])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update({
+            "AZURE_OPENAI_ENDPOINT": "http://127.0.0.1:9",
+            "AZURE_OPENAI_API_KEY": "unused",
+            "VECTOR_SIZE": str(TFIDF_DIMENSIONS),
+            "QDRANT_PATH": os.path.join(directory, "qdrant"),
+            "MANIFEST_PATH": os.path.join(directory, "manifest.sqlite3"),
+            "EMBEDDING_CACHE_PATH": os.path.join(directory, "embeddings.sqlite3"),
+            "WATCH_DIRECTORY": os.path.join(directory, "documents"),
+        })
+        # Imported once the environment is set; they load config
+        from benchmarks.bench_chunking import build_corpus
+        from database.qdrant_client import QdrantDB
+        from models.reranker import LocalReranker
+
+        corpus = os.path.join(directory, "corpus")
+        os.makedirs(corpus)
+        queries = build_corpus(corpus, args.documents, args.seed)
+        queries = random.Random(args.seed).sample(queries, min(args.queries, len(queries)))
+
+        db = QdrantDB()
+        chunks, idf = index_corpus(db, corpus)
+        query_vectors = tfidf_embeddings([question for question, _ in queries], idf, skip_digits=True).tolist()
+        reranker = LocalReranker()
+
+        results = {}
+        for mode in args.modes:
+            for top_k in (args.top_k, args.large_top_k):
+                results[f"{mode}_top_{top_k}"] = run(db, reranker, queries, query_vectors, mode, top_k, 0)
+            for candidates in args.candidates:
+                results[f"{mode}_rerank_{candidates}_to_{args.top_k}"] = run(
+                    db, reranker, queries, query_vectors, mode, args.top_k, candidates
+                )
+        db.client.close()
+
+    print(json.dumps({"documents": args.documents, "chunks": chunks, "queries": len(queries), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Vector storage profile benchmark: memory, search latency and recall.
+
+Generates a synthetic corpus of embeddings whose leading dimensions carry
+most of the signal, like text-embedding-3 embeddings, and searches it with
+each storage profile (embedding size, quantization, on-disk originals).
+recall@k is measured against an exact float32 search over the full
+3072-dimensional vectors, so it includes the loss from shortening.
+
+Two backends:
+- numpy (default): a brute-force scan that reproduces the quantization and
+  rescoring math. Originals of on-disk profiles are read from a memory
+  mapped file. Scalar codes are scored with float32 BLAS because numpy has
+  no fast int8 kernel, so scalar latency here is no better than "none".
+- --url: collections with each profile on a Qdrant server, searched through
+  HNSW with SIMD quantized scoring. Embedded Qdrant ignores quantization and
+  on-disk settings, which is why it is not used here.
+
+Memory is what each profile keeps in RAM for vectors (quantized codes
+always, originals unless on disk); the HNSW graph is not included.
+
+Usage:
+    python benchmarks/bench_storage_profiles.py --points 20000 --queries 200
+    python benchmarks/bench_storage_profiles.py --url http://localhost:6333 --profiles full binary
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "src")]
+
+FULL_DIMENSIONS = 3072
+LATENT_DIMENSIONS = 64
+
+# name -> (dimensions, quantization, originals on disk, oversampling)
+PROFILES = {
+    "full": (3072, "none", False, 1.0),
+    "scalar": (3072, "scalar", True, 2.0),
+    "binary": (3072, "binary", True, 3.0),
+    "dims_1024": (1024, "none", False, 1.0),
+    "dims_1024_scalar": (1024, "scalar", True, 2.0),
+    "dims_1536_binary": (1536, "binary", True, 3.0),
+    "dims_256": (256, "none", False, 1.0),
+}
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+
+def make_corpus(points: int, queries: int, seed: int):
+    """Clustered documents and queries near one of them, as float32 unit vectors"""
+    rng = np.random.default_rng(seed)
+    # Signal decays over the dimensions, so shortened vectors keep most of it
+    scale = (1.0 / np.sqrt(1.0 + np.arange(FULL_DIMENSIONS) / 64)).astype(np.float32)
+    projection = rng.standard_normal((LATENT_DIMENSIONS, FULL_DIMENSIONS), dtype=np.float32) * scale
+    centers = rng.standard_normal((max(points // 50, 1), LATENT_DIMENSIONS), dtype=np.float32)
+    latent = centers[rng.integers(0, len(centers), points)]
+    latent += 0.7 * rng.standard_normal(latent.shape, dtype=np.float32)
+
+    documents = latent @ projection
+    documents += 0.5 * rng.standard_normal(documents.shape, dtype=np.float32) * scale
+    targets = latent[rng.integers(0, points, queries)]
+    query_vectors = (targets + 1.0 * rng.standard_normal(targets.shape, dtype=np.float32)) @ projection
+    query_vectors += 0.5 * rng.standard_normal(query_vectors.shape, dtype=np.float32) * scale
+    return normalize(documents).astype(np.float32), normalize(query_vectors).astype(np.float32)
+
+
+def exact_top_k(documents: np.ndarray, queries: np.ndarray, top_k: int) -> np.ndarray:
+    return np.argsort(-(queries @ documents.T), axis=1)[:, :top_k]
+
+
+def ram_bytes(points: int, dimensions: int, quantization: str, on_disk: bool) -> int:
+    codes = {"none": 0, "scalar": points * dimensions, "binary": points * dimensions // 8}[quantization]
+    originals = 0 if on_disk else points * dimensions * 4
+    return codes + originals
+
+
+class NumpyIndex:
+    """Brute-force index with optional quantization and full-precision rescoring"""
+
+    def __init__(self, vectors: np.ndarray, quantization: str, on_disk: bool, oversampling: float, directory: str):
+        self.quantization = quantization
+        self.oversampling = oversampling
+        if on_disk:
+            path = os.path.join(directory, f"originals-{vectors.shape[1]}.f32")
+            vectors.tofile(path)
+            self.originals = np.memmap(path, dtype=np.float32, mode="r", shape=vectors.shape)
+        else:
+            self.originals = vectors
+
+        if quantization == "scalar":
+            # Same bounds as Qdrant with quantile=0.99
+            self.low, self.high = np.quantile(vectors, [0.005, 0.995])
+            self.step = (self.high - self.low) / 255
+            codes = np.round((np.clip(vectors, self.low, self.high) - self.low) / self.step)
+            # Decoded once; see the module docstring
+            self.codes = (codes * self.step + self.low).astype(np.float32)
+        elif quantization == "binary":
+            self.codes = np.packbits(vectors > 0, axis=1)
+
+    def search(self, query: np.ndarray, top_k: int) -> np.ndarray:
+        if self.quantization == "none":
+            return np.argsort(-(self.originals @ query))[:top_k]
+
+        if self.quantization == "scalar":
+            scores = self.codes @ query
+        else:
+            # Fewer differing bits means a smaller angle
+            scores = -np.bitwise_count(self.codes ^ np.packbits(query > 0)).sum(axis=1, dtype=np.int32)
+        candidates = np.argpartition(-scores, int(top_k * self.oversampling))[:int(top_k * self.oversampling)]
+        candidates.sort()
+        rescored = np.asarray(self.originals[candidates]) @ query
+        return candidates[np.argsort(-rescored)[:top_k]]
+
+
+def run_numpy(profile, documents, queries, truth, top_k: int, directory: str) -> dict:
+    dimensions, quantization, on_disk, oversampling = profile
+    vectors = normalize(documents[:, :dimensions]).astype(np.float32)
+    query_vectors = normalize(queries[:, :dimensions]).astype(np.float32)
+    index = NumpyIndex(vectors, quantization, on_disk, oversampling, directory)
+
+    latencies = []
+    hits = 0
+    for row, query in enumerate(query_vectors):
+        start = time.perf_counter()
+        found = index.search(query, top_k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(found.tolist()) & set(truth[row].tolist()))
+    return summarize(profile, len(documents), latencies, hits / truth.size)
+
+
+def run_qdrant(url: str, name: str, profile, documents, queries, truth, top_k: int) -> dict:
+    from qdrant_client import QdrantClient, models
+
+    dimensions, quantization, on_disk, oversampling = profile
+    vectors = normalize(documents[:, :dimensions]).astype(np.float32)
+    query_vectors = normalize(queries[:, :dimensions]).astype(np.float32)
+
+    quantization_config = None
+    if quantization == "scalar":
+        quantization_config = models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    elif quantization == "binary":
+        quantization_config = models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+
+    client = QdrantClient(url=url, timeout=300)
+    collection = f"bench_storage_{name}"
+    client.recreate_collection(
+        collection_name=collection,
+        vectors_config=models.VectorParams(size=dimensions, distance=models.Distance.COSINE, on_disk=on_disk),
+        quantization_config=quantization_config,
+    )
+    client.upload_collection(collection_name=collection, vectors=vectors, ids=list(range(len(vectors))), wait=True)
+    while client.get_collection(collection).status != models.CollectionStatus.GREEN:
+        time.sleep(0.5)
+
+    search_params = None
+    if quantization != "none":
+        search_params = models.SearchParams(
+            quantization=models.QuantizationSearchParams(rescore=True, oversampling=oversampling)
+        )
+    latencies = []
+    hits = 0
+    try:
+        for row, query in enumerate(query_vectors):
+            start = time.perf_counter()
+            found = client.search(collection, query.tolist(), limit=top_k, search_params=search_params)
+            latencies.append(time.perf_counter() - start)
+            hits += len({point.id for point in found} & set(truth[row].tolist()))
+    finally:
+        client.delete_collection(collection)
+    return summarize(profile, len(documents), latencies, hits / truth.size)
+
+
+def summarize(profile, points: int, latencies, recall: float) -> dict:
+    dimensions, quantization, on_disk, oversampling = profile
+    milliseconds = np.array(latencies) * 1000
+    return {
+        "dimensions": dimensions,
+        "quantization": quantization,
+        "on_disk": on_disk,
+        "oversampling": oversampling,
+        "vector_ram_mb": round(ram_bytes(points, dimensions, quantization, on_disk) / 2**20, 2),
+        "p50_ms": round(float(np.percentile(milliseconds, 50)), 2),
+        "p99_ms": round(float(np.percentile(milliseconds, 99)), 2),
+        "recall": round(recall, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Vector storage profile benchmark")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--profiles", nargs="+", choices=sorted(PROFILES), default=list(PROFILES))
+    parser.add_argument("--url", help="Qdrant server URL; defaults to the numpy backend")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    documents, queries = make_corpus(args.points, args.queries, args.seed)
+    truth = exact_top_k(documents, queries, args.top_k)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.profiles:
+            if args.url:
+                results[name] = run_qdrant(args.url, name, PROFILES[name], documents, queries, truth, args.top_k)
+            else:
+                results[name] = run_numpy(PROFILES[name], documents, queries, truth, args.top_k, directory)
+
+    print(json.dumps({
+        "backend": "qdrant" if args.url else "numpy",
+        "points": args.points,
+        "queries": args.queries,
+        "metric": f"recall_at_{args.top_k}",
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
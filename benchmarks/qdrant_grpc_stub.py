@@ -0,0 +1,274 @@
+"""
+Local stand-in for a Qdrant server's gRPC API, for benchmarks and checks
+of the QDRANT_URL code path where no Qdrant server is available.
+
+Serves the Collections and Points gRPC services on a real socket and
+answers them with the embedded Qdrant (QdrantLocal) on a temporary or
+given path. Requests and responses go through qdrant-client's gRPC
+encoding, so collection creation and migration, aliases, payload
+indexes, batched upserts and dense, sparse and hybrid searches run
+exactly as they would against a server.
+
+Unlike a server it keeps plain in-memory vectors, accepts but ignores
+quantization, on-disk and payload index settings, and handles one call at
+a time. Use a real Qdrant for performance numbers.
+
+Usage:
+    python benchmarks/qdrant_grpc_stub.py --grpc-port 6334
+    QDRANT_URL=http://127.0.0.1:6333 QDRANT_GRPC_PORT=6334 python src/main.py
+    python benchmarks/bench_end_to_end.py --qdrant-url http://127.0.0.1:6333
+"""
+import argparse
+import tempfile
+import threading
+from concurrent import futures
+from typing import Dict
+
+import grpc
+from qdrant_client import grpc as qdrant_grpc
+from qdrant_client.conversions.conversion import GrpcToRest, RestToGrpc
+from qdrant_client.grpc import collections_service_pb2_grpc, points_service_pb2_grpc
+from qdrant_client.http import models
+from qdrant_client.local.qdrant_local import QdrantLocal
+
+
+def _with_payload(point):
+    """The gRPC converters expect a payload dictionary, also when none was requested"""
+    if point.payload is None:
+        point = point.model_copy(update={"payload": {}})
+    return point
+
+
+def _optional(request, field: str, convert, default=None):
+    return convert(getattr(request, field)) if request.HasField(field) else default
+
+
+class _Calls:
+    """Calls answered per gRPC method"""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, method: str) -> None:
+        with self._lock:
+            self.counts[method] = self.counts.get(method, 0) + 1
+
+
+class PointsService(points_service_pb2_grpc.PointsServicer):
+    def __init__(self, local: QdrantLocal, calls: _Calls):
+        self.local = local
+        self.calls = calls
+
+    def _operation(self, result: models.UpdateResult):
+        return qdrant_grpc.PointsOperationResponse(result=RestToGrpc.convert_update_result(result), time=0.0)
+
+    def Upsert(self, request, context):
+        self.calls.add("Upsert")
+        points = [GrpcToRest.convert_point_struct(point) for point in request.points]
+        return self._operation(self.local.upsert(request.collection_name, points=points, wait=request.wait))
+
+    def Delete(self, request, context):
+        self.calls.add("Delete")
+        selector = GrpcToRest.convert_points_selector(request.points)
+        return self._operation(self.local.delete(request.collection_name, points_selector=selector))
+
+    def Get(self, request, context):
+        self.calls.add("Get")
+        records = self.local.retrieve(
+            request.collection_name,
+            ids=[GrpcToRest.convert_point_id(point_id) for point_id in request.ids],
+            with_payload=_optional(request, "with_payload", GrpcToRest.convert_with_payload_selector, True),
+            with_vectors=_optional(request, "with_vectors", GrpcToRest.convert_with_vectors_selector, False)
+        )
+        return qdrant_grpc.GetResponse(
+            result=[RestToGrpc.convert_record(_with_payload(record)) for record in records], time=0.0
+        )
+
+    def Scroll(self, request, context):
+        self.calls.add("Scroll")
+        records, offset = self.local.scroll(
+            request.collection_name,
+            scroll_filter=_optional(request, "filter", GrpcToRest.convert_filter),
+            limit=request.limit if request.HasField("limit") else 10,
+            offset=_optional(request, "offset", GrpcToRest.convert_point_id),
+            with_payload=_optional(request, "with_payload", GrpcToRest.convert_with_payload_selector, True),
+            with_vectors=_optional(request, "with_vectors", GrpcToRest.convert_with_vectors_selector, False)
+        )
+        return qdrant_grpc.ScrollResponse(
+            result=[RestToGrpc.convert_record(_with_payload(record)) for record in records],
+            next_page_offset=RestToGrpc.convert_extended_point_id(offset) if offset is not None else None,
+            time=0.0
+        )
+
+    def Count(self, request, context):
+        self.calls.add("Count")
+        result = self.local.count(
+            request.collection_name, count_filter=_optional(request, "filter", GrpcToRest.convert_filter)
+        )
+        return qdrant_grpc.CountResponse(result=RestToGrpc.convert_count_result(result), time=0.0)
+
+    def _search(self, request):
+        search = GrpcToRest.convert_search_points(request)
+        points = self.local.search(
+            request.collection_name,
+            query_vector=search.vector,
+            query_filter=search.filter,
+            search_params=search.params,
+            limit=search.limit,
+            offset=search.offset,
+            with_payload=search.with_payload,
+            with_vectors=search.with_vector,
+            score_threshold=search.score_threshold
+        )
+        return [RestToGrpc.convert_scored_point(_with_payload(point)) for point in points]
+
+    def Search(self, request, context):
+        self.calls.add("Search")
+        return qdrant_grpc.SearchResponse(result=self._search(request), time=0.0)
+
+    def SearchBatch(self, request, context):
+        self.calls.add("SearchBatch")
+        return qdrant_grpc.SearchBatchResponse(
+            result=[qdrant_grpc.BatchResult(result=self._search(search)) for search in request.search_points],
+            time=0.0
+        )
+
+    def _query(self, request):
+        query = GrpcToRest.convert_query_points(request)
+        points = self.local.query_points(
+            request.collection_name,
+            query=query.query,
+            prefetch=query.prefetch,
+            using=query.using,
+            query_filter=query.filter,
+            search_params=query.params,
+            limit=query.limit or 10,
+            offset=query.offset,
+            with_payload=query.with_payload,
+            with_vectors=query.with_vector,
+            score_threshold=query.score_threshold
+        ).points
+        return [RestToGrpc.convert_scored_point(_with_payload(point)) for point in points]
+
+    def Query(self, request, context):
+        self.calls.add("Query")
+        return qdrant_grpc.QueryResponse(result=self._query(request), time=0.0)
+
+    def QueryBatch(self, request, context):
+        self.calls.add("QueryBatch")
+        return qdrant_grpc.QueryBatchResponse(
+            result=[qdrant_grpc.BatchResult(result=self._query(query)) for query in request.query_points],
+            time=0.0
+        )
+
+    def CreateFieldIndex(self, request, context):
+        # Accepted and ignored, like the embedded Qdrant does
+        self.calls.add("CreateFieldIndex")
+        return self._operation(models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED))
+
+
+class CollectionsService(collections_service_pb2_grpc.CollectionsServicer):
+    def __init__(self, local: QdrantLocal, calls: _Calls):
+        self.local = local
+        self.calls = calls
+
+    def _operation(self, result: bool):
+        return qdrant_grpc.CollectionOperationResponse(result=result, time=0.0)
+
+    def List(self, request, context):
+        self.calls.add("ListCollections")
+        return qdrant_grpc.ListCollectionsResponse(
+            collections=[
+                qdrant_grpc.CollectionDescription(name=collection.name)
+                for collection in self.local.get_collections().collections
+            ],
+            time=0.0
+        )
+
+    def Get(self, request, context):
+        self.calls.add("GetCollection")
+        info = self.local.get_collection(request.collection_name)
+        return qdrant_grpc.GetCollectionInfoResponse(result=RestToGrpc.convert_collection_info(info), time=0.0)
+
+    def CollectionExists(self, request, context):
+        self.calls.add("CollectionExists")
+        exists = self.local.collection_exists(request.collection_name)
+        return qdrant_grpc.CollectionExistsResponse(result=qdrant_grpc.CollectionExists(exists=exists), time=0.0)
+
+    def Create(self, request, context):
+        self.calls.add("CreateCollection")
+        # Decoded so malformed settings fail, but not applied
+        _optional(request, "quantization_config", GrpcToRest.convert_quantization_config)
+        self.local.create_collection(
+            request.collection_name,
+            vectors_config=GrpcToRest.convert_vectors_config(request.vectors_config),
+            sparse_vectors_config=_optional(request, "sparse_vectors_config", GrpcToRest.convert_sparse_vector_config)
+        )
+        return self._operation(True)
+
+    def Update(self, request, context):
+        self.calls.add("UpdateCollection")
+        # Decoded so malformed settings fail, but not applied
+        GrpcToRest.convert_update_collection(request)
+        return self._operation(True)
+
+    def Delete(self, request, context):
+        self.calls.add("DeleteCollection")
+        return self._operation(self.local.delete_collection(request.collection_name))
+
+    def UpdateAliases(self, request, context):
+        self.calls.add("UpdateAliases")
+        self.local.update_collection_aliases(
+            [GrpcToRest.convert_alias_operations(action) for action in request.actions]
+        )
+        return self._operation(True)
+
+    def ListAliases(self, request, context):
+        self.calls.add("ListAliases")
+        return qdrant_grpc.ListAliasesResponse(
+            aliases=[RestToGrpc.convert_alias_description(alias) for alias in self.local.get_aliases().aliases],
+            time=0.0
+        )
+
+
+def serve(path: str, host: str = "127.0.0.1", port: int = 0) -> grpc.Server:
+    """
+    Start the stub server
+
+    Args:
+        path: Directory of the embedded Qdrant holding the data
+        host: Interface to listen on
+        port: gRPC port, 0 picks a free one
+
+    Returns:
+        The running server; server.port is its gRPC port and server.calls
+        counts the calls answered per method
+    """
+    local = QdrantLocal(path)
+    calls = _Calls()
+    # The embedded Qdrant is not safe for concurrent calls
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=1))
+    points_service_pb2_grpc.add_PointsServicer_to_server(PointsService(local, calls), server)
+    collections_service_pb2_grpc.add_CollectionsServicer_to_server(CollectionsService(local, calls), server)
+    server.port = server.add_insecure_port(f"{host}:{port}")
+    server.calls = calls.counts
+    server.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Qdrant gRPC server backed by the embedded Qdrant")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--grpc-port", type=int, default=6334)
+    parser.add_argument("--path", help="Data directory, a temporary one by default")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        server = serve(args.path or directory, args.host, args.grpc_port)
+        print(f"Stub Qdrant gRPC server listening on {args.host}:{server.port}")
+        try:
+            server.wait_for_termination()
+        except KeyboardInterrupt:
+            print(f"Calls: {server.calls}")
+            server.stop(grace=None)
@@ -0,0 +1,330 @@
+"""
+Local stand-in for the Azure OpenAI REST API, for benchmarks.
+
+Serves the embeddings and chat completions routes of an Azure deployment
+with configurable artificial latency. Embeddings are deterministic
+pseudo-random unit vectors derived from the input text. Chat completions
+honour "stream": true, spreading the completion latency over the tokens,
+and can take longer for longer prompts (--prompt-latency-per-1k-tokens).
+
+Like an Azure deployment, each deployment can have a requests-per-minute
+and a tokens-per-minute quota (--requests-per-minute, --tokens-per-minute).
+Requests over quota get a 429 with retry-after and retry-after-ms headers;
+chat requests count their prompt plus max_tokens against the token quota.
+
+Usage:
+    python benchmarks/stub_server.py --port 8765 --completion-latency 0.5
+    python benchmarks/stub_server.py --requests-per-minute 60 --tokens-per-minute 20000
+"""
+import argparse
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+import numpy as np
+
+ROUTE = re.compile(r"^/openai/deployments/(?P<deployment>[^/]+)/(?P<operation>embeddings|chat/completions)")
+
+# Size of the hashed TF-IDF vectors used by the retrieval benchmarks
+TFIDF_DIMENSIONS = 1024
+# 8191 tokens, the input limit of text-embedding-3-large, at about four characters per token
+MODEL_MAX_CHARS = 8191 * 4
+TOKEN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+DIGIT = re.compile(r"[0-9]")
+
+
+def fake_embedding(text: str, dimensions: int = 3072) -> List[float]:
+    """Deterministic unit vector for a text"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    rng = random.Random(seed)
+    vector = [rng.gauss(0.0, 1.0) for _ in range(dimensions)]
+    norm = sum(value * value for value in vector) ** 0.5
+    return [value / norm for value in vector]
+
+
+def tfidf_embeddings(texts, idf=None, skip_digits: bool = False):
+    """
+    Hashed TF-IDF vectors, L2 normalised: a free, deterministic embedding
+    model whose similarities follow shared words, for retrieval benchmarks
+
+    Args:
+        texts: Texts to embed; like the embedding model, only the start of
+            an oversized text is seen
+        idf: Optional per-dimension weights from inverse_document_frequency
+        skip_digits: Ignore tokens containing digits, the way embedding
+            models blur part numbers and codes
+
+    Returns:
+        Array of shape (len(texts), TFIDF_DIMENSIONS)
+    """
+    vectors = np.zeros((len(texts), TFIDF_DIMENSIONS), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in TOKEN.findall(text[:MODEL_MAX_CHARS].lower()):
+            if not (skip_digits and DIGIT.search(token)):
+                vectors[row, zlib.crc32(token.encode("utf-8")) % TFIDF_DIMENSIONS] += 1.0
+    np.log1p(vectors, out=vectors)
+    if idf is not None:
+        vectors *= idf
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-9)
+
+
+def inverse_document_frequency(vectors):
+    """IDF weights of the dimensions of unweighted tfidf_embeddings"""
+    document_frequency = (vectors > 0).sum(axis=0)
+    return np.log((1 + len(vectors)) / (1 + document_frequency)).astype(np.float32) + 1.0
+
+
+class Quota:
+    """Per-minute request and token allowance of a deployment, refilled continuously"""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, tokens: int) -> float:
+        """
+        Admit a request if it fits the quota
+
+        Returns:
+            0 if the request was admitted, otherwise the seconds until it would fit
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._updated = now
+            wait = 0.0
+            if self.requests_per_minute:
+                self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60.0)
+                wait = max(wait, (1 - self._requests) * 60.0 / self.requests_per_minute)
+            if self.tokens_per_minute:
+                tokens = min(tokens, self.tokens_per_minute)
+                self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60.0)
+                wait = max(wait, (tokens - self._tokens) * 60.0 / self.tokens_per_minute)
+            if wait > 0:
+                return wait
+            self._requests -= 1
+            self._tokens -= tokens
+            return 0.0
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    # Overridden per server by serve()
+    embedding_latency = 0.05
+    completion_latency = 0.5
+    # Extra latency before the first token per 1000 prompt tokens, like model prefill
+    prompt_latency_per_1k_tokens = 0.0
+    dimensions = 3072
+    answer_words = 60
+    # Quotas per deployment, 0 = unlimited
+    requests_per_minute = 0
+    tokens_per_minute = 0
+    quotas: Dict[str, Quota] = {}
+    # Requests answered and requests rejected with a 429
+    stats = {"requests": 0, "throttled": 0}
+    stats_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+    def do_POST(self):
+        match = ROUTE.match(self.path)
+        if not match:
+            self._send(404, {"error": {"message": f"Unknown route {self.path}"}})
+            return
+
+        length = int(self.headers.get("Content-Length", "0"))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        deployment = match.group("deployment")
+        if match.group("operation") == "embeddings":
+            inputs = body.get("input", [])
+            tokens = sum(max(1, len(text) // 4) for text in ([inputs] if isinstance(inputs, str) else inputs))
+        else:
+            tokens = sum(len(message.get("content", "")) for message in body.get("messages", [])) // 4
+            tokens += body.get("max_tokens") or 0
+        if self._throttled(deployment, tokens):
+            return
+
+        if match.group("operation") == "embeddings":
+            self._embeddings(deployment, body)
+        else:
+            self._chat(deployment, body)
+
+    def _throttled(self, deployment: str, tokens: int) -> bool:
+        """Answer with a 429 if the request exceeds the deployment's quota"""
+        wait = 0.0
+        if self.requests_per_minute or self.tokens_per_minute:
+            with self.stats_lock:
+                quota = self.quotas.setdefault(deployment, Quota(self.requests_per_minute, self.tokens_per_minute))
+            wait = quota.take(tokens)
+        with self.stats_lock:
+            self.stats["throttled" if wait else "requests"] += 1
+        if not wait:
+            return False
+
+        retry_after = math.ceil(wait)
+        self._send(429, {"error": {
+            "code": "429",
+            "message": (
+                f"Requests to the deployment {deployment} have exceeded the rate limit of your "
+                f"current tier. Please retry after {retry_after} seconds."
+            ),
+        }}, {"retry-after": str(retry_after), "retry-after-ms": str(math.ceil(wait * 1000))})
+        return True
+
+    def _embeddings(self, deployment: str, body: dict) -> None:
+        time.sleep(self.embedding_latency)
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dimensions = body.get("dimensions") or self.dimensions
+
+        data = []
+        for i, text in enumerate(inputs):
+            vector = fake_embedding(text, dimensions)
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+
+        tokens = sum(max(1, len(text) // 4) for text in inputs)
+        self._send(200, {
+            "object": "list",
+            "data": data,
+            "model": deployment,
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def _chat(self, deployment: str, body: dict) -> None:
+        messages = body.get("messages", [{}])
+        question = messages[-1].get("content", "")[:80]
+        words = [f"Stub answer to: {question}"] + ["lorem"] * max(0, self.answer_words - 1)
+        prompt_tokens = sum(len(message.get("content", "")) for message in messages) // 4
+        time.sleep(prompt_tokens / 1000 * self.prompt_latency_per_1k_tokens)
+        if body.get("stream"):
+            self._stream_chat(deployment, words)
+            return
+
+        time.sleep(self.completion_latency)
+        answer = " ".join(words)
+        self._send(200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": deployment,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(answer) // 4,
+                "total_tokens": prompt_tokens + len(answer) // 4,
+            },
+        })
+
+    def _stream_chat(self, deployment: str, words: List[str]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        delay = self.completion_latency / len(words)
+        for i, word in enumerate(words):
+            time.sleep(delay)
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": deployment,
+                "choices": [{
+                    "index": 0,
+                    "delta": {"role": "assistant", "content": word if i == 0 else " " + word},
+                    "finish_reason": "stop" if i == len(words) - 1 else None,
+                }],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _send(self, status: int, payload: dict, headers: Dict[str, str] = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    embedding_latency: float = 0.05,
+    completion_latency: float = 0.5,
+    dimensions: int = 3072,
+    prompt_latency_per_1k_tokens: float = 0.0,
+    requests_per_minute: int = 0,
+    tokens_per_minute: int = 0
+) -> ThreadingHTTPServer:
+    """
+    Start the stub server in a background thread
+
+    Returns:
+        The running server; its URL is http://{host}:{server.server_port}
+        and server.stats counts the requests answered and throttled
+    """
+    handler = type("ConfiguredStubHandler", (StubOpenAIHandler,), {
+        "embedding_latency": embedding_latency,
+        "completion_latency": completion_latency,
+        "dimensions": dimensions,
+        "prompt_latency_per_1k_tokens": prompt_latency_per_1k_tokens,
+        "requests_per_minute": requests_per_minute,
+        "tokens_per_minute": tokens_per_minute,
+        "quotas": {},
+        "stats": {"requests": 0, "throttled": 0},
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.stats = handler.stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Azure OpenAI server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--completion-latency", type=float, default=0.5)
+    parser.add_argument("--dimensions", type=int, default=3072)
+    parser.add_argument("--prompt-latency-per-1k-tokens", type=float, default=0.0)
+    parser.add_argument("--requests-per-minute", type=int, default=0, help="Per deployment, 0 = unlimited")
+    parser.add_argument("--tokens-per-minute", type=int, default=0, help="Per deployment, 0 = unlimited")
+    args = parser.parse_args()
+
+    server = serve(
+        args.host, args.port, args.embedding_latency, args.completion_latency, args.dimensions,
+        args.prompt_latency_per_1k_tokens, args.requests_per_minute, args.tokens_per_minute
+    )
+    print(f"Stub Azure OpenAI server listening on http://{args.host}:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
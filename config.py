@@ -13,16 +13,145 @@ AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2023-05-15")
 # Model names
 AZURE_OPENAI_EMBEDDING_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-large")
 AZURE_OPENAI_COMPLETION_DEPLOYMENT = os.getenv("AZURE_OPENAI_COMPLETION_DEPLOYMENT", "gpt-4o")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
+# Size of the model's full embeddings; a smaller VECTOR_SIZE requests shortened ones
+EMBEDDING_MODEL_DIMENSIONS = int(os.getenv("EMBEDDING_MODEL_DIMENSIONS", "3072"))
+
+# Embeddings and completions backend: "azure" (Azure OpenAI) or "local"
+# (deterministic hashed n-gram embeddings of VECTOR_SIZE dimensions and
+# templated answers, no network; for profiling, load tests and benchmarks)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "azure")
 
 # File watching configuration
 WATCH_DIRECTORY = os.getenv("WATCH_DIRECTORY", str(Path(__file__).parent / "Documents"))
 # Directory creation moved to main.py where it belongs
+WATCHER_DEBOUNCE_SECONDS = float(os.getenv("WATCHER_DEBOUNCE_SECONDS", "1.0"))
+# Only used when native file system events are unavailable
+WATCHER_POLL_INTERVAL = float(os.getenv("WATCHER_POLL_INTERVAL", "5.0"))
+WATCHER_FORCE_POLLING = os.getenv("WATCHER_FORCE_POLLING", "false").lower() == "true"
 
-# Qdrant configuration
+# Qdrant configuration: a server at QDRANT_URL (e.g. http://localhost:6333),
+# or without it the embedded Qdrant in QDRANT_PATH, which only one process can open
+QDRANT_URL = os.getenv("QDRANT_URL", "")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY") or None
+# Talk to the server over gRPC on QDRANT_GRPC_PORT instead of REST
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "true").lower() == "true"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+# Seconds before a server request fails
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "10"))
+# Points per upsert request; add_texts builds and sends one batch at a time
+QDRANT_UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "256"))
+# Upsert requests of one add_texts call in flight at the same time (server only)
+QDRANT_UPSERT_PARALLEL = int(os.getenv("QDRANT_UPSERT_PARALLEL", "2"))
+# Attempts per upsert batch on transient errors
+QDRANT_UPSERT_MAX_RETRIES = int(os.getenv("QDRANT_UPSERT_MAX_RETRIES", "3"))
 QDRANT_PATH = os.getenv("QDRANT_PATH", "./qdrant_data")
 COLLECTION_NAME = os.getenv("COLLECTION_NAME", "documents")
-VECTOR_SIZE = 3072  # Size for text-embedding-3-large (updated from 1536)
+# One record per document (title, type, chunk count, size, ingest time)
+CATALOG_COLLECTION_NAME = os.getenv("CATALOG_COLLECTION_NAME", f"{COLLECTION_NAME}_catalog")
+# Stored embedding size; text-embedding-3-large returns 3072 dimensions and
+# can shorten them (e.g. 1024 or 256) for a smaller, faster index
+VECTOR_SIZE = int(os.getenv("VECTOR_SIZE", "3072"))
+# Vector compression: "none", "scalar" (int8, 4x smaller) or "binary" (1 bit per dimension, 32x smaller)
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+# Quantized search fetches limit * oversampling candidates and rescores them with the original vectors
+QUANTIZATION_OVERSAMPLING = float(os.getenv("QUANTIZATION_OVERSAMPLING", "2.0"))
+QUANTIZATION_RESCORE = os.getenv("QUANTIZATION_RESCORE", "true").lower() == "true"
+# Keep the original vectors on disk; quantized vectors stay in RAM
+VECTORS_ON_DISK = os.getenv("VECTORS_ON_DISK", "false").lower() == "true"
+
+# Embedding cache configuration
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./cache/embeddings.sqlite3")
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "1024"))
+
+# Retrieval: "dense", "sparse" (BM25) or "hybrid" (both, fused with reciprocal rank fusion)
+SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid")
+# In hybrid mode each retriever fetches top_k * this many candidates before fusion
+HYBRID_PREFETCH_MULTIPLIER = int(os.getenv("HYBRID_PREFETCH_MULTIPLIER", "4"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Batch question answering (/api/query/batch)
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "5000"))
+# Completions generated at the same time for one batch request
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+# Two-stage retrieval: fetch this many candidates and rerank them locally
+# down to top_k (0 = off; requests can override it up to the maximum), and
+# the weight of query term coverage against exact cosine in the rerank score
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "0"))
+RERANK_MAX_CANDIDATES = int(os.getenv("RERANK_MAX_CANDIDATES", "200"))
+RERANK_LEXICAL_WEIGHT = float(os.getenv("RERANK_LEXICAL_WEIGHT", "0.3"))
+
+# Prompt context packing: token budget for retrieved chunks, MMR trade-off
+# between relevance (1.0) and diversity (0.0), and the similarity at which
+# a chunk counts as a duplicate of one already in the context
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+CONTEXT_DUPLICATE_SIMILARITY = float(os.getenv("CONTEXT_DUPLICATE_SIMILARITY", "0.9"))
+
+# Server-side chat sessions: sessions kept (least recently used evicted
+# first), idle time before one expires, and per session the turns of history
+# and retrieved chunks kept. The chunk vectors take up to about
+# MAX_SESSIONS * MAX_CHUNKS * VECTOR_SIZE * 4 bytes.
+CHAT_SESSION_MAX_SESSIONS = int(os.getenv("CHAT_SESSION_MAX_SESSIONS", "200"))
+CHAT_SESSION_IDLE_SECONDS = int(os.getenv("CHAT_SESSION_IDLE_SECONDS", "1800"))
+CHAT_SESSION_MAX_TURNS = int(os.getenv("CHAT_SESSION_MAX_TURNS", "6"))
+CHAT_SESSION_MAX_CHUNKS = int(os.getenv("CHAT_SESSION_MAX_CHUNKS", "20"))
+# Characters of each past answer kept in the history
+CHAT_SESSION_ANSWER_CHARS = int(os.getenv("CHAT_SESSION_ANSWER_CHARS", "1000"))
+# Weight of the previous question in the search vector of a follow-up
+CHAT_SESSION_FOCUS_WEIGHT = float(os.getenv("CHAT_SESSION_FOCUS_WEIGHT", "0.5"))
+# Follow-ups at least this similar to the previous question reuse its chunks without a search
+CHAT_SESSION_REUSE_SIMILARITY = float(os.getenv("CHAT_SESSION_REUSE_SIMILARITY", "0.9"))
+# Chunks of earlier turns added to the context of a follow-up
+CHAT_SESSION_CARRY_CHUNKS = int(os.getenv("CHAT_SESSION_CARRY_CHUNKS", "3"))
+
+# Semantic answer cache for repeated and near-duplicate questions
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+# Minimum cosine similarity between query embeddings for a cache hit
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+# Embedding request batching and rate limits
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "32000"))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "256"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))
+EMBEDDING_TPM_LIMIT = int(os.getenv("EMBEDDING_TPM_LIMIT", "240000"))
+EMBEDDING_RPM_LIMIT = int(os.getenv("EMBEDDING_RPM_LIMIT", "1440"))
+
+# Background ingestion queue
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "100"))
+# Processes used for parsing documents, 0 means one per CPU core
+INGEST_EXTRACT_WORKERS = int(os.getenv("INGEST_EXTRACT_WORKERS", "0"))
+INGEST_INDEX_WORKERS = int(os.getenv("INGEST_INDEX_WORKERS", "2"))
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "500"))
+# Where documents are watched and indexed: "api" (a thread of the API server)
+# or "daemon" (the separate ingestd process; API processes only read). With
+# API_WORKERS > 1, main.py sets "watcher" for the workers: they only save
+# uploads, which the main process's watcher indexes.
+INGESTION_MODE = os.getenv("INGESTION_MODE", "api")
+# Only the ingestd holding this lock indexes; others wait to take over
+INGEST_LOCK_PATH = os.getenv("INGEST_LOCK_PATH", "./cache/ingestd.lock")
+INGEST_LOCK_POLL_SECONDS = float(os.getenv("INGEST_LOCK_POLL_SECONDS", "5.0"))
+
+# Document chunking, sizes in tokens
+CHUNK_SIZE_TOKENS = int(os.getenv("CHUNK_SIZE_TOKENS", "400"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "60"))
+# Pages per task when large PDFs are extracted in parallel
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+
+# Incremental indexing state (file sizes, mtimes, hashes and point IDs)
+MANIFEST_PATH = os.getenv("MANIFEST_PATH", "./cache/manifest.sqlite3")
 
 # API configuration
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
-API_PORT = int(os.getenv("API_PORT", "8001"))
\ No newline at end of file
+API_PORT = int(os.getenv("API_PORT", "8001"))
+# API worker processes; more than one needs a Qdrant server (QDRANT_URL)
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+
+# Log level: DEBUG adds per-request and per-file details (context packing,
+# time to first token, files being indexed), WARNING keeps only problems
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
\ No newline at end of file
@@ -20,6 +20,8 @@ const uploadStatus = document.getElementById('upload-status');
 
 // Chat history for context
 let chatHistory = [];
+// Server-side chat session; once set only new messages are sent
+let chatSessionId = null;
 
 // Function to fetch and display the document list
 function fetchDocumentList() {
@@ -116,13 +118,7 @@ function addMessage(content, role, sourceDocuments = null) {
     messageContent.appendChild(messageText);
     
     // Add sources link if source documents are available
-    if (sourceDocuments && sourceDocuments.length > 0) {
-        const sourcesLink = document.createElement('a');
-        sourcesLink.classList.add('sources-link');
-        sourcesLink.textContent = 'View sources';
-        sourcesLink.addEventListener('click', () => showSources(sourceDocuments));
-        messageContent.appendChild(sourcesLink);
-    }
+    addSourcesLink(messageContent, sourceDocuments);
     
     messageDiv.appendChild(messageContent);
     messagesContainer.appendChild(messageDiv);
@@ -137,6 +133,78 @@ function addMessage(content, role, sourceDocuments = null) {
     });
 }
 
+// Function to add an assistant message whose text arrives in pieces
+function addStreamingMessage() {
+    const messageDiv = document.createElement('div');
+    messageDiv.classList.add('message', 'assistant');
+    
+    const messageContent = document.createElement('div');
+    messageContent.classList.add('message-content');
+    
+    const messageText = document.createElement('p');
+    messageContent.appendChild(messageText);
+    messageDiv.appendChild(messageContent);
+    messagesContainer.appendChild(messageDiv);
+    
+    return {
+        // Append a piece of the answer, keeping the newest text in view
+        append(text) {
+            messageText.textContent += text;
+            messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        },
+        // Attach the sources and record the complete answer in the chat history
+        finish(sourceDocuments) {
+            addSourcesLink(messageContent, sourceDocuments);
+            chatHistory.push({
+                role: 'assistant',
+                content: messageText.textContent
+            });
+        }
+    };
+}
+
+// Function to add a "View sources" link to a message
+function addSourcesLink(messageContent, sourceDocuments) {
+    if (sourceDocuments && sourceDocuments.length > 0) {
+        const sourcesLink = document.createElement('a');
+        sourcesLink.classList.add('sources-link');
+        sourcesLink.textContent = 'View sources';
+        sourcesLink.addEventListener('click', () => showSources(sourceDocuments));
+        messageContent.appendChild(sourcesLink);
+    }
+}
+
+// Read server-sent events from a fetch response, calling onEvent(name, data) for each
+async function readEvents(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let name = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) {
+                    name = line.slice(7);
+                } else if (line.startsWith('data: ')) {
+                    data += line.slice(6);
+                }
+            });
+            onEvent(name, data ? JSON.parse(data) : {});
+        }
+    }
+}
+
 // Function to show loading indicator
 function showLoading() {
     const loadingDiv = document.createElement('div');
@@ -189,25 +257,58 @@ chatForm.addEventListener('submit', async function(e) {
     showLoading();
     
     try {
-        // Call API with chat history
-        const response = await fetch('/api/chat', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                messages: chatHistory,
-                top_k: 5
-            })
-        });
-        
-        const data = await response.json();
+        // Call API with the new message in the chat session (or the whole history to
+        // start one), streaming the answer as it is generated
+        let response = await postChat(query);
+        if (response.status === 404 && chatSessionId) {
+            // The session expired on the server; start a new one from the full history
+            chatSessionId = null;
+            response = await postChat(query);
+        }
         
-        // Hide loading indicator
-        hideLoading();
+        if (!response.ok) {
+            throw new Error(`Request failed with status ${response.status}`);
+        }
         
-        // Add assistant's response to chat
-        addMessage(data.answer, 'assistant', data.source_documents);
+        if (!(response.headers.get('Content-Type') || '').startsWith('text/event-stream')) {
+            // Answers that need no model call come back as plain JSON
+            const data = await response.json();
+            chatSessionId = data.session_id || chatSessionId;
+            hideLoading();
+            addMessage(data.answer, 'assistant', data.source_documents);
+        } else {
+            let message = null;
+            let sources = [];
+            let errorDetail = null;
+            
+            await readEvents(response, (event, data) => {
+                if (event === 'sources') {
+                    // Sources arrive before the answer
+                    sources = data.source_documents;
+                    chatSessionId = data.session_id || chatSessionId;
+                } else if (event === 'token') {
+                    if (!message) {
+                        // Replace the loading indicator with the answer on the first token
+                        hideLoading();
+                        message = addStreamingMessage();
+                    }
+                    message.append(data.text);
+                } else if (event === 'done') {
+                    console.log(`Time to first token: ${data.ttft_ms} ms, total: ${data.total_ms} ms`);
+                } else if (event === 'error') {
+                    errorDetail = data.detail;
+                }
+            });
+            
+            if (message) {
+                message.finish(sources);
+            }
+            if (errorDetail) {
+                console.error('Error:', errorDetail);
+                hideLoading();
+                addMessage('Sorry, there was an error processing your request. Please try again.', 'assistant');
+            }
+        }
     } catch (error) {
         console.error('Error:', error);
         hideLoading();
@@ -218,6 +319,22 @@ chatForm.addEventListener('submit', async function(e) {
     submitButton.disabled = false;
 });
 
+// Function to send a chat request
+function postChat(query) {
+    return fetch('/api/chat', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            session_id: chatSessionId,
+            messages: chatSessionId ? [{ role: 'user', content: query }] : chatHistory,
+            top_k: 5,
+            stream: true
+        })
+    });
+}
+
 // Function to show sources panel
 function showSources(sources) {
     // Clear previous content
@@ -233,7 +350,10 @@ function showSources(sources) {
             
             const similaritySpan = document.createElement('span');
             similaritySpan.classList.add('similarity');
-            similaritySpan.textContent = `${Math.round(source.similarity * 100)}% match`;
+            // Chunks found only by keyword (BM25) search have no similarity
+            similaritySpan.textContent = source.similarity == null
+                ? 'keyword match'
+                : `${Math.round(source.similarity * 100)}% match`;
             sourceHeader.appendChild(similaritySpan);
             
             const sourceText = document.createElement('p');
@@ -277,6 +397,49 @@ fileUpload.addEventListener('change', function() {
     }
 });
 
+// Poll an ingestion job until it is done or failed
+async function waitForJob(jobId) {
+    while (true) {
+        const response = await fetch(`/api/jobs/${jobId}`);
+        const job = await response.json();
+        
+        if (!response.ok || job.stage === 'done' || job.stage === 'failed') {
+            return job;
+        }
+        
+        // Show the current stage and chunk progress
+        const progress = job.progress || {};
+        if (progress.chunks_total) {
+            uploadStatus.textContent = `Processing (${job.stage} ${progress.chunks_done}/${progress.chunks_total} chunks)...`;
+        } else {
+            uploadStatus.textContent = `Processing (${job.stage})...`;
+        }
+        
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
+// Ingest time of a document in the document list, or null if it is not listed
+async function documentTimestamp(name) {
+    const response = await fetch('/api/documents');
+    const data = await response.json();
+    const doc = (data.documents || []).find(doc => doc.title === name);
+    return doc ? doc.timestamp : null;
+}
+
+// Without a job to poll (another process indexes uploads), wait until
+// the document is listed with a new ingest time
+async function waitForDocument(name, previousTimestamp) {
+    for (let attempt = 0; attempt < 120; attempt++) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const timestamp = await documentTimestamp(name);
+        if (timestamp !== null && timestamp !== previousTimestamp) {
+            return { stage: 'done' };
+        }
+    }
+    return { stage: 'queued', error: 'Still waiting for the file to be processed; it will show up in the document list' };
+}
+
 uploadForm.addEventListener('submit', async function(e) {
     e.preventDefault();
     
@@ -303,6 +466,7 @@ uploadForm.addEventListener('submit', async function(e) {
         // Create a FormData object and append the file
         const formData = new FormData();
         formData.append('file', file);
+        const previousTimestamp = await documentTimestamp(file.name);
         
         // Send the file to the server
         const response = await fetch('/api/upload', {
@@ -313,19 +477,30 @@ uploadForm.addEventListener('submit', async function(e) {
         const result = await response.json();
         
         if (response.ok) {
-            uploadStatus.textContent = 'File uploaded successfully!';
-            uploadStatus.style.color = '#4ade80';
-            
             // Reset the file input
             fileUpload.value = '';
             fileName.textContent = 'No file chosen';
             
-            // Show success message in chat
-            addMessage(`I've uploaded ${file.name} and processed it for you. You can now ask questions about this document.`, 'user');
-            addMessage('The document has been successfully processed. I can now answer questions about it.', 'assistant');
+            // The file is processed in the background, wait for its job to finish
+            uploadStatus.textContent = 'Processing...';
+            const job = result.job_id
+                ? await waitForJob(result.job_id)
+                : await waitForDocument(file.name, previousTimestamp);
             
-            // Refresh the document list
-            fetchDocumentList();
+            if (job.stage === 'done') {
+                uploadStatus.textContent = 'File uploaded successfully!';
+                uploadStatus.style.color = '#4ade80';
+                
+                // Show success message in chat
+                addMessage(`I've uploaded ${file.name} and processed it for you. You can now ask questions about this document.`, 'user');
+                addMessage('The document has been successfully processed. I can now answer questions about it.', 'assistant');
+                
+                // Refresh the document list
+                fetchDocumentList();
+            } else {
+                uploadStatus.textContent = job.error || 'Error processing file';
+                uploadStatus.style.color = '#ff6b6b';
+            }
         } else {
             uploadStatus.textContent = result.detail || 'Error uploading file';
             uploadStatus.style.color = '#ff6b6b';
@@ -1,202 +1,781 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
-from typing import Optional, List
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from functools import lru_cache
+from typing import Any, AsyncIterator, Awaitable, Dict, Optional, List
+import asyncio
+import json
+import logging
 import os
 import shutil
+import time
 from pathlib import Path
 
 from api.models import (
-    QueryRequest, QueryResponse, ChatHistoryRequest, 
-    FileUploadResponse, DocumentListResponse
+    QueryRequest, QueryResponse, ChatHistoryRequest, RetrievalOptions, BatchQueryRequest,
+    FileUploadResponse, DocumentListResponse,
+    JobStatusResponse, JobListResponse
 )
-from embeddings.azure_openai import AzureOpenAIClient
+from embeddings.provider import ModelProvider, get_provider
 from database.qdrant_client import QdrantDB
 from models.gpt4 import DocumentQueryModel
-from file_processing.document_processor import process_document
-from config import WATCH_DIRECTORY
+from models.answer_cache import SemanticAnswerCache
+from models.reranker import LocalReranker
+from models.sessions import ChatSession, SessionStore
+from ingestion.jobs import IngestionQueue, QueueFullError
+from monitoring.metrics import TIME_TO_FIRST_TOKEN_SECONDS, collect_timings, span
+from config import (
+    WATCH_DIRECTORY, INGESTION_MODE, ANSWER_CACHE_ENABLED, BATCH_MAX_QUERIES, BATCH_MAX_CONCURRENCY,
+    RERANK_CANDIDATES, RERANK_MAX_CANDIDATES, CHAT_SESSION_CARRY_CHUNKS
+)
+
+logger = logging.getLogger(__name__)
 
 # Create router
 router = APIRouter()
 
-# Dependency for OpenAI client
-def get_openai_client():
-    return AzureOpenAIClient()
+NO_DOCUMENTS_ANSWER = "No relevant documents found in the database. Try adding documents first."
+
+# Questions searched per Qdrant batch request; answers start streaming after the first group
+BATCH_SEARCH_SIZE = 64
+
+# Dependency for the embeddings and completions provider, shared so its HTTP connections are reused
+def get_model_provider():
+    return get_provider()
 
 # Dependency for Qdrant DB
 def get_qdrant_db():
     return QdrantDB()
 
 # Dependency for Query Model
+@lru_cache(maxsize=None)
 def get_query_model():
     return DocumentQueryModel()
 
+# Dependency for the answer cache, None when it is disabled
+def get_answer_cache():
+    return SemanticAnswerCache() if ANSWER_CACHE_ENABLED else None
+
+# Reranker for two-stage retrieval
+@lru_cache(maxsize=None)
+def get_reranker():
+    return LocalReranker()
+
+# Dependency for the chat session store
+def get_session_store():
+    return SessionStore()
+
+# Dependency for the ingestion queue, None when documents are indexed by another
+# process: the ingestion daemon, or the main process of a multi-worker server
+def get_ingestion_queue():
+    return IngestionQueue() if INGESTION_MODE == "api" else None
+
 
 @router.post("/query", response_model=QueryResponse)
 async def query_documents(
     request: QueryRequest,
-    openai_client: AzureOpenAIClient = Depends(get_openai_client),
+    http_request: Request,
+    provider: ModelProvider = Depends(get_model_provider),
     db: QdrantDB = Depends(get_qdrant_db),
-    query_model: DocumentQueryModel = Depends(get_query_model)
+    query_model: DocumentQueryModel = Depends(get_query_model),
+    answer_cache: Optional[SemanticAnswerCache] = Depends(get_answer_cache)
 ):
     """
-    Query documents with a natural language question
+    Query documents with a natural language question.
+    With "stream": true the answer is sent as server-sent events.
     """
-    # Generate embedding for the query
-    query_embedding = openai_client.get_embeddings([request.query])[0]
-    
-    # Search for relevant documents
-    search_results = db.search(query_embedding, limit=request.top_k)
-    
-    # If no relevant documents found
-    if not search_results:
-        return QueryResponse(
-            answer="No relevant documents found in the database. Try adding documents first.",
-            source_documents=[]
-        )
-    
-    # Query the model with retrieved documents
-    answer = query_model.query(request.query, search_results)
-    
-    # Format source documents for response
-    formatted_sources = []
-    for doc in search_results:
-        formatted_sources.append({
-            "text": doc["text"],
-            "source": doc["metadata"].get("source", "Unknown"),
-            "similarity": doc["similarity"]
-        })
-    
-    return QueryResponse(
-        answer=answer,
-        source_documents=formatted_sources
+    if request.stream:
+        return _stream_answer(request.query, request, provider, db, query_model, answer_cache)
+    return await _timed_answer(
+        http_request,
+        request.include_timings,
+        _answer_query(request.query, request, provider, db, query_model, answer_cache)
     )
 
 
 @router.post("/chat", response_model=QueryResponse)
 async def chat_with_documents(
     request: ChatHistoryRequest,
-    openai_client: AzureOpenAIClient = Depends(get_openai_client),
+    http_request: Request,
+    provider: ModelProvider = Depends(get_model_provider),
     db: QdrantDB = Depends(get_qdrant_db),
-    query_model: DocumentQueryModel = Depends(get_query_model)
+    query_model: DocumentQueryModel = Depends(get_query_model),
+    answer_cache: Optional[SemanticAnswerCache] = Depends(get_answer_cache),
+    sessions: SessionStore = Depends(get_session_store)
 ):
     """
-    Chat with documents with history
+    Chat with documents with history.
+    The conversation is kept in a server-side session: the response carries
+    its session_id, and the next request only needs that and the new message.
     """
     # Get the last user message as query
-    user_messages = [msg for msg in request.messages if msg.role == "user"]
+    user_messages = [i for i, msg in enumerate(request.messages) if msg.role == "user"]
     if not user_messages:
         return QueryResponse(
             answer="No user message found in the request.",
             source_documents=[]
         )
     
-    last_user_message = user_messages[-1].content
+    last_user_message = request.messages[user_messages[-1]].content
+    
+    if request.session_id:
+        session = sessions.get(request.session_id)
+        if session is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Unknown or expired chat session; send the full history without session_id to start a new one"
+            )
+    else:
+        # Earlier messages sent by the client become the history of the new session
+        session = sessions.create((msg.role, msg.content) for msg in request.messages[:user_messages[-1]])
+    
+    if request.stream:
+        return _stream_answer(last_user_message, request, provider, db, query_model, answer_cache, session)
+    return await _timed_answer(
+        http_request,
+        request.include_timings,
+        _answer_query(last_user_message, request, provider, db, query_model, answer_cache, session)
+    )
+
+
+@router.delete("/chat/sessions/{session_id}", status_code=204)
+async def delete_chat_session(
+    session_id: str,
+    sessions: SessionStore = Depends(get_session_store)
+):
+    """
+    End a chat session and free its memory
+    """
+    if not sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired chat session")
+    return Response(status_code=204)
+
+
+@router.post("/query/batch")
+async def query_documents_batch(
+    request: BatchQueryRequest,
+    provider: ModelProvider = Depends(get_model_provider),
+    db: QdrantDB = Depends(get_qdrant_db),
+    query_model: DocumentQueryModel = Depends(get_query_model),
+    answer_cache: Optional[SemanticAnswerCache] = Depends(get_answer_cache)
+):
+    """
+    Answer many questions in one request. The questions are embedded
+    together, searched in batches and answered concurrently. Results are
+    streamed as NDJSON, one line per question in the order the answers
+    finish, followed by a summary line.
+    """
+    if len(request.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_QUERIES} queries per batch")
+    return StreamingResponse(
+        _batch_lines(request, provider, db, query_model, answer_cache),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"}
+    )
+
+
+async def _answer_query(
+    query: str,
+    options: RetrievalOptions,
+    provider: ModelProvider,
+    db: QdrantDB,
+    query_model: DocumentQueryModel,
+    answer_cache: Optional[SemanticAnswerCache],
+    session: Optional[ChatSession] = None
+) -> QueryResponse:
+    """
+    Retrieve relevant chunks for a query and answer it, without blocking the
+    event loop. In a chat session, retrieval and the prompt take the earlier
+    turns into account.
+    """
+    query_vector = await _embed_query(query, provider)
+    answer_cache = _turn_cache(answer_cache, session)
+    session_id = session.session_id if session else None
     
-    # Generate embedding for the query
-    query_embedding = openai_client.get_embeddings([last_user_message])[0]
+    # Serve repeated and near-duplicate questions from the answer cache
+    cached = await _cached_answer(answer_cache, query_vector, options)
+    if cached:
+        _record_turn(session, query, query_vector, options, cached["answer"], [])
+        return QueryResponse(
+            answer=cached["answer"],
+            source_documents=cached["source_documents"],
+            metadata=_cache_metadata(answer_cache, cached),
+            session_id=session_id
+        )
     
     # Search for relevant documents
-    search_results = db.search(query_embedding, limit=request.top_k)
+    search_results = await _retrieve_turn(query, query_vector, options, db, session)
     
     # If no relevant documents found
     if not search_results:
+        _record_turn(session, query, query_vector, options, NO_DOCUMENTS_ANSWER, [])
         return QueryResponse(
-            answer="No relevant documents found in the database. Try adding documents first.",
-            source_documents=[]
+            answer=NO_DOCUMENTS_ANSWER,
+            source_documents=[],
+            metadata=_cache_metadata(answer_cache, None),
+            session_id=session_id
         )
     
     # Query the model with retrieved documents
-    answer = query_model.query(last_user_message, search_results)
+    answer = await query_model.aquery(query, search_results, session.history() if session else None)
+    source_documents = _format_sources(search_results)
+    await _store_answer(answer_cache, query, query_vector, options, answer, search_results, source_documents)
+    _record_turn(session, query, query_vector, options, answer, search_results)
     
-    # Format source documents for response
+    return QueryResponse(
+        answer=answer,
+        source_documents=source_documents,
+        metadata=_cache_metadata(answer_cache, None),
+        session_id=session_id
+    )
+
+
+async def _embed_query(query: str, provider: ModelProvider) -> List[float]:
+    """Generate the embedding of a query"""
+    with span("embed"):
+        query_embeddings = await provider.aget_embeddings([query])
+    if not query_embeddings:
+        raise HTTPException(status_code=502, detail="Failed to generate an embedding for the query")
+    return query_embeddings[0]
+
+
+async def _cached_answer(
+    answer_cache: Optional[SemanticAnswerCache],
+    query_vector: List[float],
+    options: RetrievalOptions
+) -> Optional[Dict[str, Any]]:
+    """Look up a cached answer; the catalog check behind it runs off the event loop"""
+    if answer_cache is None:
+        return None
+    return await asyncio.to_thread(answer_cache.get, query_vector, _cache_scope(options))
+
+
+async def _store_answer(
+    answer_cache: Optional[SemanticAnswerCache],
+    query: str,
+    query_vector: List[float],
+    options: RetrievalOptions,
+    answer: str,
+    search_results: List[Dict[str, Any]],
+    source_documents: List[Dict[str, Any]]
+) -> None:
+    """Cache a generated answer"""
+    # Failed completions come back as "Error: ..." text and must not be cached
+    if answer_cache is None or answer.startswith("Error:"):
+        return
+    await asyncio.to_thread(
+        answer_cache.put, query, query_vector, _cache_scope(options), answer, search_results, source_documents
+    )
+
+
+async def _retrieve(
+    query: str,
+    query_vector: List[float],
+    options: RetrievalOptions,
+    db: QdrantDB,
+    with_vectors: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Search with the request's mode and filters, reranking over-fetched
+    candidates in two-stage mode. With with_vectors the results keep their
+    dense vectors as "vector".
+    """
+    candidates = _rerank_candidates(options)
+    with span("search"):
+        search_results = await db.asearch(
+            query_vector,
+            limit=candidates or options.top_k,
+            query_text=query,
+            mode=options.search_mode,
+            filters=_search_filters(options),
+            with_vectors=with_vectors or bool(candidates)
+        )
+    if candidates:
+        with span("rerank"):
+            search_results = await asyncio.to_thread(
+                get_reranker().rerank, query, query_vector, search_results, options.top_k
+            )
+    return search_results if with_vectors else _without_vectors(search_results)
+
+
+async def _retrieve_turn(
+    query: str,
+    query_vector: List[float],
+    options: RetrievalOptions,
+    db: QdrantDB,
+    session: Optional[ChatSession]
+) -> List[Dict[str, Any]]:
+    """
+    Retrieve for a question, in the context of the conversation when it is
+    part of a chat session. A follow-up is searched with its embedding blended
+    with the previous question's and with the previous question's terms, and
+    the most related chunks of earlier turns are added to the results. A
+    question that closely repeats the previous one is answered from the
+    session's chunks without a search.
+    """
+    if session is None:
+        return await _retrieve(query, query_vector, options, db)
+    
+    sessions = get_session_store()
+    scope = _cache_scope(options)
+    if sessions.reusable(session, query_vector, scope):
+        return sessions.related_chunks(session, query_vector, options.top_k, scope)
+    
+    search_vector = sessions.search_vector(session, query_vector)
+    search_text = f"{session.turns[-1][0]} {query}" if session.turns else query
+    search_results = await _retrieve(search_text, search_vector, options, db, with_vectors=True)
+    carried = sessions.related_chunks(
+        session, search_vector, CHAT_SESSION_CARRY_CHUNKS, scope,
+        exclude=[result["id"] for result in search_results]
+    )
+    return search_results + carried
+
+
+def _turn_cache(
+    answer_cache: Optional[SemanticAnswerCache],
+    session: Optional[ChatSession]
+) -> Optional[SemanticAnswerCache]:
+    """Follow-ups depend on the conversation, so only the first question of a chat uses the answer cache"""
+    return answer_cache if session is None or not session.turns else None
+
+
+def _record_turn(
+    session: Optional[ChatSession],
+    query: str,
+    query_vector: List[float],
+    options: RetrievalOptions,
+    answer: str,
+    search_results: List[Dict[str, Any]]
+) -> None:
+    """Add an answered question to its chat session; failed completions are left out"""
+    if session is None or answer.startswith("Error:"):
+        return
+    get_session_store().record_turn(session, query, query_vector, _cache_scope(options), answer, search_results)
+
+
+def _without_vectors(search_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop the dense vectors from search results"""
+    return [
+        {key: value for key, value in result.items() if key != "vector"} if "vector" in result else result
+        for result in search_results
+    ]
+
+
+def _rerank_candidates(options: RetrievalOptions) -> int:
+    """Number of candidates to fetch for reranking, or 0 for a single-stage search"""
+    candidates = RERANK_CANDIDATES if options.rerank_candidates is None else options.rerank_candidates
+    candidates = min(candidates, RERANK_MAX_CANDIDATES)
+    return candidates if candidates > options.top_k else 0
+
+
+def _search_filters(options: RetrievalOptions) -> Optional[Dict[str, Any]]:
+    """Filters of a request in the form QdrantDB.search takes them"""
+    return options.filters.model_dump(exclude_none=True) if options.filters else None
+
+
+def _cache_scope(options: RetrievalOptions) -> str:
+    """Answers are only reused for requests with the same retrieval options"""
+    return options.model_dump_json(include={"top_k", "search_mode", "filters", "rerank_candidates"})
+
+
+def _cache_metadata(answer_cache: Optional[SemanticAnswerCache], cached: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Describe the answer cache outcome for the response metadata"""
+    if answer_cache is None:
+        return {"cache": "disabled"}
+    if cached is None:
+        return {"cache": "miss"}
+    return {
+        "cache": "hit",
+        "similarity": round(cached["similarity"], 4),
+        "cached_query": cached["cached_query"],
+    }
+
+
+def _format_sources(search_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Format source documents for a response"""
     formatted_sources = []
     for doc in search_results:
         formatted_sources.append({
             "text": doc["text"],
             "source": doc["metadata"].get("source", "Unknown"),
-            "similarity": doc["similarity"]
+            "similarity": doc["similarity"],
+            "score": doc.get("score")
         })
+    return formatted_sources
+
+
+def _stream_answer(
+    query: str,
+    options: RetrievalOptions,
+    provider: ModelProvider,
+    db: QdrantDB,
+    query_model: DocumentQueryModel,
+    answer_cache: Optional[SemanticAnswerCache],
+    session: Optional[ChatSession] = None
+) -> StreamingResponse:
+    """
+    Answer a query as server-sent events:
     
-    return QueryResponse(
-        answer=answer,
-        source_documents=formatted_sources
+    - "sources": the retrieved source documents, the answer cache outcome and
+      the chat session ID, sent as soon as the search is done
+    - "token": a piece of the answer, sent as the model produces it
+    - "done": timings, including the time to first token in ttft_ms
+    - "error": sent instead of the remaining events if something fails
+    
+    The stream is cancelled when the client disconnects.
+    """
+    return StreamingResponse(
+        _answer_events(query, options, provider, db, query_model, answer_cache, session),
+        media_type="text/event-stream",
+        # Stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
-@router.post("/upload", response_model=FileUploadResponse)
-async def upload_file(
-    file: UploadFile = File(...),
-    db: QdrantDB = Depends(get_qdrant_db),
-    openai_client: AzureOpenAIClient = Depends(get_openai_client)
-):
+async def _answer_events(
+    query: str,
+    options: RetrievalOptions,
+    provider: ModelProvider,
+    db: QdrantDB,
+    query_model: DocumentQueryModel,
+    answer_cache: Optional[SemanticAnswerCache],
+    session: Optional[ChatSession] = None
+) -> AsyncIterator[str]:
+    started = time.perf_counter()
+    try:
+        query_vector = await _embed_query(query, provider)
+    except HTTPException as e:
+        yield _sse("error", {"detail": e.detail})
+        return
+    answer_cache = _turn_cache(answer_cache, session)
+    session_fields = {"session_id": session.session_id} if session else {}
+    
+    cached = await _cached_answer(answer_cache, query_vector, options)
+    if cached:
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        _record_turn(session, query, query_vector, options, cached["answer"], [])
+        yield _sse("sources", {
+            "source_documents": cached["source_documents"],
+            "retrieval_ms": elapsed_ms,
+            "metadata": _cache_metadata(answer_cache, cached),
+            **session_fields
+        })
+        yield _sse("token", {"text": cached["answer"]})
+        yield _sse("done", {"ttft_ms": elapsed_ms, "retrieval_ms": elapsed_ms, "total_ms": elapsed_ms, "tokens": 1})
+        return
+    
+    search_results = await _retrieve_turn(query, query_vector, options, db, session)
+    retrieval_ms = (time.perf_counter() - started) * 1000
+    source_documents = _format_sources(search_results)
+    yield _sse("sources", {
+        "source_documents": source_documents,
+        "retrieval_ms": round(retrieval_ms, 1),
+        "metadata": _cache_metadata(answer_cache, None),
+        **session_fields
+    })
+    
+    if not search_results:
+        _record_turn(session, query, query_vector, options, NO_DOCUMENTS_ANSWER, [])
+        yield _sse("token", {"text": NO_DOCUMENTS_ANSWER})
+        yield _sse("done", {"ttft_ms": None, "retrieval_ms": round(retrieval_ms, 1), "total_ms": round(retrieval_ms, 1), "tokens": 0})
+        return
+    
+    ttft_ms = None
+    pieces = []
+    try:
+        async for token in query_model.astream(query, search_results, session.history() if session else None):
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - started) * 1000
+                TIME_TO_FIRST_TOKEN_SECONDS.observe(ttft_ms / 1000)
+                logger.debug("Time to first token: %.0f ms (retrieval %.0f ms)", ttft_ms, retrieval_ms)
+            pieces.append(token)
+            yield _sse("token", {"text": token})
+    except Exception as e:
+        logger.error("Error generating completion: %s", e)
+        yield _sse("error", {"detail": f"Error generating completion: {e}"})
+        return
+    
+    answer = "".join(pieces)
+    await _store_answer(answer_cache, query, query_vector, options, answer, search_results, source_documents)
+    _record_turn(session, query, query_vector, options, answer, search_results)
+    
+    total_ms = (time.perf_counter() - started) * 1000
+    yield _sse("done", {
+        "ttft_ms": None if ttft_ms is None else round(ttft_ms, 1),
+        "retrieval_ms": round(retrieval_ms, 1),
+        "total_ms": round(total_ms, 1),
+        "tokens": len(pieces)
+    })
+
+
+async def _batch_lines(
+    request: BatchQueryRequest,
+    provider: ModelProvider,
+    db: QdrantDB,
+    query_model: DocumentQueryModel,
+    answer_cache: Optional[SemanticAnswerCache]
+) -> AsyncIterator[str]:
     """
-    Upload a file and process it
+    Answer the questions of a batch request. Each line is either
+    {"index", "query", "answer", "source_documents", "metadata", "elapsed_ms"}
+    or, if that question failed, {"index", "query", "error", "elapsed_ms"}.
+    The last line is {"summary": {...}}.
     """
-    try:
-        # Print debug information
-        print(f"Upload requested for file: {file.filename}")
-        print(f"WATCH_DIRECTORY path: {WATCH_DIRECTORY}")
-        
-        # Ensure WATCH_DIRECTORY is an absolute path
-        abs_watch_dir = os.path.abspath(WATCH_DIRECTORY)
-        print(f"Absolute WATCH_DIRECTORY path: {abs_watch_dir}")
-        
-        # Create the watch directory if it doesn't exist
-        os.makedirs(abs_watch_dir, exist_ok=True)
-        print(f"Directory exists or was created: {os.path.exists(abs_watch_dir)}")
-        
-        # Save the file to the watch directory with absolute path
-        file_path = os.path.join(abs_watch_dir, file.filename)
-        print(f"Saving file to: {file_path}")
-        
+    started = time.perf_counter()
+    queries = request.queries
+    limit = min(request.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    semaphore = asyncio.Semaphore(limit)
+    lines: asyncio.Queue = asyncio.Queue()
+    reported = set()
+    scheduled = set()
+    answer_tasks = []
+    counts = {"answered": 0, "cached": 0, "failed": 0}
+    
+    def report(index: int, response: Optional[QueryResponse] = None, error: Optional[str] = None) -> None:
+        if error is not None:
+            counts["failed"] += 1
+            line = {"index": index, "query": queries[index], "error": error}
+        else:
+            counts["cached" if response.metadata.get("cache") == "hit" else "answered"] += 1
+            line = {"index": index, "query": queries[index], **response.model_dump(exclude={"session_id", "timings"})}
+        line["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        reported.add(index)
+        lines.put_nowait(json.dumps(line) + "\n")
+    
+    async def answer(index: int, query_vector: List[float], search_results: List[Dict[str, Any]]) -> None:
         try:
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            print(f"File saved successfully to: {file_path}")
-        except Exception as save_error:
-            print(f"Error saving file: {save_error}")
-            raise HTTPException(status_code=500, detail=f"Error saving file: {str(save_error)}")
-        
-        # Process the document using the same logic as in main.py
-        print(f"Processing document: {file_path}")
-        document_chunks = process_document(file_path)
-        print(f"Document processed, chunks extracted: {len(document_chunks)}")
+            async with semaphore:
+                answer = await query_model.aquery(queries[index], search_results)
+            if answer.startswith("Error:"):
+                report(index, error=answer)
+                return
+            source_documents = _format_sources(search_results)
+            await _store_answer(answer_cache, queries[index], query_vector, request, answer, search_results, source_documents)
+            report(index, QueryResponse(
+                answer=answer,
+                source_documents=source_documents,
+                metadata=_cache_metadata(answer_cache, None)
+            ))
+        except Exception as e:
+            report(index, error=f"Error generating completion: {e}")
+    
+    async def retrieve_all() -> None:
+        # One or a few embedding requests for the whole batch
+        with span("embed"):
+            query_vectors = await provider.aget_embeddings(queries)
+        if len(query_vectors) != len(queries):
+            for index in range(len(queries)):
+                report(index, error="Failed to generate embeddings for the batch")
+            return
         
-        if document_chunks:
-            # Extract texts and metadata
-            texts = [chunk[0] for chunk in document_chunks]
-            metadatas = [chunk[1] for chunk in document_chunks]
+        for start in range(0, len(queries), BATCH_SEARCH_SIZE):
+            pending = []
+            for index in range(start, min(start + BATCH_SEARCH_SIZE, len(queries))):
+                try:
+                    cached = await _cached_answer(answer_cache, query_vectors[index], request)
+                except Exception as e:
+                    logger.warning("Error reading answer cache: %s", e)
+                    cached = None
+                if cached:
+                    report(index, QueryResponse(
+                        answer=cached["answer"],
+                        source_documents=cached["source_documents"],
+                        metadata=_cache_metadata(answer_cache, cached)
+                    ))
+                else:
+                    pending.append(index)
+            if not pending:
+                continue
             
-            # Generate embeddings
-            print(f"Generating embeddings for {len(texts)} chunks")
-            embeddings = openai_client.get_embeddings(texts)
-            print(f"Embeddings generated: {len(embeddings)}")
-            
-            if embeddings:
-                # Add texts to database
-                print(f"Adding {len(texts)} chunks to database")
-                db.add_texts(texts, embeddings, metadatas)
-                print(f"Successfully added to database")
-                
-                return FileUploadResponse(
-                    filename=file.filename,
-                    message=f"File uploaded and processed successfully. Added {len(texts)} chunks to the database."
-                )
-            else:
-                error_msg = f"Failed to generate embeddings for {file.filename}"
-                print(error_msg)
-                raise HTTPException(status_code=500, detail=error_msg)
-        else:
-            error_msg = f"No text chunks extracted from {file.filename}"
-            print(error_msg)
-            raise HTTPException(status_code=500, detail=error_msg)
+            try:
+                candidates = _rerank_candidates(request)
+                with span("search"):
+                    results = await db.asearch_batch(
+                        [query_vectors[index] for index in pending],
+                        limit=candidates or request.top_k,
+                        query_texts=[queries[index] for index in pending],
+                        mode=request.search_mode,
+                        filters=_search_filters(request),
+                        with_vectors=bool(candidates)
+                    )
+                if candidates:
+                    with span("rerank"):
+                        results = await asyncio.to_thread(lambda: [
+                            _without_vectors(get_reranker().rerank(
+                                queries[index], query_vectors[index], search_results, request.top_k
+                            ))
+                            for index, search_results in zip(pending, results)
+                        ])
+            except Exception as e:
+                logger.error("Error in batch search: %s", e)
+                for index in pending:
+                    report(index, error=f"Error searching documents: {e}")
+                continue
             
-    except Exception as e:
-        error_msg = f"Error processing file: {str(e)}"
-        print(error_msg)
-        print(f"Exception type: {type(e)}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=error_msg)
+            for index, search_results in zip(pending, results):
+                if not search_results:
+                    report(index, QueryResponse(
+                        answer=NO_DOCUMENTS_ANSWER,
+                        source_documents=[],
+                        metadata=_cache_metadata(answer_cache, None)
+                    ))
+                else:
+                    scheduled.add(index)
+                    answer_tasks.append(asyncio.create_task(answer(index, query_vectors[index], search_results)))
+    
+    async def produce() -> None:
+        try:
+            await retrieve_all()
+        except Exception as e:
+            # Every question still gets exactly one line
+            logger.exception("Error in batch query: %s", e)
+            for index in range(len(queries)):
+                if index not in reported and index not in scheduled:
+                    report(index, error=f"Error answering the batch: {e}")
+    
+    producer = asyncio.create_task(produce())
+    try:
+        for _ in range(len(queries)):
+            yield await lines.get()
+        yield json.dumps({"summary": {
+            "queries": len(queries),
+            **counts,
+            "max_concurrency": limit,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        }}) + "\n"
+    finally:
+        # Stop outstanding work when the client disconnects
+        producer.cancel()
+        for task in answer_tasks:
+            task.cancel()
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Encode a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _run_until_disconnected(http_request: Request, coroutine: Awaitable[Any]) -> Any:
+    """
+    Await a coroutine, cancelling it if the client disconnects first so that
+    abandoned requests stop consuming model and database capacity
+    """
+    task = asyncio.ensure_future(coroutine)
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(http_request))
+    try:
+        await asyncio.wait({task, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnect.cancel()
+    
+    if not task.done():
+        task.cancel()
+        logger.debug("Client disconnected, cancelled request")
+        # Nobody is listening anymore; 499 is the conventional "client closed request" status
+        return Response(status_code=499)
+    return task.result()
+
+
+async def _timed_answer(http_request: Request, include_timings: bool, coroutine: Awaitable[Any]) -> Any:
+    """
+    Answer a request with _run_until_disconnected, adding the time spent in
+    each stage to the response if the client asked for it
+    """
+    started = time.perf_counter()
+    # The answer runs in a task, which shares the breakdown through its copy of the context
+    with collect_timings() as timings:
+        response = await _run_until_disconnected(http_request, coroutine)
+    if include_timings and isinstance(response, QueryResponse):
+        response.timings = {stage: round(ms, 1) for stage, ms in timings.items()}
+        response.timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+    return response
+
+
+async def _wait_for_disconnect(http_request: Request) -> None:
+    """Return once the client has closed the connection"""
+    while True:
+        message = await http_request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+@router.post("/upload", response_model=FileUploadResponse, status_code=202)
+async def upload_file(
+    file: UploadFile = File(...),
+    ingestion_queue: Optional[IngestionQueue] = Depends(get_ingestion_queue)
+):
+    """
+    Upload a file and queue it for processing. Poll /api/jobs/{job_id} for progress.
+    With the ingestion daemon, or with several API workers, the file is only
+    saved to the watch directory, where the indexing process's watcher picks
+    it up, and no job_id is returned.
+    """
+    logger.debug("Upload requested for file: %s", file.filename)
+    
+    # Ensure WATCH_DIRECTORY is an absolute path and exists
+    abs_watch_dir = os.path.abspath(WATCH_DIRECTORY)
+    os.makedirs(abs_watch_dir, exist_ok=True)
+    
+    # Save the file to the watch directory with absolute path
+    file_path = os.path.join(abs_watch_dir, file.filename)
+    try:
+        await run_in_threadpool(_save_upload, file, file_path)
+    except Exception as save_error:
+        logger.error("Error saving file: %s", save_error)
+        raise HTTPException(status_code=500, detail=f"Error saving file: {str(save_error)}")
+    
+    if ingestion_queue is None:
+        return FileUploadResponse(
+            filename=file.filename,
+            message="File uploaded; it will be indexed shortly."
+        )
+    
+    try:
+        job = ingestion_queue.submit(file_path, origin="upload")
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    
+    return FileUploadResponse(
+        filename=file.filename,
+        message="File uploaded and queued for processing.",
+        job_id=job.id
+    )
+
+
+def _save_upload(file: UploadFile, file_path: str) -> None:
+    """Write an upload next to its final name first, so the watcher never sees a partial file"""
+    partial_path = file_path + ".part"
+    with open(partial_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+    os.replace(partial_path, file_path)
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(
+    job_id: str,
+    ingestion_queue: Optional[IngestionQueue] = Depends(get_ingestion_queue)
+):
+    """
+    Get the stage, progress and timings of an ingestion job
+    """
+    if ingestion_queue is None:
+        raise HTTPException(status_code=404, detail="Ingestion jobs run in another process and are not tracked here")
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return JobStatusResponse(**job.to_dict())
+
+
+@router.get("/jobs", response_model=JobListResponse)
+async def list_jobs(
+    limit: int = 100,
+    ingestion_queue: Optional[IngestionQueue] = Depends(get_ingestion_queue)
+):
+    """
+    List the most recent ingestion jobs, newest first (none when another
+    process indexes the documents)
+    """
+    jobs = ingestion_queue.list(limit) if ingestion_queue is not None else []
+    return JobListResponse(jobs=[JobStatusResponse(**job.to_dict()) for job in jobs])
 
 
 @router.get("/documents", response_model=DocumentListResponse)
@@ -206,5 +785,6 @@ async def get_documents(
     """
     Get a list of all indexed documents
     """
-    documents = db.get_document_list()
+    # Scrolls the whole catalog, so keep it off the event loop
+    documents = await asyncio.to_thread(db.get_document_list)
     return DocumentListResponse(documents=documents)
\ No newline at end of file
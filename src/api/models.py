@@ -1,5 +1,6 @@
-from typing import List, Dict, Any, Optional
-from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Dict, Any, Literal, Optional
+from pydantic import BaseModel, Field
 
 
 class Message(BaseModel):
@@ -7,25 +8,89 @@ class Message(BaseModel):
     content: str
 
 
-class QueryRequest(BaseModel):
-    query: str
+class SearchFilters(BaseModel):
+    """Restrict retrieval; all given conditions must match"""
+    # Document paths as listed by /documents
+    sources: Optional[List[str]] = None
+    # e.g. ["pdf"]
+    file_types: Optional[List[str]] = None
+    # Ingest time range of the chunks, after is inclusive, before exclusive
+    ingested_after: Optional[datetime] = None
+    ingested_before: Optional[datetime] = None
+
+
+class RetrievalOptions(BaseModel):
+    """Retrieval options shared by /query, /chat and /query/batch"""
     top_k: int = 5
+    # Dense (embedding), sparse (BM25) or hybrid retrieval; defaults to SEARCH_MODE
+    search_mode: Optional[Literal["dense", "sparse", "hybrid"]] = None
+    filters: Optional[SearchFilters] = None
+    # Two-stage retrieval: fetch this many candidates and rerank them locally
+    # down to top_k; defaults to RERANK_CANDIDATES, 0 turns it off
+    rerank_candidates: Optional[int] = Field(default=None, ge=0)
 
 
-class ChatHistoryRequest(BaseModel):
+class QueryRequest(RetrievalOptions):
+    query: str
+    # Stream the answer as server-sent events instead of returning JSON
+    stream: bool = False
+    # Add the time spent in each stage to the JSON response
+    include_timings: bool = False
+
+
+class ChatHistoryRequest(RetrievalOptions):
     messages: List[Message]
-    top_k: int = 5
+    stream: bool = False
+    include_timings: bool = False
+    # Server-side session to continue; then only the new message needs to be sent.
+    # Without it a new session is started from the messages.
+    session_id: Optional[str] = None
+
+
+class BatchQueryRequest(RetrievalOptions):
+    # Retrieval options apply to every question
+    queries: List[str] = Field(min_length=1)
+    # Completions generated at the same time, capped by BATCH_MAX_CONCURRENCY
+    max_concurrency: Optional[int] = Field(default=None, gt=0)
 
 
 class FileUploadResponse(BaseModel):
     filename: str
     message: str
+    job_id: Optional[str] = None
 
 
 class QueryResponse(BaseModel):
     answer: str
     source_documents: List[Dict[str, Any]]
+    # E.g. {"cache": "hit", "similarity": 0.97} from the answer cache
+    metadata: Dict[str, Any] = {}
+    # Chat session to continue with the next message (/chat only)
+    session_id: Optional[str] = None
+    # Milliseconds per stage (embed, search, rerank, context, completion) and
+    # in total, with include_timings
+    timings: Optional[Dict[str, float]] = None
 
 
 class DocumentListResponse(BaseModel):
-    documents: List[Dict[str, Any]]
\ No newline at end of file
+    documents: List[Dict[str, Any]]
+
+
+class JobStatusResponse(BaseModel):
+    id: str
+    path: str
+    filename: str
+    kind: str
+    origin: str
+    stage: str
+    progress: Dict[str, int]
+    timings: Dict[str, float]
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+class JobListResponse(BaseModel):
+    jobs: List[JobStatusResponse]
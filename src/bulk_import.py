@@ -0,0 +1,339 @@
+"""
+Bulk import: index a large document tree in one run, e.g. when onboarding
+a team, instead of letting the watcher work through it file by file.
+
+Files are extracted in parallel across CPU cores. Their new chunks are
+pooled into large batches, embedded with the full EMBEDDING_MAX_CONCURRENCY
+and upserted while the next batch is being embedded. A file is recorded in
+the manifest once all its chunks are stored, so an interrupted run resumes
+where it stopped: finished files are skipped as unchanged, and the chunks
+already stored for a partly imported file are not embedded again.
+
+Usage:
+    python -m src.bulk_import
+    python src/bulk_import.py D:/Manuals --extract-workers 8
+"""
+import argparse
+import logging
+import os
+import signal
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+# Make the project root (config) and src (packages) importable however the command is started
+SRC = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [SRC, os.path.dirname(SRC)]
+
+from config import (  # noqa: E402
+    WATCH_DIRECTORY,
+    INGEST_EXTRACT_WORKERS,
+    INGEST_LOCK_PATH,
+    EMBEDDING_BATCH_MAX_SIZE,
+    EMBEDDING_MAX_CONCURRENCY,
+    LOG_LEVEL
+)
+from database.qdrant_client import QdrantDB, make_point_id  # noqa: E402
+from embeddings.provider import get_provider  # noqa: E402
+from file_processing.document_processor import iter_document  # noqa: E402
+from ingestion.indexer import finalize_file, iter_documents, plan_file, reset_stale_manifest  # noqa: E402
+from ingestion.lock import ProcessLock  # noqa: E402
+from ingestion.manifest import FileManifest  # noqa: E402
+from monitoring.metrics import span  # noqa: E402
+
+logger = logging.getLogger("bulk_import")
+
+# Seconds between progress log lines
+PROGRESS_INTERVAL = 10.0
+
+
+def _ignore_interrupt() -> None:
+    """Extraction processes leave Ctrl+C to the main process, which shuts them down"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _extract(path: str) -> Tuple[List[Tuple[str, Dict[str, Any]]], Optional[str]]:
+    """Chunks of a document, extracted in a worker process, and the error if extraction failed"""
+    try:
+        return list(iter_document(path)), None
+    except Exception as e:
+        return [], str(e)
+
+
+class BulkImport:
+    """
+    Indexes the documents handed to add() in large batches. Files stay
+    pending until every one of their new chunks has been upserted.
+    """
+
+    def __init__(self, db: QdrantDB, manifest: FileManifest, batch_chunks: int):
+        """
+        Args:
+            db: Vector database
+            manifest: File manifest, the checkpoint of the import
+            batch_chunks: New chunks embedded and upserted together
+        """
+        self.db = db
+        self.provider = get_provider()
+        self.manifest = manifest
+        self.batch_chunks = batch_chunks
+
+        self.stats = {
+            "files": 0, "unchanged": 0, "indexed": 0, "empty": 0, "failed": 0,
+            "chunks": 0, "embedded": 0, "tokens": 0
+        }
+        # path -> plan, point IDs, first chunk metadata, new chunks not yet stored
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._batch: List[Tuple[str, str, str, Dict[str, Any]]] = []
+        # Upserts run in this thread while the main thread embeds the next batch
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bulk-upsert")
+        self._write: Optional[Future] = None
+        self._write_batch: List[Tuple[str, str, str, Dict[str, Any]]] = []
+
+    def add(self, plan: Dict[str, Any], document_chunks: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """
+        Queue the new chunks of an extracted file
+
+        Args:
+            plan: Result of plan_file for the file
+            document_chunks: All chunks of the file
+        """
+        path = plan["path"]
+        point_ids: List[str] = []
+        chunks = []
+        seen = set()
+        for text, metadata in document_chunks:
+            # Identical chunks within a file map to the same point, keep the first one
+            point_id = make_point_id(metadata["source"], text)
+            if point_id not in seen:
+                seen.add(point_id)
+                point_ids.append(point_id)
+                chunks.append((point_id, text, metadata))
+
+        if not point_ids:
+            logger.warning("No text chunks extracted from %s", path)
+            self.stats["empty"] += 1
+            return
+
+        if plan["entry"]:
+            existing = set(plan["entry"]["point_ids"])
+        else:
+            # Not in the manifest: some chunks may have been stored by an interrupted run
+            existing = set(self.db.existing_ids(point_ids))
+        new = [chunk for chunk in chunks if chunk[0] not in existing]
+
+        self._files[path] = {
+            "plan": plan,
+            "point_ids": point_ids,
+            "first_metadata": chunks[0][2],
+            "remaining": len(new),
+            "added": 0
+        }
+        if not new:
+            self._finish(path)
+            return
+
+        self._batch.extend((path, point_id, text, metadata) for point_id, text, metadata in new)
+        if len(self._batch) >= self.batch_chunks:
+            self.flush()
+
+    def fail(self, path: str, error: str) -> None:
+        """Count a file whose extraction failed"""
+        logger.error("Error processing document %s: %s", path, error)
+        self.stats["failed"] += 1
+
+    def flush(self) -> None:
+        """Embed the pending batch, then upsert it once the previous upsert is done"""
+        # Chunks of files that already failed are left out
+        batch = [chunk for chunk in self._batch if chunk[0] in self._files]
+        self._batch = []
+        if not batch:
+            return
+
+        with span("embed"):
+            embeddings = self.provider.get_embeddings([text for _, _, text, _ in batch])
+        if not embeddings:
+            logger.error("Failed to generate embeddings for a batch of %d chunks", len(batch))
+            for path in {path for path, _, _, _ in batch}:
+                self._fail_pending(path)
+            return
+
+        self.wait()
+        self._write = self._writer.submit(self._upsert, batch, embeddings)
+        self._write_batch = batch
+
+    def wait(self) -> None:
+        """Wait for the running upsert and complete the files it finished"""
+        if self._write is None:
+            return
+        try:
+            self._write.result()
+            error = None
+        except Exception as e:
+            error = e
+        # Only forgotten once done, so it can be waited for again after a Ctrl+C
+        self._write = None
+        batch, self._write_batch = self._write_batch, []
+        if error is not None:
+            logger.error("Failed to upsert a batch of %d chunks: %s", len(batch), error)
+            for path in {path for path, _, _, _ in batch}:
+                self._fail_pending(path)
+            return
+        for path, _, _, metadata in batch:
+            state = self._files.get(path)
+            if state is None:
+                continue
+            state["remaining"] -= 1
+            state["added"] += 1
+            self.stats["embedded"] += 1
+            self.stats["tokens"] += metadata.get("tokens", 0)
+            if state["remaining"] == 0:
+                self._finish(path)
+
+    def close(self) -> None:
+        """Store everything still pending"""
+        try:
+            self.flush()
+            self.wait()
+        finally:
+            self._writer.shutdown()
+
+    def pending(self) -> int:
+        """Files extracted but not completely stored yet"""
+        return len(self._files)
+
+    def _upsert(self, batch: List[Tuple[str, str, str, Dict[str, Any]]], embeddings: List[List[float]]) -> None:
+        with span("upsert"):
+            self.db.add_texts(
+                [text for _, _, text, _ in batch],
+                embeddings,
+                [metadata for _, _, _, metadata in batch],
+                ids=[point_id for _, point_id, _, _ in batch]
+            )
+
+    def _fail_pending(self, path: str) -> None:
+        # Chunks it already has stored are reused by the next run
+        if self._files.pop(path, None) is not None:
+            logger.error("Failed to index %s", path)
+            self.stats["failed"] += 1
+
+    def _finish(self, path: str) -> None:
+        state = self._files.pop(path)
+        result = finalize_file(
+            state["plan"], state["point_ids"], state["first_metadata"], state["added"], self.db, self.manifest
+        )
+        self.stats["indexed"] += 1
+        self.stats["chunks"] += result["chunks"]
+
+
+def print_summary(stats: Dict[str, int], seconds: float, interrupted: bool) -> None:
+    """Print the outcome and the throughput of the import"""
+    seconds = max(seconds, 1e-9)
+    processed = stats["indexed"] + stats["empty"] + stats["failed"]
+    print("Bulk import " + ("interrupted; run it again to resume" if interrupted else "finished"))
+    print(f"  files:    {stats['files']} seen, {stats['unchanged']} unchanged, {stats['indexed']} indexed, "
+          f"{stats['empty']} empty, {stats['failed']} failed")
+    print(f"  chunks:   {stats['chunks']} in indexed files, {stats['embedded']} embedded")
+    print(f"  tokens:   {stats['tokens']} embedded")
+    print(f"  time:     {seconds:.1f} s")
+    print(f"  files/s:  {processed / seconds:.2f}")
+    print(f"  chunks/s: {stats['embedded'] / seconds:.1f}")
+    print(f"  tokens/s: {stats['tokens'] / seconds:.0f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Index a large document tree in one resumable run")
+    parser.add_argument(
+        "directory", nargs="?", default=WATCH_DIRECTORY, help="Document tree to import (default: WATCH_DIRECTORY)"
+    )
+    parser.add_argument(
+        "--extract-workers", type=int, default=INGEST_EXTRACT_WORKERS or os.cpu_count() or 1,
+        help="Extraction processes (default: INGEST_EXTRACT_WORKERS, or one per CPU core)"
+    )
+    parser.add_argument(
+        "--batch-chunks", type=int, default=2 * EMBEDDING_MAX_CONCURRENCY * EMBEDDING_BATCH_MAX_SIZE,
+        help="New chunks embedded and upserted together; the default keeps every embedding worker busy"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    directory = os.path.abspath(args.directory)
+    if not os.path.isdir(directory):
+        logger.error("%s is not a directory", directory)
+        return 1
+
+    # The import writes the manifest like ingestd does, so they must not run at the same time
+    lock = ProcessLock(INGEST_LOCK_PATH)
+    if not lock.acquire():
+        logger.error("ingestd or another import (PID %s) holds %s; stop it first", lock.holder(), lock.path)
+        return 1
+
+    db = QdrantDB()
+    manifest = FileManifest()
+    reset_stale_manifest(db, manifest)
+    importer = BulkImport(db, manifest, max(1, args.batch_chunks))
+    stats = importer.stats
+
+    logger.info("Importing %s with %d extraction processes", directory, args.extract_workers)
+    start = time.perf_counter()
+    last_progress = start
+    interrupted = False
+    extracting: Dict[Future, Dict[str, Any]] = {}
+    pool = ProcessPoolExecutor(max_workers=args.extract_workers, initializer=_ignore_interrupt)
+
+    def collect(done) -> None:
+        for future in done:
+            plan = extracting.pop(future)
+            document_chunks, error = future.result()
+            if error is not None:
+                importer.fail(plan["path"], error)
+            else:
+                importer.add(plan, document_chunks)
+
+    try:
+        for path in iter_documents(directory):
+            stats["files"] += 1
+            try:
+                plan = plan_file(path)
+            except OSError as e:
+                importer.fail(path, str(e))
+                continue
+            if plan["status"] == "unchanged":
+                stats["unchanged"] += 1
+                continue
+
+            # Bound the extracted files held in memory
+            while len(extracting) >= 2 * args.extract_workers:
+                done, _ = wait(extracting, return_when=FIRST_COMPLETED)
+                collect(done)
+            extracting[pool.submit(_extract, plan["path"])] = plan
+
+            now = time.perf_counter()
+            if now - last_progress >= PROGRESS_INTERVAL:
+                last_progress = now
+                logger.info(
+                    "%d files seen, %d indexed, %d unchanged, %d chunks embedded",
+                    stats["files"], stats["indexed"], stats["unchanged"], stats["embedded"]
+                )
+
+        while extracting:
+            done, _ = wait(extracting, return_when=FIRST_COMPLETED)
+            collect(done)
+        importer.close()
+    except KeyboardInterrupt:
+        interrupted = True
+        logger.warning("Interrupted, %d files were not completely stored", importer.pending() + len(extracting))
+        pool.shutdown(wait=False, cancel_futures=True)
+        # Files completed by the running upsert are still checkpointed
+        importer.wait()
+    finally:
+        pool.shutdown(wait=not interrupted)
+        lock.release()
+
+    print_summary(stats, time.perf_counter() - start, interrupted)
+    return 130 if interrupted else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,77 @@
 import os
-from typing import Dict, List, Any, Optional
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Sized, Tuple, Union
+import numpy as np
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 import uuid
-from config import QDRANT_PATH, COLLECTION_NAME, VECTOR_SIZE
+import datetime
+from config import (
+    QDRANT_URL,
+    QDRANT_API_KEY,
+    QDRANT_PREFER_GRPC,
+    QDRANT_GRPC_PORT,
+    QDRANT_TIMEOUT,
+    QDRANT_UPSERT_BATCH_SIZE,
+    QDRANT_UPSERT_PARALLEL,
+    QDRANT_UPSERT_MAX_RETRIES,
+    QDRANT_PATH,
+    COLLECTION_NAME,
+    CATALOG_COLLECTION_NAME,
+    VECTOR_SIZE,
+    SEARCH_MODE,
+    HYBRID_PREFETCH_MULTIPLIER,
+    RRF_K,
+    VECTOR_QUANTIZATION,
+    QUANTIZATION_OVERSAMPLING,
+    QUANTIZATION_RESCORE,
+    VECTORS_ON_DISK
+)
+from embeddings.sparse import document_sparse_vector, query_sparse_vector
+from monitoring.metrics import QDRANT_SEARCH_SECONDS, QDRANT_UPSERT_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Namespace for deterministic point IDs
+POINT_ID_NAMESPACE = uuid.UUID("6f1c2a4e-5d0b-4c55-9a0e-3b7f8e2d9c41")
+
+# Name of the BM25 sparse vector stored next to the unnamed dense vector
+SPARSE_VECTOR_NAME = "bm25"
+
+# COLLECTION_NAME is an alias of a physical collection named after its
+# layout and vector size; changing either migrates the points into a new
+# collection
+COLLECTION_LAYOUT = "hybrid_v1"
+
+SEARCH_MODES = ("dense", "sparse", "hybrid")
+
+# The embedded Qdrant checks filters against every point in Python. Searches
+# restricted to documents with at most this many chunks fetch those chunks by
+# ID and score them directly instead.
+SUBSET_SEARCH_MAX_POINTS = 5000
+
+# Ping the Qdrant server over the idle gRPC channel, so it stays open for
+# reuse instead of being dropped by proxies and load balancers
+GRPC_OPTIONS = {
+    "grpc.keepalive_time_ms": 30000,
+    "grpc.keepalive_timeout_ms": 10000,
+}
+
+
+def make_point_id(source: str, text: str) -> str:
+    """
+    Derive a stable point ID from the document source and the chunk content,
+    so re-indexing the same chunk overwrites it instead of duplicating it
+    """
+    chunk_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{source}\x00{chunk_hash}"))
 
 
 class QdrantDB:
@@ -17,241 +85,1051 @@ class QdrantDB:
         return cls._instance
         
     def __init__(self):
-        """Initialize the Qdrant database client"""
+        """
+        Initialize the Qdrant database client: a Qdrant server when QDRANT_URL
+        is set, otherwise the embedded Qdrant in QDRANT_PATH
+        """
         # Only initialize once
         if self._initialized:
             return
-            
-        # Ensure the directory exists
-        os.makedirs(QDRANT_PATH, exist_ok=True)
         
-        # Initialize the client with local persistence
-        self.client = QdrantClient(path=QDRANT_PATH)
+        if QDRANT_URL:
+            # One client per process; its gRPC channel (or HTTP connection
+            # pool) is shared by all threads and reused for every request
+            self.client = QdrantClient(
+                url=QDRANT_URL,
+                api_key=QDRANT_API_KEY,
+                prefer_grpc=QDRANT_PREFER_GRPC,
+                grpc_port=QDRANT_GRPC_PORT,
+                grpc_options=GRPC_OPTIONS,
+                timeout=QDRANT_TIMEOUT
+            )
+            self.embedded = False
+            # Sends the upsert batches of add_texts calls in parallel
+            self._upsert_pool = (
+                ThreadPoolExecutor(max_workers=QDRANT_UPSERT_PARALLEL, thread_name_prefix="qdrant-upsert")
+                if QDRANT_UPSERT_PARALLEL > 1 else None
+            )
+            logger.info(
+                "Using the Qdrant server at %s over %s", QDRANT_URL, "gRPC" if QDRANT_PREFER_GRPC else "REST"
+            )
+        else:
+            # Ensure the directory exists
+            os.makedirs(QDRANT_PATH, exist_ok=True)
+            
+            # Initialize the client with local persistence
+            self.client = QdrantClient(path=QDRANT_PATH)
+            self.embedded = True
+            # The embedded Qdrant is not safe for concurrent writes
+            self._upsert_pool = None
+            if VECTOR_QUANTIZATION != "none" or VECTORS_ON_DISK:
+                logger.warning(
+                    "VECTOR_QUANTIZATION and VECTORS_ON_DISK have no effect in the embedded Qdrant; "
+                    "vectors stay unquantized in memory. Set QDRANT_URL to use a Qdrant server."
+                )
         self._init_collection()
+        self._init_catalog()
         self._initialized = True
         
     def _init_collection(self):
-        """Initialize the vector collection if it doesn't exist"""
-        collections = self.client.get_collections().collections
-        collection_names = [c.name for c in collections]
+        """
+        Initialize the vector collection if it doesn't exist. Collections
+        with an older layout (e.g. without the sparse vector, or with a
+        different vector size) are copied into a collection with the current
+        layout, and the COLLECTION_NAME alias is switched over once the copy
+        is complete. Quantization and on-disk storage are updated in place.
+        """
+        collection_names = [c.name for c in self.client.get_collections().collections]
+        aliases = {a.alias_name: a.collection_name for a in self.client.get_aliases().aliases}
         
-        if COLLECTION_NAME not in collection_names:
-            self.client.create_collection(
+        # Either an alias or, before aliases were used, a real collection
+        current = aliases.get(COLLECTION_NAME)
+        if current is None and COLLECTION_NAME in collection_names:
+            current = COLLECTION_NAME
+        
+        if current is not None and self._has_current_layout(current):
+            self._apply_storage_profile(current)
+        else:
+            target = f"{COLLECTION_NAME}_{COLLECTION_LAYOUT}_{VECTOR_SIZE}"
+            if target not in collection_names:
+                self.client.create_collection(
+                    collection_name=target,
+                    vectors_config=models.VectorParams(
+                        size=VECTOR_SIZE,
+                        distance=models.Distance.COSINE,
+                        on_disk=VECTORS_ON_DISK
+                    ),
+                    sparse_vectors_config={
+                        # Qdrant applies the IDF part of BM25 at query time
+                        SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF)
+                    },
+                    quantization_config=_quantization_config(),
+                )
+            copied = False
+            if current is not None:
+                # Re-running after an interrupted copy just upserts the same points again
+                copied = self._copy_points(current, target)
+            self._switch_alias(current, target)
+            if current is not None and not copied:
+                # The file manifest notices the empty collection and re-indexes everything
+                self._reset_catalog()
+        
+        self._ensure_payload_indexes()
+    
+    def _dense_size(self, collection_name: str) -> int:
+        """Size of the dense vector of a collection"""
+        vectors = self.client.get_collection(collection_name).config.params.vectors
+        return (vectors.get("") if isinstance(vectors, dict) else vectors).size
+    
+    def _has_current_layout(self, collection_name: str) -> bool:
+        """Check for the sparse vector and the configured dense vector size"""
+        params = self.client.get_collection(collection_name).config.params
+        return (
+            SPARSE_VECTOR_NAME in (params.sparse_vectors or {})
+            and self._dense_size(collection_name) == VECTOR_SIZE
+        )
+    
+    def _apply_storage_profile(self, collection_name: str) -> None:
+        """Bring quantization and on-disk storage of an existing collection in line with the config"""
+        config = self.client.get_collection(collection_name).config
+        vectors = config.params.vectors
+        on_disk = bool((vectors.get("") if isinstance(vectors, dict) else vectors).on_disk)
+        quantization = _quantization_config()
+        if on_disk == VECTORS_ON_DISK and config.quantization_config == quantization:
+            return
+        
+        # The server rebuilds the affected segments in the background. The
+        # embedded Qdrant stores the settings but keeps plain in-memory vectors
+        self.client.update_collection(
+            collection_name=collection_name,
+            vectors_config={"": models.VectorParamsDiff(on_disk=VECTORS_ON_DISK)},
+            quantization_config=quantization or models.Disabled.DISABLED,
+        )
+    
+    def _copy_points(self, source: str, target: str) -> bool:
+        """
+        Copy all points into a collection with the current layout, adding
+        sparse vectors. Larger embeddings are shortened to VECTOR_SIZE,
+        which is what the embeddings API does for the dimensions parameter.
+        
+        Returns:
+            False if the stored vectors are smaller than VECTOR_SIZE, so the
+            documents have to be embedded again
+        """
+        source_size = self._dense_size(source)
+        if source_size < VECTOR_SIZE:
+            logger.warning(
+                "Collection %s holds %d-dimensional vectors, %d are configured: all documents will be re-indexed",
+                source, source_size, VECTOR_SIZE
+            )
+            return False
+        
+        logger.info("Migrating collection %s to %s", source, target)
+        copied = 0
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=source,
+                limit=256,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            if points:
+                self.client.upsert(
+                    collection_name=target,
+                    points=[
+                        models.PointStruct(
+                            id=point.id,
+                            vector=self._point_vectors(
+                                shorten_embedding(
+                                    point.vector.get("", point.vector) if isinstance(point.vector, dict) else point.vector,
+                                    VECTOR_SIZE
+                                ),
+                                (point.payload or {}).get("text", "")
+                            ),
+                            payload=point.payload
+                        )
+                        for point in points
+                    ]
+                )
+                copied += len(points)
+            if offset is None:
+                break
+        logger.info("Copied %d points to %s", copied, target)
+        return True
+    
+    def _switch_alias(self, current: Optional[str], target: str) -> None:
+        """Point COLLECTION_NAME at the target collection and drop the old one"""
+        if current == COLLECTION_NAME:
+            # A real collection has to be removed before its name can become an alias
+            self.client.delete_collection(collection_name=current)
+            current = None
+        
+        operations = []
+        if current is not None:
+            operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=COLLECTION_NAME)))
+        operations.append(models.CreateAliasOperation(
+            create_alias=models.CreateAlias(collection_name=target, alias_name=COLLECTION_NAME)
+        ))
+        self.client.update_collection_aliases(change_aliases_operations=operations)
+        
+        if current is not None:
+            self.client.delete_collection(collection_name=current)
+    
+    @staticmethod
+    def _point_vectors(embedding: List[float], text: str) -> Dict[str, Any]:
+        """Dense embedding plus the BM25 sparse vector of the chunk text"""
+        return {"": embedding, SPARSE_VECTOR_NAME: document_sparse_vector(text)}
+    
+    def _ensure_payload_indexes(self):
+        """
+        Create payload indexes used by filters; existing collections get them
+        too. With an index, Qdrant searches small filtered subsets directly
+        and keeps HNSW search fast for larger ones, instead of post-filtering.
+        The embedded Qdrant has no payload indexes, so they are only created
+        on a server.
+        """
+        if self.embedded:
+            logger.debug("Embedded Qdrant: filtered searches scan the matching points instead of payload indexes")
+            return
+        
+        indexes = {
+            # Deleting and listing by document, and search restricted to documents
+            "source": models.PayloadSchemaType.KEYWORD,
+            "file_type": models.PayloadSchemaType.KEYWORD,
+            # Ingest time range
+            "timestamp": models.PayloadSchemaType.DATETIME,
+        }
+        for field_name, field_schema in indexes.items():
+            self.client.create_payload_index(
                 collection_name=COLLECTION_NAME,
-                vectors_config=models.VectorParams(
-                    size=VECTOR_SIZE,
-                    distance=models.Distance.COSINE
-                ),
+                field_name=field_name,
+                field_schema=field_schema
             )
+    
+    def _init_catalog(self):
+        """
+        Initialize the document catalog: one point per document holding its
+        title, file type, chunk count, size and ingest time, so listing
+        documents does not have to scan every chunk
+        """
+        collection_names = [c.name for c in self.client.get_collections().collections]
+        
+        if CATALOG_COLLECTION_NAME not in collection_names:
+            self.client.create_collection(
+                collection_name=CATALOG_COLLECTION_NAME,
+                # Records are only looked up by ID or scrolled, the vector is a placeholder
+                vectors_config=models.VectorParams(size=1, distance=models.Distance.DOT),
+            )
+            # Collections created before the catalog existed are scanned once
+            if self.count() > 0:
+                self._rebuild_catalog()
+        else:
+            # Records written before chunk IDs were kept in the catalog
+            missing, _ = self.client.scroll(
+                collection_name=CATALOG_COLLECTION_NAME,
+                scroll_filter=models.Filter(must=[
+                    models.IsEmptyCondition(is_empty=models.PayloadField(key="point_ids"))
+                ]),
+                limit=1
+            )
+            if missing:
+                self._rebuild_catalog()
             
-    def add_texts(self, texts: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]]) -> List[str]:
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        embeddings: Iterable[List[float]],
+        metadatas: Iterable[Dict[str, Any]],
+        ids: Optional[Iterable[str]] = None,
+        batch_size: int = QDRANT_UPSERT_BATCH_SIZE,
+        wait: bool = True
+    ) -> List[str]:
         """
-        Add text chunks with embeddings and metadata to the database
+        Add text chunks with embeddings and metadata to the database. The
+        inputs may be lists or iterators; points are built and upserted in
+        batches as they are consumed, so memory use is bounded by the batch
+        size rather than the document size. With a Qdrant server, up to
+        QDRANT_UPSERT_PARALLEL batches are sent at the same time. A failed
+        batch is retried on its own; since point IDs are deterministic,
+        sending a batch again is harmless.
         
         Args:
-            texts: List of text chunks
-            embeddings: List of embedding vectors for each chunk
-            metadatas: List of metadata dictionaries for each chunk
+            texts: Text chunks
+            embeddings: Embedding vector of each chunk
+            metadatas: Metadata dictionary of each chunk
+            ids: Optional point IDs; by default derived from source and chunk text
+            batch_size: Points per upsert request
+            wait: Wait until each batch is applied; with False the server
+                acknowledges batches once they are queued in its write-ahead
+                log, so they may not be searchable yet when this returns
             
         Returns:
             List of IDs for the added points
+            
+        Raises:
+            ValueError: If the inputs have different lengths
         """
-        if len(texts) != len(embeddings) or len(embeddings) != len(metadatas):
-            raise ValueError("Length of texts, embeddings, and metadatas must be the same")
-        
-        # Generate unique IDs for each point
-        ids = [str(uuid.uuid4()) for _ in range(len(texts))]
-        
-        # Create points with payloads
-        points = []
-        for i, (text, embedding, metadata) in enumerate(zip(texts, embeddings, metadatas)):
-            # Combine text content and metadata
-            payload = {
-                "text": text,
-                **metadata
-            }
+        columns = [texts, embeddings, metadatas] + ([ids] if ids is not None else [])
+        if all(isinstance(column, Sized) for column in columns):
+            # Fail before anything is written; iterators are checked as they are consumed
+            if len(texts) != len(embeddings) or len(embeddings) != len(metadatas):
+                raise ValueError("Length of texts, embeddings, and metadatas must be the same")
+            if ids is not None and len(ids) != len(texts):
+                raise ValueError("Length of ids and texts must be the same")
+        
+        added: List[str] = []
+        in_flight = deque()
+        try:
+            for batch in _batches(_zip_equal(*columns), max(1, batch_size)):
+                points = []
+                for row in batch:
+                    text, embedding, metadata = row[:3]
+                    if ids is not None:
+                        point_id = row[3]
+                    elif metadata.get("source"):
+                        # Deterministic IDs when the source is known, random ones otherwise
+                        point_id = make_point_id(metadata["source"], text)
+                    else:
+                        point_id = str(uuid.uuid4())
+                    points.append(
+                        models.PointStruct(
+                            id=point_id,
+                            vector=self._point_vectors(embedding, text),
+                            # Combine text content and metadata
+                            payload={"text": text, **metadata}
+                        )
+                    )
+                    added.append(point_id)
+                
+                if self._upsert_pool is None:
+                    self._upsert_batch(points, wait)
+                    continue
+                # Keep at most QDRANT_UPSERT_PARALLEL batches of this call in memory
+                if len(in_flight) >= QDRANT_UPSERT_PARALLEL:
+                    in_flight.popleft().result()
+                in_flight.append(self._upsert_pool.submit(self._upsert_batch, points, wait))
             
-            # Add the point
-            points.append(
-                models.PointStruct(
-                    id=ids[i],
-                    vector=embedding,
-                    payload=payload
-                )
+            while in_flight:
+                in_flight.popleft().result()
+        finally:
+            for future in in_flight:
+                future.cancel()
+        
+        return added
+    
+    def _upsert_batch(self, points: List[models.PointStruct], wait: bool) -> None:
+        """Upsert one batch of points, retrying it alone on transient errors"""
+        for attempt in range(QDRANT_UPSERT_MAX_RETRIES + 1):
+            try:
+                self.client.upsert(collection_name=COLLECTION_NAME, points=points, wait=wait)
+                return
+            except Exception as e:
+                if not _is_transient(e) or attempt == QDRANT_UPSERT_MAX_RETRIES:
+                    raise
+                delay = min(10.0, 0.5 * 2 ** attempt)
+                QDRANT_UPSERT_RETRIES.inc()
+                logger.warning("Upsert of %d points failed (%s); retrying in %.1fs", len(points), e, delay)
+                time.sleep(delay)
+    
+    def existing_ids(self, ids: List[str]) -> List[str]:
+        """Return the subset of the given point IDs that are already stored"""
+        existing = []
+        for i in range(0, len(ids), 1000):
+            points = self.client.retrieve(
+                collection_name=COLLECTION_NAME,
+                ids=ids[i:i+1000],
+                with_payload=False,
+                with_vectors=False
             )
+            existing.extend(str(point.id) for point in points)
+        return existing
+    
+    def delete_points(self, ids: Iterable[str]) -> None:
+        """Delete points by ID"""
+        ids = list(ids)
+        for i in range(0, len(ids), 1000):
+            self.client.delete(
+                collection_name=COLLECTION_NAME,
+                points_selector=models.PointIdsList(points=ids[i:i+1000])
+            )
+    
+    def delete_document(self, source: str, keep_ids: Optional[List[str]] = None) -> None:
+        """
+        Delete all points of a document
         
-        # Insert the points into the collection
-        self.client.upsert(
+        Args:
+            source: Source path stored in the point payloads
+            keep_ids: Optional point IDs of the document that should be kept
+        """
+        must_not = [models.HasIdCondition(has_id=keep_ids)] if keep_ids else None
+        self.client.delete(
             collection_name=COLLECTION_NAME,
-            points=points
+            points_selector=models.FilterSelector(
+                filter=models.Filter(
+                    must=[models.FieldCondition(key="source", match=models.MatchValue(value=source))],
+                    must_not=must_not
+                )
+            )
         )
+    
+    def count(self) -> int:
+        """Return the number of points in the collection"""
+        return self.client.count(collection_name=COLLECTION_NAME).count
         
-        return ids
-        
-    def search(self, query_vector: List[float], limit: int = 5) -> List[Dict[str, Any]]:
+    def search(
+        self,
+        query_vector: List[float],
+        limit: int = 5,
+        query_text: Optional[str] = None,
+        mode: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        with_vectors: bool = False
+    ) -> List[Dict[str, Any]]:
         """
-        Search for similar texts using the query vector
+        Search for relevant chunks
         
         Args:
             query_vector: The query embedding vector
             limit: Maximum number of results to return
+            query_text: The query text, needed for sparse (BM25) retrieval
+            mode: "dense", "sparse" or "hybrid" (both fused with reciprocal
+                rank fusion); defaults to SEARCH_MODE
+            filters: Optional restrictions, see build_filter
+            with_vectors: Also return the stored dense vector of every chunk
+                as "vector", e.g. for reranking
             
         Returns:
-            List of dictionaries containing text, metadata, and similarity score
+            List of dictionaries containing id, text, metadata, similarity
+            (dense cosine similarity, None for chunks only found by BM25) and
+            score (the ranking score of the chosen mode)
         """
-        try:
-            search_results = self.client.search(
-                collection_name=COLLECTION_NAME,
-                query_vector=query_vector,
+        mode = _resolve_mode(mode, bool(query_text))
+        points = self._document_points(filters)
+        if points is not None:
+            with QDRANT_SEARCH_SECONDS.time(retriever="subset", batch="false"):
+                return _search_points(points, query_vector, limit, query_text, mode, with_vectors)
+        
+        if mode == "hybrid":
+            candidates = limit * HYBRID_PREFETCH_MULTIPLIER
+            return reciprocal_rank_fusion(
+                self.search(query_vector, candidates, mode="dense", filters=filters, with_vectors=with_vectors),
+                self.search(
+                    query_vector, candidates, query_text, mode="sparse", filters=filters, with_vectors=with_vectors
+                ),
                 limit=limit
             )
+        
+        try:
+            query_filter = build_filter(filters)
+            if mode == "sparse":
+                return self._sparse_search(query_text, limit, query_filter, with_vectors)
             
-            results = []
-            for result in search_results:
-                payload = result.payload
-                text = payload.pop("text")
-                results.append({
-                    "text": text,
-                    "metadata": payload,
-                    "similarity": result.score
-                })
-                
-            return results
-        except ValueError as e:
-            # Handle shape mismatch errors that can occur after adding new documents
-            print(f"Error in vector search: {e}")
-            print("Attempting to recreate the collection...")
+            with QDRANT_SEARCH_SECONDS.time(retriever="dense", batch="false"):
+                search_results = self.client.search(
+                    collection_name=COLLECTION_NAME,
+                    query_vector=query_vector,
+                    query_filter=query_filter,
+                    limit=limit,
+                    search_params=_search_params(),
+                    with_vectors=_dense_only(with_vectors)
+                )
             
-            try:
-                # Delete and recreate the collection
-                if COLLECTION_NAME in [c.name for c in self.client.get_collections().collections]:
-                    self.client.delete_collection(collection_name=COLLECTION_NAME)
-                    print(f"Collection {COLLECTION_NAME} was deleted")
-                
-                # Recreate collection
-                self._init_collection()
-                print(f"Collection {COLLECTION_NAME} was recreated successfully")
-                
-                # Return empty results since we've reset the collection
-                return []
-            except Exception as recreate_error:
-                print(f"Failed to recreate collection: {recreate_error}")
-                return []
+            return [_to_result(result, result.score, dense=True) for result in search_results]
+        except ValueError as e:
+            # A malformed filter or a query vector of the wrong size; the index
+            # itself is fine (a changed VECTOR_SIZE is migrated at startup)
+            logger.error("Invalid search request: %s", e)
+            return []
         except Exception as e:
-            print(f"Unexpected error during search: {e}")
+            logger.exception("Unexpected error during search: %s", e)
             return []
+    
+    def _sparse_search(
+        self,
+        query_text: str,
+        limit: int,
+        query_filter: Optional[models.Filter] = None,
+        with_vectors: bool = False
+    ) -> List[Dict[str, Any]]:
+        """BM25 search on the sparse vector"""
+        sparse_vector = query_sparse_vector(query_text)
+        if not sparse_vector.indices:
+            return []
+        with QDRANT_SEARCH_SECONDS.time(retriever="sparse", batch="false"):
+            response = self.client.query_points(
+                collection_name=COLLECTION_NAME,
+                query=sparse_vector,
+                using=SPARSE_VECTOR_NAME,
+                query_filter=query_filter,
+                limit=limit,
+                with_payload=True,
+                with_vectors=_dense_only(with_vectors)
+            )
+        return [_to_result(point, point.score, dense=False) for point in response.points]
+    
+    def search_batch(
+        self,
+        query_vectors: List[List[float]],
+        limit: int = 5,
+        query_texts: Optional[List[str]] = None,
+        mode: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        with_vectors: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several queries at once, with one Qdrant batch request per
+        retriever instead of one request per query. Unlike search, errors are
+        raised so callers can report them.
+        
+        Args:
+            query_vectors: The query embedding vectors
+            limit: Maximum number of results per query
+            query_texts: The query texts, needed for sparse (BM25) retrieval
+            mode: "dense", "sparse" or "hybrid"; defaults to SEARCH_MODE
+            filters: Optional restrictions applied to every query, see build_filter
+            with_vectors: Also return the stored dense vector of every chunk
             
-    def get_document_list(self) -> List[Dict[str, Any]]:
+        Returns:
+            One list of results per query, in the same format as search
+        """
+        if not query_vectors:
+            return []
+        mode = _resolve_mode(mode, bool(query_texts))
+        query_texts = query_texts or [""] * len(query_vectors)
+        
+        points = self._document_points(filters)
+        if points is not None:
+            with QDRANT_SEARCH_SECONDS.time(retriever="subset", batch="true"):
+                return [
+                    _search_points(points, vector, limit, text, mode, with_vectors)
+                    for vector, text in zip(query_vectors, query_texts)
+                ]
+        
+        candidates = limit * HYBRID_PREFETCH_MULTIPLIER if mode == "hybrid" else limit
+        query_filter = build_filter(filters)
+        
+        dense = [[] for _ in query_vectors]
+        if mode in ("dense", "hybrid"):
+            with QDRANT_SEARCH_SECONDS.time(retriever="dense", batch="true"):
+                responses = self.client.search_batch(
+                    collection_name=COLLECTION_NAME,
+                    requests=[
+                        models.SearchRequest(
+                            vector=vector,
+                            filter=query_filter,
+                            limit=candidates,
+                            params=_search_params(),
+                            with_payload=True,
+                            with_vector=_dense_only(with_vectors)
+                        )
+                        for vector in query_vectors
+                    ]
+                )
+            dense = [[_to_result(point, point.score, dense=True) for point in points] for points in responses]
+        
+        sparse = [[] for _ in query_vectors]
+        if mode in ("sparse", "hybrid"):
+            sparse_vectors = [query_sparse_vector(text) for text in query_texts]
+            # Queries without any indexable term have no BM25 results
+            searchable = [i for i, vector in enumerate(sparse_vectors) if vector.indices]
+            if searchable:
+                with QDRANT_SEARCH_SECONDS.time(retriever="sparse", batch="true"):
+                    responses = self.client.query_batch_points(
+                        collection_name=COLLECTION_NAME,
+                        requests=[
+                            models.QueryRequest(
+                                query=sparse_vectors[i],
+                                using=SPARSE_VECTOR_NAME,
+                                filter=query_filter,
+                                limit=candidates,
+                                with_payload=True,
+                                with_vector=_dense_only(with_vectors)
+                            )
+                            for i in searchable
+                        ]
+                    )
+                for i, response in zip(searchable, responses):
+                    sparse[i] = [_to_result(point, point.score, dense=False) for point in response.points]
+        
+        if mode == "hybrid":
+            return [reciprocal_rank_fusion(d, s, limit=limit) for d, s in zip(dense, sparse)]
+        return dense if mode == "dense" else sparse
+    
+    async def asearch_batch(
+        self,
+        query_vectors: List[List[float]],
+        limit: int = 5,
+        query_texts: Optional[List[str]] = None,
+        mode: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        with_vectors: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """Async version of search_batch; the Qdrant client calls run in a worker thread"""
+        return await asyncio.to_thread(
+            self.search_batch, query_vectors, limit, query_texts, mode, filters, with_vectors
+        )
+    
+    def _document_points(self, filters: Optional[Dict[str, Any]]) -> Optional[List[models.Record]]:
         """
-        Get a list of all unique documents in the database
+        Fetch the chunks a document-restricted search can be answered from
         
         Returns:
-            List of dictionaries containing document information
+            The chunks of the filtered documents that match the other
+            filters, with vectors, or None to search through Qdrant instead
         """
+        if not self.embedded or not filters or not filters.get("sources"):
+            return None
         try:
-            # Check if collection exists
-            collections = self.client.get_collections().collections
-            collection_names = [c.name for c in collections]
+            records = self.client.retrieve(
+                collection_name=CATALOG_COLLECTION_NAME,
+                ids=[_catalog_id(source) for source in filters["sources"]],
+                with_payload=["point_ids"],
+                with_vectors=False
+            )
+            # Documents without a catalog record (or without IDs in it) are left to Qdrant
+            if len(records) < len(set(filters["sources"])) or any(
+                "point_ids" not in (record.payload or {}) for record in records
+            ):
+                return None
+            point_ids = [point_id for record in records for point_id in record.payload["point_ids"]]
+            if len(point_ids) > SUBSET_SEARCH_MAX_POINTS:
+                return None
             
-            if COLLECTION_NAME not in collection_names:
-                print(f"Collection {COLLECTION_NAME} does not exist")
-                return []
-                
-            # Count documents to check if database is empty
-            count = self.client.count(collection_name=COLLECTION_NAME).count
-            if count == 0:
-                print("Database is empty, no documents to list")
-                return []
-                
-            print(f"Found {count} points in the database")
+            points = self.client.retrieve(
+                collection_name=COLLECTION_NAME,
+                ids=point_ids,
+                with_payload=True,
+                with_vectors=True
+            ) if point_ids else []
+            return [point for point in points if _matches(point.payload or {}, filters)]
+        except Exception as e:
+            logger.warning("Error fetching document chunks, filtering in Qdrant instead: %s", e)
+            return None
             
-            # Dictionary to track unique documents by their file path
-            unique_docs = {}
+    async def asearch(
+        self,
+        query_vector: List[float],
+        limit: int = 5,
+        query_text: Optional[str] = None,
+        mode: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        with_vectors: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Async version of search for the request path. The Qdrant client calls
+        run in worker threads so the event loop keeps serving other requests;
+        in hybrid mode the dense and sparse searches run in parallel.
+        """
+        mode = _resolve_mode(mode, bool(query_text))
+        if mode != "hybrid" or (self.embedded and filters and filters.get("sources")):
+            # Document-restricted searches score both retrievers on the same fetched chunks
+            return await asyncio.to_thread(
+                self.search, query_vector, limit, query_text, mode, filters, with_vectors
+            )
+        
+        candidates = limit * HYBRID_PREFETCH_MULTIPLIER
+        dense, sparse = await asyncio.gather(
+            asyncio.to_thread(self.search, query_vector, candidates, None, "dense", filters, with_vectors),
+            asyncio.to_thread(self.search, query_vector, candidates, query_text, "sparse", filters, with_vectors)
+        )
+        return reciprocal_rank_fusion(dense, sparse, limit=limit)
             
-            # Track which files we've already reported as found
-            reported_files = set()
+    def upsert_document_record(
+        self,
+        source: str,
+        title: str,
+        file_type: str,
+        chunk_count: int,
+        size: Optional[int] = None,
+        ingested_at: Optional[str] = None,
+        point_ids: Optional[List[str]] = None
+    ) -> None:
+        """
+        Add or update a document in the catalog
+        
+        Args:
+            source: Source path of the document
+            title: Display title
+            file_type: File extension
+            chunk_count: Number of chunks stored for the document
+            size: File size in bytes, if known
+            ingested_at: ISO timestamp of the ingest, defaults to now
+            point_ids: IDs of the document's chunks, used by document-restricted search
+        """
+        payload = {
+            "source": source,
+            "title": title,
+            "file_type": file_type,
+            "chunk_count": chunk_count,
+            "size": size,
+            "ingested_at": ingested_at or datetime.datetime.now().isoformat(),
+        }
+        if point_ids is not None:
+            payload["point_ids"] = list(point_ids)
+        self.client.upsert(
+            collection_name=CATALOG_COLLECTION_NAME,
+            points=[
+                models.PointStruct(
+                    id=_catalog_id(source),
+                    vector=[1.0],
+                    payload=payload
+                )
+            ]
+        )
+    
+    def delete_document_record(self, source: str) -> None:
+        """Remove a document from the catalog"""
+        self.client.delete(
+            collection_name=CATALOG_COLLECTION_NAME,
+            points_selector=models.PointIdsList(points=[_catalog_id(source)])
+        )
+    
+    def get_document_records(self, sources: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Look up catalog records by source path"""
+        points = self.client.retrieve(
+            collection_name=CATALOG_COLLECTION_NAME,
+            ids=[_catalog_id(source) for source in sources],
+            with_payload=models.PayloadSelectorExclude(exclude=["point_ids"]),
+            with_vectors=False
+        )
+        return {point.payload["source"]: point.payload for point in points}
+    
+    def _rebuild_catalog(self) -> None:
+        """Build the catalog from a full scan of the chunk collection"""
+        logger.info("Building the document catalog from existing chunks")
+        documents: Dict[str, Dict[str, Any]] = {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=COLLECTION_NAME,
+                limit=1000,
+                offset=offset,
+                with_payload=["source", "title", "file_type", "timestamp"],
+                with_vectors=False
+            )
+            for point in points:
+                payload = point.payload or {}
+                source = payload.get("source")
+                if not source:
+                    continue
+                if source not in documents:
+                    documents[source] = {
+                        "title": payload.get("title") or os.path.basename(source),
+                        "file_type": payload.get("file_type", ""),
+                        "ingested_at": payload.get("timestamp"),
+                        "chunk_count": 0,
+                        "point_ids": [],
+                    }
+                documents[source]["chunk_count"] += 1
+                documents[source]["point_ids"].append(str(point.id))
+            if offset is None:
+                break
+        
+        for source, document in documents.items():
+            size = os.path.getsize(source) if os.path.exists(source) else None
+            self.upsert_document_record(source, size=size, **document)
+        logger.info("Document catalog built with %d documents", len(documents))
+    
+    def _reset_catalog(self) -> None:
+        """Drop and recreate an empty catalog"""
+        self.client.delete_collection(collection_name=CATALOG_COLLECTION_NAME)
+        self._init_catalog()
             
-            # Scroll through all points in batches
+    def get_document_list(self) -> List[Dict[str, Any]]:
+        """
+        Get a list of all unique documents in the database, read from the
+        document catalog (one record per document, not per chunk)
+        
+        Returns:
+            List of dictionaries containing document information
+        """
+        try:
+            documents = []
             offset = None
-            batch_size = 100
-            
             while True:
-                response = self.client.scroll(
-                    collection_name=COLLECTION_NAME,
-                    limit=batch_size,
+                points, offset = self.client.scroll(
+                    collection_name=CATALOG_COLLECTION_NAME,
+                    limit=1000,
                     offset=offset,
-                    with_payload=True,
+                    with_payload=models.PayloadSelectorExclude(exclude=["point_ids"]),
                     with_vectors=False
                 )
-                
-                points = response[0]
-                if not points:
-                    break
-                    
-                print(f"Processing {len(points)} points from database")
-                
                 for point in points:
-                    if not point.payload:
-                        continue
-                    
-                    # Extract document identifying information - we need title, source path, and ignore chunk_id
-                    source_path = point.payload.get('source', '')
-                    title = point.payload.get('title', '')
-                    
-                    if not source_path:
-                        continue
-                        
-                    # Clean up the path for better matching
-                    # Remove any path variations for the same file
-                    normalized_path = os.path.normpath(source_path).replace('\\', '/')
-                    base_filename = os.path.basename(normalized_path)
-                    
-                    # Use the normalized path as the key to identify unique documents
-                    # This way all chunks from the same document will map to the same key
-                    doc_key = normalized_path
-                    
-                    # If we haven't seen this document yet, add it to our unique docs
-                    if doc_key not in unique_docs:
-                        # Get additional document metadata
-                        file_type = point.payload.get('file_type', '')
-                        timestamp = point.payload.get('timestamp', '')
-                        
-                        # If no title, use filename
-                        if not title:
-                            title = base_filename
-                            
-                        # Create a document record with the first chunk we find
-                        unique_docs[doc_key] = {
-                            'source': normalized_path,
-                            'title': title,
-                            'file_type': file_type,
-                            'timestamp': timestamp
-                        }
-                        
-                        # Only print the "found" message once per file
-                        if normalized_path not in reported_files:
-                            print(f"Found document: {title} at {normalized_path}")
-                            reported_files.add(normalized_path)
-                
-                # Update offset for next batch
-                offset = response[1]
+                    record = point.payload
+                    documents.append({
+                        # Normalize separators for display
+                        'source': os.path.normpath(record['source']).replace('\\', '/'),
+                        'title': record.get('title') or os.path.basename(record['source']),
+                        'file_type': record.get('file_type', ''),
+                        'chunk_count': record.get('chunk_count', 0),
+                        'size': record.get('size'),
+                        'timestamp': record.get('ingested_at', ''),
+                    })
                 if offset is None:
                     break
             
-            # Convert the dictionary of unique documents to a list
-            documents = list(unique_docs.values())
-            
             # Sort documents by title for consistent display
             documents.sort(key=lambda x: x['title'].lower())
-            
-            print(f"Found {len(documents)} unique documents")
-            for doc in documents:
-                print(f"Final document list: {doc['title']} ({doc['source']})")
-            
             return documents
             
         except Exception as e:
-            print(f"Error getting document list: {e}")
-            import traceback
-            traceback.print_exc()
-            return []
\ No newline at end of file
+            logger.error("Error getting document list: %s", e)
+            return []
+
+
+def shorten_embedding(embedding: List[float], size: int) -> List[float]:
+    """
+    Truncate an embedding to its first size dimensions and re-normalize it.
+    text-embedding-3 embeddings keep most of their meaning in the leading
+    dimensions, so this matches requesting fewer dimensions from the API.
+    """
+    if len(embedding) <= size:
+        return embedding
+    head = embedding[:size]
+    norm = math.sqrt(sum(value * value for value in head))
+    return [value / norm for value in head] if norm > 0 else head
+
+
+def _quantization_config() -> Optional[models.QuantizationConfig]:
+    """Quantization for VECTOR_QUANTIZATION; quantized vectors always stay in RAM"""
+    if VECTOR_QUANTIZATION == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if VECTOR_QUANTIZATION == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    if VECTOR_QUANTIZATION != "none":
+        raise ValueError(f"Unknown vector quantization: {VECTOR_QUANTIZATION}")
+    return None
+
+
+def _search_params() -> Optional[models.SearchParams]:
+    """Score with quantized vectors, then rescore the oversampled candidates at full precision"""
+    if VECTOR_QUANTIZATION == "none":
+        return None
+    return models.SearchParams(
+        quantization=models.QuantizationSearchParams(
+            rescore=QUANTIZATION_RESCORE,
+            oversampling=QUANTIZATION_OVERSAMPLING
+        )
+    )
+
+
+def build_filter(filters: Optional[Dict[str, Any]]) -> Optional[models.Filter]:
+    """
+    Translate search filters into a Qdrant filter
+    
+    Args:
+        filters: Dictionary with any of "sources" (document paths),
+            "file_types" (e.g. "pdf" or ".pdf"), "ingested_after" and
+            "ingested_before" (datetimes, compared with the chunk timestamp)
+            
+    Returns:
+        Filter matching all given conditions, or None without conditions
+    """
+    if not filters:
+        return None
+    
+    conditions = []
+    if filters.get("sources"):
+        conditions.append(models.FieldCondition(key="source", match=models.MatchAny(any=list(filters["sources"]))))
+    if filters.get("file_types"):
+        file_types = [f".{file_type.lower().lstrip('.')}" for file_type in filters["file_types"]]
+        conditions.append(models.FieldCondition(key="file_type", match=models.MatchAny(any=file_types)))
+    if filters.get("ingested_after") or filters.get("ingested_before"):
+        conditions.append(models.FieldCondition(
+            key="timestamp",
+            range=models.DatetimeRange(
+                gte=_local_time(filters.get("ingested_after")),
+                lt=_local_time(filters.get("ingested_before"))
+            )
+        ))
+    return models.Filter(must=conditions) if conditions else None
+
+
+def _zip_equal(*columns: Iterable[Any]) -> Iterator[Tuple[Any, ...]]:
+    """Zip columns of rows, raising ValueError if one of them runs out early"""
+    missing = object()
+    iterators = [iter(column) for column in columns]
+    while True:
+        row = tuple(next(iterator, missing) for iterator in iterators)
+        if all(value is missing for value in row):
+            return
+        if any(value is missing for value in row):
+            raise ValueError("Length of texts, embeddings, metadatas and ids must be the same")
+        yield row
+
+
+def _batches(rows: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Split an iterable into lists of at most size items"""
+    iterator = iter(rows)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _is_transient(error: Exception) -> bool:
+    """Whether a failed Qdrant request is worth retrying"""
+    # REST errors carry an HTTP status
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in (408, 429) or status >= 500
+    # gRPC errors carry a status code
+    code = getattr(error, "code", None)
+    if callable(code):
+        return getattr(code(), "name", "") in ("UNAVAILABLE", "DEADLINE_EXCEEDED", "RESOURCE_EXHAUSTED", "ABORTED")
+    # Invalid points (e.g. a wrong vector size) fail the same way again;
+    # anything else is a connection error or timeout
+    return not isinstance(error, (ValueError, TypeError, KeyError))
+
+
+def _matches(payload: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """Check a chunk payload against the filters, like build_filter does in Qdrant"""
+    if filters.get("sources") and payload.get("source") not in filters["sources"]:
+        return False
+    if filters.get("file_types"):
+        file_types = {f".{file_type.lower().lstrip('.')}" for file_type in filters["file_types"]}
+        if payload.get("file_type") not in file_types:
+            return False
+    if filters.get("ingested_after") or filters.get("ingested_before"):
+        try:
+            timestamp = datetime.datetime.fromisoformat(payload["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            return False
+        after = _local_time(filters.get("ingested_after"))
+        before = _local_time(filters.get("ingested_before"))
+        if (after and timestamp < after) or (before and timestamp >= before):
+            return False
+    return True
+
+
+def _search_points(
+    points: List[models.Record],
+    query_vector: List[float],
+    limit: int,
+    query_text: Optional[str],
+    mode: str,
+    with_vectors: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Rank a small set of fetched chunks the way search does: cosine
+    similarity, BM25 or both fused with reciprocal rank fusion. BM25 takes its
+    IDF from these chunks rather than the whole collection.
+    """
+    if not points:
+        return []
+    candidates = limit * HYBRID_PREFETCH_MULTIPLIER if mode == "hybrid" else limit
+    
+    dense = []
+    if mode in ("dense", "hybrid"):
+        matrix = np.array([point.vector[""] for point in points], dtype=np.float32)
+        query = np.asarray(query_vector, dtype=np.float32)
+        scores = matrix @ query / np.maximum(np.linalg.norm(matrix, axis=1) * np.linalg.norm(query), 1e-12)
+        dense = [
+            _to_result(points[i], float(scores[i]), dense=True, with_vector=with_vectors)
+            for i in np.argsort(-scores)[:candidates]
+        ]
+    
+    sparse = []
+    if mode in ("sparse", "hybrid"):
+        terms = set(query_sparse_vector(query_text).indices)
+        weights = [
+            {index: value for index, value in zip(vector.indices, vector.values) if index in terms}
+            for vector in (point.vector.get(SPARSE_VECTOR_NAME) for point in points)
+            if vector is not None
+        ] if terms else []
+        if len(weights) == len(points):
+            frequency = {term: sum(1 for matched in weights if term in matched) for term in terms}
+            # Same IDF formula Qdrant uses for Modifier.IDF
+            idf = {
+                term: math.log(1 + (len(points) - count + 0.5) / (count + 0.5))
+                for term, count in frequency.items()
+            }
+            scores = [sum(value * idf[term] for term, value in matched.items()) for matched in weights]
+            ranked = sorted((i for i in range(len(points)) if scores[i] > 0), key=lambda i: -scores[i])
+            sparse = [
+                _to_result(points[i], scores[i], dense=False, with_vector=with_vectors)
+                for i in ranked[:candidates]
+            ]
+    
+    if mode == "hybrid":
+        return reciprocal_rank_fusion(dense, sparse, limit=limit)
+    return dense if mode == "dense" else sparse
+
+
+def _local_time(value: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    """Chunk timestamps are naive local times, so compare against those"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+def _resolve_mode(mode: Optional[str], has_query_text: bool) -> str:
+    """Pick the search mode; without query text only dense search is possible"""
+    mode = mode or SEARCH_MODE
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode}")
+    if not has_query_text:
+        return "dense"
+    return mode
+
+
+def _to_result(point: Any, score: float, dense: bool, with_vector: bool = True) -> Dict[str, Any]:
+    """
+    Convert a scored point to a search result. The dense vector is included
+    as "vector" when the point was fetched with it and with_vector is set.
+    """
+    payload = dict(point.payload)
+    text = payload.pop("text")
+    result = {
+        "id": str(point.id),
+        "text": text,
+        "metadata": payload,
+        "similarity": score if dense else None,
+        "score": score,
+    }
+    # Qdrant returns {"": [...]} for named vector selections, embedded Qdrant a plain list
+    vector = point.vector.get("") if isinstance(point.vector, dict) else point.vector
+    if with_vector and vector is not None:
+        result["vector"] = vector
+    return result
+
+
+def _dense_only(with_vectors: bool) -> Union[List[str], bool]:
+    """Vector selection that fetches the dense vector but not the sparse one"""
+    return [""] if with_vectors else False
+
+
+def reciprocal_rank_fusion(*result_lists: List[Dict[str, Any]], limit: int, k: int = RRF_K) -> List[Dict[str, Any]]:
+    """
+    Merge ranked result lists: each result scores the sum of 1 / (k + rank)
+    over the lists it appears in
+    
+    Args:
+        result_lists: Search results, best first
+        limit: Number of results to return
+        k: Damping constant; higher values flatten the rank contributions
+        
+    Returns:
+        The fused results, best first, with the fused score in "score"
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            entry = fused.get(result["id"])
+            if entry is None:
+                entry = fused[result["id"]] = {**result, "score": 0.0}
+            elif entry["similarity"] is None:
+                # Keep the dense similarity when one of the lists has it
+                entry["similarity"] = result["similarity"]
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda result: result["score"], reverse=True)[:limit]
+
+
+def _catalog_id(source: str) -> str:
+    """Catalog record ID of a document"""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"catalog\x00{source}"))
@@ -1,16 +1,33 @@
-from typing import List
-from openai import AzureOpenAI
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Optional
+from openai import AzureOpenAI, AsyncAzureOpenAI
 from config import (
     AZURE_OPENAI_API_KEY,
     AZURE_OPENAI_ENDPOINT,
     AZURE_OPENAI_API_VERSION,
-    AZURE_OPENAI_COMPLETION_DEPLOYMENT
+    AZURE_OPENAI_COMPLETION_DEPLOYMENT,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_MODEL,
+    EMBEDDING_MODEL_DIMENSIONS,
+    VECTOR_SIZE
 )
+from embeddings.cache import EmbeddingCache
+from embeddings.engine import EmbeddingEngine
+from embeddings.provider import ModelProvider
+from embeddings.tokens import count_tokens
+from monitoring.metrics import CACHE_REQUESTS, OPENAI_TOKENS
 
-# Use the working embedding model
-EMBEDDING_MODEL = "text-embedding-3-large"
+logger = logging.getLogger(__name__)
+
+# Only shortened embeddings are requested with the dimensions parameter, so
+# full-size ones keep their existing cache entries
+EMBEDDING_OPTIONS = {"dimensions": VECTOR_SIZE} if VECTOR_SIZE < EMBEDDING_MODEL_DIMENSIONS else {}
+EMBEDDING_CACHE_KEY = f"{EMBEDDING_MODEL}:{VECTOR_SIZE}" if EMBEDDING_OPTIONS else EMBEDDING_MODEL
+
+class AzureOpenAIClient(ModelProvider):
+    name = "azure"
 
-class AzureOpenAIClient:
     def __init__(self):
         """Initialize the Azure OpenAI client"""
         # Use the dedicated AzureOpenAI client
@@ -19,10 +36,20 @@ class AzureOpenAIClient:
             api_version=AZURE_OPENAI_API_VERSION,
             azure_endpoint=AZURE_OPENAI_ENDPOINT
         )
+        # Async client for the request path, so queries never block the event loop
+        self.async_client = AsyncAzureOpenAI(
+            api_key=AZURE_OPENAI_API_KEY,
+            api_version=AZURE_OPENAI_API_VERSION,
+            azure_endpoint=AZURE_OPENAI_ENDPOINT
+        )
+        # Shared on-disk cache so unchanged chunks are never re-embedded
+        self.cache = EmbeddingCache() if EMBEDDING_CACHE_ENABLED else None
+        self.engine = EmbeddingEngine(self._embed_batch, self._aembed_batch)
         
     def get_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
-        Generate embeddings for a list of texts using Azure OpenAI
+        Generate embeddings for a list of texts using Azure OpenAI.
+        Texts already in the embedding cache are served from disk.
         
         Args:
             texts: List of text strings to generate embeddings for
@@ -30,24 +57,115 @@ class AzureOpenAIClient:
         Returns:
             List of embedding vectors
         """
+        if self.cache is None:
+            return self._embed(texts)
+        
         try:
-            # Process texts in batches to avoid exceeding token limits
-            embeddings = []
-            batch_size = 10
+            embeddings = self.cache.get_many(EMBEDDING_CACHE_KEY, texts)
+        except Exception as e:
+            logger.warning("Error reading embedding cache: %s", e)
+            return self._embed(texts)
+        
+        missing = _group_missing(texts, embeddings)
+        _count_cache_lookups(embeddings)
+        if missing:
+            missing_texts = list(missing)
+            new_embeddings = self._embed(missing_texts)
+            if not new_embeddings:
+                return []
             
-            for i in range(0, len(texts), batch_size):
-                batch_texts = texts[i:i+batch_size]
-                response = self.client.embeddings.create(
-                    input=batch_texts,
-                    model=EMBEDDING_MODEL  # Using the working model directly
-                )
-                batch_embeddings = [item.embedding for item in response.data]
-                embeddings.extend(batch_embeddings)
+            for text, embedding in zip(missing_texts, new_embeddings):
+                for i in missing[text]:
+                    embeddings[i] = embedding
+            
+            try:
+                self.cache.put_many(EMBEDDING_CACHE_KEY, missing_texts, new_embeddings)
+            except Exception as e:
+                logger.warning("Error writing embedding cache: %s", e)
+        
+        return embeddings
+    
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Async version of get_embeddings: cache access runs in a worker thread
+        and missing texts are embedded with the async client
+        
+        Args:
+            texts: List of text strings to generate embeddings for
             
+        Returns:
+            List of embedding vectors
+        """
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        if self.cache is not None:
+            try:
+                embeddings = await asyncio.to_thread(self.cache.get_many, EMBEDDING_CACHE_KEY, texts)
+                _count_cache_lookups(embeddings)
+            except Exception as e:
+                logger.warning("Error reading embedding cache: %s", e)
+        
+        missing = _group_missing(texts, embeddings)
+        if missing:
+            missing_texts = list(missing)
+            try:
+                new_embeddings = await self._aembed(missing_texts)
+            except Exception as e:
+                logger.error("Error generating embeddings: %s", e)
+                return []
+            
+            for text, embedding in zip(missing_texts, new_embeddings):
+                for i in missing[text]:
+                    embeddings[i] = embedding
+            
+            if self.cache is not None:
+                try:
+                    await asyncio.to_thread(self.cache.put_many, EMBEDDING_CACHE_KEY, missing_texts, new_embeddings)
+                except Exception as e:
+                    logger.warning("Error writing embedding cache: %s", e)
+        
+        return embeddings
+    
+    async def _aembed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts with the async client, sending batches concurrently under
+        the process-wide rate limit shared with ingestion, with the engine's
+        retries and back-off
+        """
+        return await self.engine.aembed(texts)
+    
+    async def _aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Async version of _embed_batch"""
+        response = await self.async_client.with_options(max_retries=0).embeddings.create(
+            input=texts,
+            model=EMBEDDING_MODEL,
+            **EMBEDDING_OPTIONS
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+    
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        """Call the embeddings API for texts that are not cached"""
+        try:
+            embeddings = self.engine.embed(texts)
+            stats = self.engine.last_stats
+            if stats["batches"] > 1:
+                logger.debug(
+                    "Embedded %d chunks in %d batches (%.1f chunks/s, %d retries)",
+                    stats["chunks"], stats["batches"], stats["chunks_per_second"], stats["retries"]
+                )
             return embeddings
         except Exception as e:
-            print(f"Error generating embeddings: {e}")
+            logger.error("Error generating embeddings: %s", e)
             return []
+    
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Send a single batch to the embeddings API; retries are handled by the engine"""
+        response = self.client.with_options(max_retries=0).embeddings.create(
+            input=texts,
+            model=EMBEDDING_MODEL,
+            **EMBEDDING_OPTIONS
+        )
+        # The API may return items out of order, so place them by index
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
             
     def get_completion(self, system_prompt: str, user_prompt: str) -> str:
         """
@@ -71,7 +189,97 @@ class AzureOpenAIClient:
                 max_tokens=1000,
                 top_p=0.95,
             )
+            _count_completion_tokens(response.usage)
             return response.choices[0].message.content
         except Exception as e:
-            print(f"Error generating completion: {e}")
-            return f"Error: {str(e)}"
\ No newline at end of file
+            logger.error("Error generating completion: %s", e)
+            return f"Error: {str(e)}"
+    
+    async def aget_completion(self, system_prompt: str, user_prompt: str) -> str:
+        """
+        Async version of get_completion
+        
+        Args:
+            system_prompt: System instructions
+            user_prompt: User query with context
+            
+        Returns:
+            Generated completion text
+        """
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=AZURE_OPENAI_COMPLETION_DEPLOYMENT,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=0.5,
+                max_tokens=1000,
+                top_p=0.95,
+            )
+            _count_completion_tokens(response.usage)
+            return response.choices[0].message.content
+        except Exception as e:
+            logger.error("Error generating completion: %s", e)
+            return f"Error: {str(e)}"
+    
+    async def astream_completion(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """
+        Stream a completion token by token from the chat completions API
+        
+        Args:
+            system_prompt: System instructions
+            user_prompt: User query with context
+            
+        Yields:
+            Pieces of the completion text as the model produces them
+        """
+        stream = await self.async_client.chat.completions.create(
+            model=AZURE_OPENAI_COMPLETION_DEPLOYMENT,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.5,
+            max_tokens=1000,
+            top_p=0.95,
+            stream=True,
+        )
+        # Streamed responses carry no usage, so the tokens are counted locally
+        OPENAI_TOKENS.inc(count_tokens(system_prompt) + count_tokens(user_prompt), type="prompt")
+        pieces = []
+        try:
+            async for chunk in stream:
+                # Azure sends chunks without choices for content filter results
+                if chunk.choices and chunk.choices[0].delta.content:
+                    pieces.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        finally:
+            OPENAI_TOKENS.inc(count_tokens("".join(pieces)), type="completion")
+            # Release the connection if the consumer stops early
+            await stream.close()
+
+
+def _count_cache_lookups(embeddings: List[Optional[List[float]]]) -> None:
+    """Count embedding cache hits and misses of one lookup"""
+    misses = sum(1 for embedding in embeddings if embedding is None)
+    if misses:
+        CACHE_REQUESTS.inc(misses, cache="embedding", result="miss")
+    if len(embeddings) > misses:
+        CACHE_REQUESTS.inc(len(embeddings) - misses, cache="embedding", result="hit")
+
+
+def _count_completion_tokens(usage) -> None:
+    """Count the prompt and completion tokens reported by a chat completion"""
+    if usage is not None:
+        OPENAI_TOKENS.inc(usage.prompt_tokens, type="prompt")
+        OPENAI_TOKENS.inc(usage.completion_tokens, type="completion")
+
+
+def _group_missing(texts: List[str], embeddings: List[Optional[List[float]]]) -> Dict[str, List[int]]:
+    """Map each distinct text without an embedding to its positions, so it is only sent to the API once"""
+    missing: Dict[str, List[int]] = {}
+    for i, embedding in enumerate(embeddings):
+        if embedding is None:
+            missing.setdefault(texts[i], []).append(i)
+    return missing
@@ -0,0 +1,213 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+from config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_MB
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially re-formatted chunks share a cache entry"""
+    return " ".join(text.split())
+
+
+def text_hash(text: str) -> str:
+    """Content hash of the normalized text, used as the cache key"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Disk-backed embedding cache keyed by (model name, hash of normalized text).
+
+    Vectors are stored as packed float32 blobs in SQLite. When the total size of
+    stored vectors exceeds the configured limit, the least recently used entries
+    are evicted. The total is kept in the database, since several processes
+    (API workers, ingestd) can share the cache file.
+    """
+    # Singleton instance
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(EmbeddingCache, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        """Open (or create) the cache database"""
+        # Only initialize once
+        if self._initialized:
+            return
+
+        cache_dir = os.path.dirname(os.path.abspath(EMBEDDING_CACHE_PATH))
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(EMBEDDING_CACHE_PATH, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)"
+        )
+        # Single row holding the total size of the stored vectors
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), total_bytes INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "INSERT OR IGNORE INTO cache_size (id, total_bytes) "
+            "SELECT 0, COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        )
+        self._conn.commit()
+
+        self.max_bytes = EMBEDDING_CACHE_MAX_MB * 1024 * 1024
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._initialized = True
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        Look up cached embeddings for a list of texts
+
+        Args:
+            model: Embedding model name
+            texts: List of text chunks
+
+        Returns:
+            List aligned with texts, holding the cached vector or None on a miss
+        """
+        hashes = [text_hash(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        now = time.time()
+
+        with self._lock:
+            unique_hashes = list(dict.fromkeys(hashes))
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[i:i+500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch]
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, key) for key in found]
+                )
+                self._conn.commit()
+
+            results = [found.get(key) for key in hashes]
+            hit_count = sum(1 for vector in results if vector is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+
+        return results
+
+    def put_many(self, model: str, texts: Sequence[str], embeddings: Sequence[List[float]]) -> None:
+        """
+        Store embeddings for a list of texts
+
+        Args:
+            model: Embedding model name
+            texts: List of text chunks
+            embeddings: Embedding vector for each text
+        """
+        if len(texts) != len(embeddings):
+            raise ValueError("Length of texts and embeddings must be the same")
+
+        now = time.time()
+        rows = {}
+        for text, embedding in zip(texts, embeddings):
+            rows[text_hash(text)] = array("f", embedding).tobytes()
+
+        with self._lock:
+            # Take the write lock up front, so the size read below is not stale
+            # when another process writes to the cache at the same time
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                total_bytes = self._conn.execute("SELECT total_bytes FROM cache_size WHERE id = 0").fetchone()[0]
+                keys = list(rows)
+                # Entries being replaced no longer count towards the size
+                for i in range(0, len(keys), 500):
+                    batch = keys[i:i+500]
+                    placeholders = ",".join("?" * len(batch))
+                    total_bytes -= self._conn.execute(
+                        f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings "
+                        f"WHERE model = ? AND text_hash IN ({placeholders})",
+                        [model, *batch]
+                    ).fetchone()[0]
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_access) VALUES (?, ?, ?, ?)",
+                    [(model, key, blob, now) for key, blob in rows.items()]
+                )
+                total_bytes += sum(len(blob) for blob in rows.values())
+                total_bytes = self._evict_if_needed(total_bytes)
+                self._conn.execute("UPDATE cache_size SET total_bytes = ? WHERE id = 0", (total_bytes,))
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def _evict_if_needed(self, total_bytes: int) -> int:
+        """
+        Drop least recently used entries until the cache fits its size limit
+
+        Args:
+            total_bytes: Current size of the stored vectors
+
+        Returns:
+            Size of the stored vectors after eviction
+        """
+        while total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY last_access LIMIT 256"
+            ).fetchall()
+            if not rows:
+                return 0
+
+            to_delete = []
+            for rowid, size in rows:
+                to_delete.append((rowid,))
+                total_bytes -= size
+                if total_bytes <= self.max_bytes:
+                    break
+
+            self._conn.executemany("DELETE FROM embeddings WHERE rowid = ?", to_delete)
+            self.evictions += len(to_delete)
+        return total_bytes
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and current cache size"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            size_bytes = self._conn.execute("SELECT total_bytes FROM cache_size WHERE id = 0").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "size_bytes": size_bytes,
+                "max_bytes": self.max_bytes,
+            }
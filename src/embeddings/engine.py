@@ -0,0 +1,353 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import (
+    EMBEDDING_BATCH_MAX_TOKENS,
+    EMBEDDING_BATCH_MAX_SIZE,
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_MAX_RETRIES,
+    EMBEDDING_RPM_LIMIT,
+    EMBEDDING_TPM_LIMIT
+)
+from embeddings.tokens import count_tokens
+from monitoring.metrics import EMBEDDING_BATCHES, EMBEDDING_RETRIES, OPENAI_TOKENS
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingError(Exception):
+    """Raised when a batch could not be embedded after all retries"""
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter enforcing a requests-per-minute and a
+    tokens-per-minute budget across all threads of the process
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_allowance = float(requests_per_minute)
+        self._token_allowance = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        self._request_allowance = min(
+            self.requests_per_minute,
+            self._request_allowance + elapsed * self.requests_per_minute / 60.0
+        )
+        self._token_allowance = min(
+            self.tokens_per_minute,
+            self._token_allowance + elapsed * self.tokens_per_minute / 60.0
+        )
+
+    def acquire(self, tokens: int) -> None:
+        """Block until one request of the given token size fits the budget"""
+        # A single request larger than the whole budget may still go through once the bucket is full
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self._request_allowance >= 1 and self._token_allowance >= tokens:
+                        self._request_allowance -= 1
+                        self._token_allowance -= tokens
+                        return
+                    request_wait = (1 - self._request_allowance) * 60.0 / self.requests_per_minute
+                    token_wait = (tokens - self._token_allowance) * 60.0 / self.tokens_per_minute
+                    wait = max(request_wait, token_wait, 0.01)
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for the given time, e.g. after a 429 response"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+# Process-wide budget shared by all embedding clients
+EMBEDDING_RATE_LIMITER = RateLimiter(EMBEDDING_RPM_LIMIT, EMBEDDING_TPM_LIMIT)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Read the server-suggested delay from a rate-limit error, if present"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    status = _status_code(error)
+    # Connection errors and timeouts carry no status code
+    return status is None or status in (408, 409, 429) or status >= 500
+
+
+class EmbeddingEngine:
+    """
+    Embeds large lists of texts with token-sized batches sent concurrently
+    under a shared rate limit. Failed batches are retried individually and
+    results are always returned in input order.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], List[List[float]]],
+        aembed_batch: Optional[Callable[[List[str]], Awaitable[List[List[float]]]]] = None,
+        rate_limiter: RateLimiter = EMBEDDING_RATE_LIMITER,
+        max_batch_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+        max_batch_size: int = EMBEDDING_BATCH_MAX_SIZE,
+        max_workers: int = EMBEDDING_MAX_CONCURRENCY,
+        max_retries: int = EMBEDDING_MAX_RETRIES
+    ):
+        """
+        Args:
+            embed_batch: Function sending one batch of texts to the embeddings API
+            aembed_batch: Optional async version of embed_batch, used by aembed
+            rate_limiter: Shared requests/tokens per minute budget
+            max_batch_tokens: Upper bound on the tokens sent in a single request
+            max_batch_size: Upper bound on the number of texts in a single request
+            max_workers: Number of requests allowed in flight at the same time
+            max_retries: Attempts per batch before giving up
+        """
+        self.embed_batch = embed_batch
+        self.aembed_batch = aembed_batch
+        self.rate_limiter = rate_limiter
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+
+        self._stats_lock = threading.Lock()
+        self.last_stats: Dict[str, Any] = {}
+        self.totals = {"chunks": 0, "tokens": 0, "batches": 0, "retries": 0, "seconds": 0.0}
+
+    def make_batches(self, token_counts: List[int]) -> List[List[int]]:
+        """Group text indices into batches that respect the token and size limits"""
+        batches = []
+        current = []
+        current_tokens = 0
+        for i, tokens in enumerate(token_counts):
+            if current and (
+                current_tokens + tokens > self.max_batch_tokens or len(current) >= self.max_batch_size
+            ):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts, preserving input order
+
+        Args:
+            texts: List of text strings to embed
+
+        Returns:
+            List of embedding vectors aligned with texts
+
+        Raises:
+            EmbeddingError: If any batch still fails after all retries
+        """
+        if not texts:
+            return []
+
+        start = time.perf_counter()
+        token_counts = [count_tokens(text) for text in texts]
+        batches = self.make_batches(token_counts)
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        run = {"batches": 0, "retries": 0}
+
+        if len(batches) == 1:
+            self._embed_with_retries(texts, token_counts, batches[0], results, run)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+                futures = [
+                    executor.submit(self._embed_with_retries, texts, token_counts, batch, results, run)
+                    for batch in batches
+                ]
+                errors = []
+                for future in futures:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        errors.append(e)
+                if errors:
+                    raise EmbeddingError(f"{len(errors)} of {len(batches)} batches failed: {errors[0]}")
+
+        elapsed = time.perf_counter() - start
+        total_tokens = sum(token_counts)
+        with self._stats_lock:
+            self.last_stats = {
+                "chunks": len(texts),
+                "tokens": total_tokens,
+                "batches": run["batches"],
+                "retries": run["retries"],
+                "seconds": elapsed,
+                "chunks_per_second": len(texts) / elapsed if elapsed > 0 else 0.0,
+                "tokens_per_second": total_tokens / elapsed if elapsed > 0 else 0.0,
+            }
+            self.totals["chunks"] += len(texts)
+            self.totals["tokens"] += total_tokens
+            self.totals["batches"] += run["batches"]
+            self.totals["retries"] += run["retries"]
+            self.totals["seconds"] += elapsed
+
+        return results
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Async version of embed, for the query path: batches are sent
+        concurrently on the event loop with the same rate limit, retries and
+        back-off. Run statistics are left to ingestion.
+
+        Args:
+            texts: List of text strings to embed
+
+        Returns:
+            List of embedding vectors aligned with texts
+
+        Raises:
+            EmbeddingError: If any batch still fails after all retries
+        """
+        if not texts:
+            return []
+        if self.aembed_batch is None:
+            return await asyncio.to_thread(self.embed, texts)
+
+        token_counts = [count_tokens(text) for text in texts]
+        batches = self.make_batches(token_counts)
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        run = {"batches": 0, "retries": 0}
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def send(batch: List[int]) -> None:
+            async with semaphore:
+                await self._aembed_with_retries(texts, token_counts, batch, results, run)
+
+        outcomes = await asyncio.gather(*(send(batch) for batch in batches), return_exceptions=True)
+        errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        if errors:
+            if len(batches) == 1:
+                raise errors[0]
+            raise EmbeddingError(f"{len(errors)} of {len(batches)} batches failed: {errors[0]}")
+        return results
+
+    def _embed_with_retries(
+        self,
+        texts: List[str],
+        token_counts: List[int],
+        batch: List[int],
+        results: List[Optional[List[float]]],
+        run: Dict[str, int]
+    ) -> None:
+        """Send one batch, retrying it alone on transient errors"""
+        batch_texts = [texts[i] for i in batch]
+        batch_tokens = sum(token_counts[i] for i in batch)
+
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(batch_tokens)
+            try:
+                embeddings = self.embed_batch(batch_texts)
+                for i, embedding in zip(batch, embeddings):
+                    results[i] = embedding
+                with self._stats_lock:
+                    run["batches"] += 1
+                EMBEDDING_BATCHES.inc()
+                OPENAI_TOKENS.inc(batch_tokens, type="embedding")
+                return
+            except Exception as e:
+                if _status_code(e) == 400 and len(batch) > 1:
+                    # The request may simply be too large; split it and try the halves
+                    middle = len(batch) // 2
+                    self._embed_with_retries(texts, token_counts, batch[:middle], results, run)
+                    self._embed_with_retries(texts, token_counts, batch[middle:], results, run)
+                    return
+                delay = self._retry_delay(e, attempt, len(batch), run)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    async def _aembed_with_retries(
+        self,
+        texts: List[str],
+        token_counts: List[int],
+        batch: List[int],
+        results: List[Optional[List[float]]],
+        run: Dict[str, int]
+    ) -> None:
+        """Async version of _embed_with_retries"""
+        batch_texts = [texts[i] for i in batch]
+        batch_tokens = sum(token_counts[i] for i in batch)
+
+        for attempt in range(self.max_retries + 1):
+            await asyncio.to_thread(self.rate_limiter.acquire, batch_tokens)
+            try:
+                embeddings = await self.aembed_batch(batch_texts)
+                for i, embedding in zip(batch, embeddings):
+                    results[i] = embedding
+                run["batches"] += 1
+                EMBEDDING_BATCHES.inc()
+                OPENAI_TOKENS.inc(batch_tokens, type="embedding")
+                return
+            except Exception as e:
+                if _status_code(e) == 400 and len(batch) > 1:
+                    middle = len(batch) // 2
+                    await self._aembed_with_retries(texts, token_counts, batch[:middle], results, run)
+                    await self._aembed_with_retries(texts, token_counts, batch[middle:], results, run)
+                    return
+                delay = self._retry_delay(e, attempt, len(batch), run)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    def _retry_delay(self, error: Exception, attempt: int, batch_size: int, run: Dict[str, int]) -> Optional[float]:
+        """
+        Decide how to handle a failed batch
+
+        Returns:
+            Seconds to wait before the next attempt, or None if the error is
+            permanent or the batch is out of attempts
+        """
+        if not _is_retryable(error) or attempt == self.max_retries:
+            return None
+
+        status = _status_code(error)
+        delay = _retry_after(error)
+        if delay is None:
+            delay = min(60.0, 2 ** attempt) + random.uniform(0, 1)
+        if status == 429:
+            # Everyone backs off, not just this batch
+            self.rate_limiter.pause(delay)
+        with self._stats_lock:
+            run["retries"] += 1
+        EMBEDDING_RETRIES.inc(status=str(status) if status else "none")
+        logger.warning("Embedding batch of %d failed (%s); retrying in %.1fs", batch_size, error, delay)
+        return delay
@@ -0,0 +1,133 @@
+import asyncio
+import math
+import re
+import zlib
+from collections import Counter
+from typing import AsyncIterator, List, Optional, Tuple
+
+import numpy as np
+
+from config import VECTOR_SIZE
+from embeddings.provider import ModelProvider
+from embeddings.sparse import tokenize
+
+# Feature weights: whole terms carry the topic, term pairs the phrasing and
+# character trigrams let inflections and typos land close to each other
+TERM_WEIGHT = 1.0
+BIGRAM_WEIGHT = 0.5
+TRIGRAM_WEIGHT = 0.2
+
+QUESTION = re.compile(r"^\s*Question: (?P<question>.*)$", re.MULTILINE)
+# A context passage runs until the next one or the closing instruction of the prompt
+PASSAGE = re.compile(
+    r"^\s*Document \d+ \[Source: (?P<source>[^\]\n]*)\]:\n(?P<text>.*?)"
+    r"(?=^\s*Document \d+ \[Source: |^\s*Please answer the question|\Z)",
+    re.MULTILINE | re.DOTALL
+)
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+NOT_FOUND_ANSWER = "The provided documents do not contain information about this question."
+
+
+class LocalProvider(ModelProvider):
+    """
+    Deterministic provider that runs in-process without a network.
+
+    Embeddings are hashed n-gram vectors of VECTOR_SIZE dimensions: terms,
+    term pairs and character trigrams are hashed into signed buckets with
+    sublinear counts and the vector is L2 normalised, so texts sharing
+    words are close. Completions are templated: the answer quotes the
+    context sentence that covers most of the question's terms and cites
+    its source. Meant for profiling, load tests and benchmarks, where the
+    cost of the pipeline around the model is what is measured.
+    """
+    name = "local"
+
+    def __init__(self, dimensions: int = VECTOR_SIZE):
+        """
+        Args:
+            dimensions: Embedding size; must match the collection's vector size
+        """
+        self.dimensions = dimensions
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts with hashed n-gram features
+
+        Args:
+            texts: List of text strings to generate embeddings for
+
+        Returns:
+            List of unit-length embedding vectors
+        """
+        return [self._embed(text).tolist() for text in texts]
+
+    def get_completion(self, system_prompt: str, user_prompt: str) -> str:
+        """
+        Answer from the context in the prompt with a fixed template
+
+        Args:
+            system_prompt: System instructions (ignored)
+            user_prompt: User query with context, as built by DocumentQueryModel
+
+        Returns:
+            The best matching context sentence with its source, or a
+            not-found answer
+        """
+        match = QUESTION.search(user_prompt)
+        question = match.group("question") if match else user_prompt
+        best = _best_sentence(question, user_prompt)
+        if best is None:
+            return NOT_FOUND_ANSWER
+        source, sentence = best
+        return f"According to {source}: {sentence}"
+
+    async def aget_completion(self, system_prompt: str, user_prompt: str) -> str:
+        """Async version of get_completion; cheap enough to run on the event loop"""
+        return self.get_completion(system_prompt, user_prompt)
+
+    async def astream_completion(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """Stream the templated answer word by word"""
+        words = self.get_completion(system_prompt, user_prompt).split(" ")
+        for i, word in enumerate(words):
+            # Let other requests run between tokens, as with a real stream
+            await asyncio.sleep(0)
+            yield word if i == 0 else " " + word
+
+    def _embed(self, text: str) -> np.ndarray:
+        terms = tokenize(text)
+        features = Counter()
+        for term in terms:
+            features[term] += TERM_WEIGHT
+            padded = f"#{term}#"
+            for i in range(len(padded) - 2):
+                features["3:" + padded[i:i + 3]] += TRIGRAM_WEIGHT
+        for first, second in zip(terms, terms[1:]):
+            features[f"2:{first} {second}"] += BIGRAM_WEIGHT
+
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature, weight in features.items():
+            code = zlib.crc32(feature.encode("utf-8"))
+            # The top bit picks the sign, so colliding features cancel out on average
+            sign = -1.0 if code & 0x80000000 else 1.0
+            # Sublinear in the count, scaled by the feature kind's weight
+            vector[code % self.dimensions] += sign * math.log1p(weight)
+
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            # Texts without terms still need a valid vector for cosine search
+            vector[0] = 1.0
+            return vector
+        return vector / norm
+
+
+def _best_sentence(question: str, prompt: str) -> Optional[Tuple[str, str]]:
+    """The (source, sentence) of the context covering most question terms; earlier passages win ties"""
+    terms = set(tokenize(question))
+    best, best_score = None, 0
+    for passage in PASSAGE.finditer(prompt):
+        for sentence in SENTENCE_END.split(passage.group("text").strip()):
+            score = len(terms.intersection(tokenize(sentence)))
+            if score > best_score:
+                best, best_score = (passage.group("source"), " ".join(sentence.split())), score
+    return best
@@ -0,0 +1,77 @@
+import asyncio
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import AsyncIterator, List
+
+from config import LLM_PROVIDER
+
+
+class ModelProvider(ABC):
+    """
+    Backend for embeddings and chat completions.
+
+    Subclasses implement get_embeddings and get_completion. The async
+    methods default to running those in a worker thread and streaming the
+    whole completion as one piece; network-backed providers override them.
+    """
+    # Name used in logs and in the LLM_PROVIDER setting
+    name = "base"
+
+    @abstractmethod
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings for a list of texts
+
+        Args:
+            texts: List of text strings to generate embeddings for
+
+        Returns:
+            List of embedding vectors, or an empty list on failure
+        """
+
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Async version of get_embeddings"""
+        return await asyncio.to_thread(self.get_embeddings, texts)
+
+    @abstractmethod
+    def get_completion(self, system_prompt: str, user_prompt: str) -> str:
+        """
+        Generate a chat completion
+
+        Args:
+            system_prompt: System instructions
+            user_prompt: User query with context
+
+        Returns:
+            Generated completion text
+        """
+
+    async def aget_completion(self, system_prompt: str, user_prompt: str) -> str:
+        """Async version of get_completion"""
+        return await asyncio.to_thread(self.get_completion, system_prompt, user_prompt)
+
+    async def astream_completion(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """Stream a completion; yields pieces of the completion text"""
+        yield await self.aget_completion(system_prompt, user_prompt)
+
+
+@lru_cache(maxsize=None)
+def get_provider() -> ModelProvider:
+    """
+    The provider selected by LLM_PROVIDER, shared by the whole process so
+    HTTP connections and the embedding cache are reused
+
+    Returns:
+        The Azure OpenAI client or the local deterministic provider
+
+    Raises:
+        ValueError: If LLM_PROVIDER names an unknown provider
+    """
+    # Imported here so the local provider works without the openai package configured
+    if LLM_PROVIDER == "azure":
+        from embeddings.azure_openai import AzureOpenAIClient
+        return AzureOpenAIClient()
+    if LLM_PROVIDER == "local":
+        from embeddings.local import LocalProvider
+        return LocalProvider()
+    raise ValueError(f"Unknown LLM_PROVIDER {LLM_PROVIDER!r}, expected 'azure' or 'local'")
@@ -0,0 +1,77 @@
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List
+
+from qdrant_client.http import models
+
+# Words and identifiers; "P-1042", "ERR_0x1F" and "v2.3.1" stay one token
+TOKEN = re.compile(r"[a-z0-9]+(?:[-_./:][a-z0-9]+)*")
+SPLIT = re.compile(r"[-_./:]")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how i if in into is it its of on or "
+    "that the their then there these this to was what when where which who why will with".split()
+)
+
+# BM25 term frequency saturation and length normalisation. IDF is applied
+# by Qdrant at query time (Modifier.IDF on the sparse vector).
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Typical chunk length in terms; chunks are capped at CHUNK_SIZE_TOKENS tokens
+BM25_AVG_TERMS = 250
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase terms for lexical matching. Compound
+    identifiers are kept whole and also split into their parts, so "P-1042"
+    matches both "p-1042" and "1042".
+    """
+    terms = []
+    for token in TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        if SPLIT.search(token):
+            terms.extend(part for part in SPLIT.split(token) if part and part not in STOPWORDS)
+    return terms
+
+
+def term_id(term: str) -> int:
+    """Stable 32-bit index of a term in the sparse vector space"""
+    return zlib.crc32(term.encode("utf-8"))
+
+
+def _to_sparse(weights: Dict[int, float]) -> models.SparseVector:
+    indices = sorted(weights)
+    return models.SparseVector(indices=indices, values=[weights[i] for i in indices])
+
+
+def document_sparse_vector(text: str) -> models.SparseVector:
+    """
+    BM25 document-side weights of a chunk
+
+    Args:
+        text: Chunk text
+
+    Returns:
+        Sparse vector of saturated, length-normalised term frequencies
+    """
+    counts = Counter(term_id(term) for term in tokenize(text))
+    length = sum(counts.values())
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / BM25_AVG_TERMS)
+    return _to_sparse({index: tf * (BM25_K1 + 1) / (tf + norm) for index, tf in counts.items()})
+
+
+def query_sparse_vector(text: str) -> models.SparseVector:
+    """
+    Query-side sparse vector: every distinct term once, weighted by IDF in Qdrant
+
+    Args:
+        text: Query text
+
+    Returns:
+        Sparse vector with weight 1.0 per distinct query term
+    """
+    return _to_sparse({term_id(term): 1.0 for term in tokenize(text)})
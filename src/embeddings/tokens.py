@@ -0,0 +1,22 @@
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    # tiktoken is optional; fall back to a character-based estimate
+    _ENCODING = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens in a text for the OpenAI embedding and chat models
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Exact token count when tiktoken is available, otherwise an estimate
+        of roughly four characters per token
+    """
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return max(1, (len(text) + 3) // 4)
@@ -0,0 +1,143 @@
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS
+from embeddings.tokens import count_tokens
+
+# End of a sentence: terminal punctuation, optional closing quotes/brackets, then whitespace
+SENTENCE_END = re.compile(r'[.!?]["\')\]]*\s+')
+WORD = re.compile(r'\S+\s*')
+
+# Close a chunk early at a paragraph break once it is this full
+PARAGRAPH_FILL_RATIO = 0.8
+
+
+class _Unit:
+    """A sentence (or piece of one) with its position in the document"""
+    __slots__ = ("text", "tokens", "start", "end", "page", "paragraph_start")
+
+    def __init__(self, text: str, tokens: int, start: int, page: Optional[int], paragraph_start: bool):
+        self.text = text
+        self.tokens = tokens
+        self.start = start
+        self.end = start + len(text)
+        self.page = page
+        self.paragraph_start = paragraph_start
+
+
+def _split_sentences(text: str, start: int, page: Optional[int], max_tokens: int) -> Iterator[_Unit]:
+    """Split a paragraph into sentences, cutting sentences that are too long on word boundaries"""
+    position = 0
+    first = True
+    boundaries = [match.end() for match in SENTENCE_END.finditer(text)] + [len(text)]
+    for boundary in boundaries:
+        sentence = text[position:boundary].strip()
+        if sentence:
+            offset = start + text.index(sentence[0], position)
+            tokens = count_tokens(sentence)
+            if tokens <= max_tokens:
+                yield _Unit(sentence, tokens, offset, page, first)
+            else:
+                yield from _split_words(sentence, offset, page, max_tokens, first)
+            first = False
+        position = boundary
+
+
+def _split_words(sentence: str, start: int, page: Optional[int], max_tokens: int, first: bool) -> Iterator[_Unit]:
+    # Per-word counts slightly overestimate the joined text, which keeps pieces under the limit
+    piece = ""
+    piece_start = 0
+    piece_tokens = 0
+    for match in WORD.finditer(sentence):
+        word_tokens = count_tokens(match.group())
+        if piece and piece_tokens + word_tokens > max_tokens:
+            yield _Unit(piece.rstrip(), piece_tokens, start + piece_start, page, first)
+            first = False
+            piece = ""
+            piece_start = match.start()
+            piece_tokens = 0
+        piece += match.group()
+        piece_tokens += word_tokens
+    if piece.strip():
+        yield _Unit(piece.rstrip(), piece_tokens, start + piece_start, page, first)
+
+
+def _join(units: List[_Unit]) -> str:
+    parts = []
+    for i, unit in enumerate(units):
+        if i:
+            parts.append("\n\n" if unit.paragraph_start else " ")
+        parts.append(unit.text)
+    return "".join(parts)
+
+
+def chunk_segments(
+    segments: Iterable[Tuple[str, Dict[str, Any]]],
+    chunk_tokens: int = CHUNK_SIZE_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Turn a stream of text segments (pages or paragraphs) into chunks of
+    roughly chunk_tokens tokens. Chunks end on sentence boundaries, prefer
+    paragraph boundaries, and repeat the last overlap_tokens tokens of the
+    previous chunk. Only the chunk being built is held in memory.
+
+    Args:
+        segments: Iterable of (text, metadata) where metadata may carry
+            "page" and "start_char"
+        chunk_tokens: Target chunk size in tokens
+        overlap_tokens: Tokens carried over from the end of the previous chunk
+
+    Yields:
+        Tuples of (chunk text, metadata with page, page_end, start_char,
+        end_char and token count)
+    """
+    current: List[_Unit] = []
+    current_tokens = 0
+    # Units already emitted in a previous chunk (the overlap) do not justify emitting again
+    fresh = False
+    offset = 0
+
+    def emit() -> Tuple[str, Dict[str, Any]]:
+        pages = [unit.page for unit in current if unit.page is not None]
+        return _join(current), {
+            "page": pages[0] if pages else None,
+            "page_end": pages[-1] if pages else None,
+            "start_char": current[0].start,
+            "end_char": current[-1].end,
+            "tokens": current_tokens,
+        }
+
+    def overlap() -> List[_Unit]:
+        kept: List[_Unit] = []
+        tokens = 0
+        for unit in reversed(current):
+            if tokens + unit.tokens > overlap_tokens:
+                break
+            kept.insert(0, unit)
+            tokens += unit.tokens
+        return kept
+
+    for text, metadata in segments:
+        start = metadata.get("start_char", offset)
+        offset = start + len(text) + 2
+        page = metadata.get("page")
+
+        for unit in _split_sentences(text, start, page, chunk_tokens):
+            full = current_tokens + unit.tokens > chunk_tokens
+            paragraph_break = unit.paragraph_start and current_tokens >= chunk_tokens * PARAGRAPH_FILL_RATIO
+            if fresh and (full or paragraph_break):
+                yield emit()
+                current = overlap()
+                current_tokens = sum(u.tokens for u in current)
+                fresh = False
+                # Drop the overlap if it leaves no room for the next sentence
+                while current and current_tokens + unit.tokens > chunk_tokens:
+                    current_tokens -= current.pop(0).tokens
+
+            current.append(unit)
+            current_tokens += unit.tokens
+            fresh = True
+
+    if fresh:
+        yield emit()
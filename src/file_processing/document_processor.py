@@ -1,46 +1,78 @@
+import logging
 import os
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from concurrent.futures import Executor
 import datetime
 
-from file_processing.pdf_reader import read_pdf
-from file_processing.txt_reader import read_txt
+from config import CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS
+from file_processing.chunker import chunk_segments
+from file_processing.pdf_reader import iter_pdf_pages
+from file_processing.txt_reader import iter_txt_segments
+from monitoring.metrics import IterationTimer, record
 
+logger = logging.getLogger(__name__)
 
-def process_document(file_path: str) -> List[Tuple[str, str]]:
+# Recorded in the manifest; files indexed with other chunking settings are re-chunked
+PIPELINE_VERSION = f"chunker-v1:{CHUNK_SIZE_TOKENS}:{CHUNK_OVERLAP_TOKENS}"
+
+
+def iter_document(file_path: str, executor: Optional[Executor] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
     """
-    Process a document and extract text chunks with metadata
+    Stream the chunks of a document with their metadata
     
     Args:
         file_path: Path to the document
+        executor: Optional process pool used to extract PDF pages in parallel
         
-    Returns:
-        List of tuples containing (text_chunk, metadata)
+    Yields:
+        Tuples of (text_chunk, metadata)
     """
     file_path = Path(file_path)
     file_name = file_path.name
     file_ext = file_path.suffix.lower()
     
-    chunks = []
-    
     if file_ext == '.pdf':
-        text_chunks = read_pdf(str(file_path))
+        segments = iter_pdf_pages(str(file_path), executor)
     elif file_ext == '.txt':
-        text_chunks = read_txt(str(file_path))
+        segments = iter_txt_segments(str(file_path))
     else:
-        print(f"Unsupported file type: {file_ext}")
-        return []
+        logger.warning("Unsupported file type: %s", file_ext)
+        return
     
-    # Add metadata to each chunk
-    result = []
-    for i, chunk in enumerate(text_chunks):
-        metadata = {
-            "source": str(file_path),  # Store the full path
-            "title": file_name,  # Add a title field for display purposes
-            "chunk_id": i,
-            "file_type": file_ext,
-            "timestamp": datetime.datetime.now().isoformat()  # Add timestamp for sorting
-        }
-        result.append((chunk, metadata))
+    timestamp = datetime.datetime.now().isoformat()
+    # Pages are extracted lazily while chunking, so the chunking time excludes the extraction inside it
+    segments = IterationTimer(segments)
+    chunks = IterationTimer(chunk_segments(segments))
+    try:
+        for i, (chunk, position) in enumerate(chunks):
+            metadata = {
+                "source": str(file_path),  # Store the full path
+                "title": file_name,  # Add a title field for display purposes
+                "chunk_id": i,
+                "file_type": file_ext,
+                "timestamp": timestamp  # Add timestamp for sorting
+            }
+            # Page range (PDF only), character offsets and token count
+            metadata.update({key: value for key, value in position.items() if value is not None})
+            yield chunk, metadata
+    finally:
+        record("extract", segments.seconds)
+        record("chunk", chunks.seconds - segments.seconds)
+
+
+def process_document(file_path: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Process a document and extract text chunks with metadata
     
-    return result
\ No newline at end of file
+    Args:
+        file_path: Path to the document
+        
+    Returns:
+        List of tuples containing (text_chunk, metadata)
+    """
+    try:
+        return list(iter_document(file_path))
+    except Exception as e:
+        logger.error("Error processing document %s: %s", file_path, e)
+        return []
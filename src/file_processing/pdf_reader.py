@@ -1,29 +1,108 @@
+import logging
+import os
+from collections import deque
+from concurrent.futures import Executor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
 import PyPDF2
-from pathlib import Path
-from typing import List
+
+from config import PDF_PAGES_PER_TASK
+
+logger = logging.getLogger(__name__)
+
+
+def _open_reader(file) -> PyPDF2.PdfReader:
+    """Open a PDF, unlocking files that are only encrypted to restrict editing or printing"""
+    reader = PyPDF2.PdfReader(file, strict=False)
+    if reader.is_encrypted:
+        # Most "encrypted" PDFs use an empty user password
+        if not reader.decrypt(""):
+            raise ValueError("PDF is password protected")
+    return reader
+
+
+def _extract_page(reader: PyPDF2.PdfReader, index: int, file_path: str) -> Optional[str]:
+    """Extract one page, skipping it rather than the whole file if it is malformed"""
+    try:
+        return reader.pages[index].extract_text()
+    except Exception as e:
+        logger.warning("Skipping page %d of %s: %s", index + 1, file_path, e)
+        return None
+
+
+def _extract_page_range(file_path: str, start: int, stop: int) -> List[Tuple[int, Optional[str]]]:
+    """
+    Extract pages [start, stop) of a PDF. Runs in a worker process, so it
+    opens the file itself instead of receiving a reader.
+    
+    Returns:
+        List of (0-based page index, text or None for unreadable pages)
+    """
+    with open(file_path, 'rb') as file:
+        reader = _open_reader(file)
+        return [(i, _extract_page(reader, i, file_path)) for i in range(start, stop)]
+
+
+def iter_pdf_pages(
+    file_path: str,
+    executor: Optional[Executor] = None,
+    pages_per_task: int = PDF_PAGES_PER_TASK
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Extract text from a PDF file page by page.
+    
+    With an executor, page ranges are extracted in parallel and yielded in
+    page order as soon as each range is done. Only a few ranges per worker
+    are in flight at a time, so memory stays bounded on very large files.
+    
+    Args:
+        file_path: Path to the PDF file
+        executor: Optional process pool to spread page ranges over
+        pages_per_task: Pages extracted per task submitted to the executor
+    
+    Yields:
+        Tuples of (page text, metadata with the 1-based page number)
+    """
+    with open(file_path, 'rb') as file:
+        reader = _open_reader(file)
+        page_count = len(reader.pages)
+
+        if executor is None or page_count <= pages_per_task:
+            for i in range(page_count):
+                text = _extract_page(reader, i, file_path)
+                if text and text.strip():
+                    yield text, {"page": i + 1}
+            return
+
+    ranges = deque((start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task))
+    max_pending = 2 * (os.cpu_count() or 1)
+    pending = deque()
+    try:
+        while ranges or pending:
+            while ranges and len(pending) < max_pending:
+                start, stop = ranges.popleft()
+                pending.append(executor.submit(_extract_page_range, file_path, start, stop))
+            for i, text in pending.popleft().result():
+                if text and text.strip():
+                    yield text, {"page": i + 1}
+    finally:
+        # The consumer stopped early or a range failed
+        for future in pending:
+            future.cancel()
 
 
 def read_pdf(file_path: str) -> List[str]:
     """
-    Extract text from a PDF file and return it as chunks.
+    Extract text from a PDF file and return it as one chunk per page.
     
     Args:
         file_path: Path to the PDF file
-        
+    
     Returns:
         List of text chunks from the PDF
     """
-    chunks = []
     try:
-        with open(file_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            for i, page in enumerate(reader.pages):
-                text = page.extract_text()
-                if text.strip():
-                    # Add page metadata to the chunk
-                    chunk = f"Page {i+1}: {text}"
-                    chunks.append(chunk)
-        return chunks
+        return [f"Page {metadata['page']}: {text}" for text, metadata in iter_pdf_pages(file_path)]
     except Exception as e:
-        print(f"Error processing PDF file {file_path}: {e}")
-        return []
\ No newline at end of file
+        logger.error("Error processing PDF file %s: %s", file_path, e)
+        return []
@@ -1,28 +1,71 @@
-from typing import List
+import logging
+import re
+from typing import Any, Dict, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Read size for streaming large text files
+READ_BLOCK_CHARS = 64 * 1024
+# A paragraph longer than this is passed on in pieces to keep memory bounded
+MAX_SEGMENT_CHARS = 256 * 1024
+
+PARAGRAPH_BREAK = re.compile(r'\n[ \t]*\n')
+
+
+def iter_txt_segments(file_path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Stream a TXT file paragraph by paragraph without loading it into memory.
+    
+    Args:
+        file_path: Path to the TXT file
+        
+    Yields:
+        Tuples of (paragraph text, metadata with the paragraph's start_char)
+    """
+    with open(file_path, 'r', encoding='utf-8') as file:
+        buffer = ''
+        buffer_start = 0
+        while True:
+            block = file.read(READ_BLOCK_CHARS)
+            buffer += block
+            
+            # Emit every complete paragraph in the buffer
+            position = 0
+            for match in PARAGRAPH_BREAK.finditer(buffer):
+                yield from _paragraph(buffer[position:match.start()], buffer_start + position)
+                position = match.end()
+            
+            if not block:
+                yield from _paragraph(buffer[position:], buffer_start + position)
+                return
+            
+            if len(buffer) - position > MAX_SEGMENT_CHARS:
+                # No paragraph break in sight; pass the text on rather than buffering it all
+                yield from _paragraph(buffer[position:], buffer_start + position)
+                position = len(buffer)
+            
+            buffer_start += position
+            buffer = buffer[position:]
+
+
+def _paragraph(text: str, start: int) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    stripped = text.strip()
+    if stripped:
+        yield stripped, {"start_char": start + text.index(stripped[0])}
 
 
 def read_txt(file_path: str) -> List[str]:
     """
-    Read text from a TXT file and return it as chunks.
+    Read text from a TXT file and return it as paragraphs.
     
     Args:
         file_path: Path to the TXT file
         
     Returns:
-        List of text chunks from the TXT file
+        List of paragraphs from the TXT file
     """
-    chunks = []
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-            
-        # Simple chunking by paragraphs
-        paragraphs = content.split('\n\n')
-        for paragraph in paragraphs:
-            if paragraph.strip():
-                chunks.append(paragraph.strip())
-                
-        return chunks
+        return [text for text, _ in iter_txt_segments(file_path)]
     except Exception as e:
-        print(f"Error processing TXT file {file_path}: {e}")
-        return []
\ No newline at end of file
+        logger.error("Error processing TXT file %s: %s", file_path, e)
+        return []
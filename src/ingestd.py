@@ -0,0 +1,126 @@
+"""
+Ingestion daemon: watches the document tree and indexes it, so API
+processes (INGESTION_MODE=daemon) only serve queries.
+
+Several instances may be started on the same machine, e.g. as a standby:
+the instance holding the lock file INGEST_LOCK_PATH indexes, the others
+wait and take over when it exits or crashes.
+
+Usage:
+    python -m src.ingestd
+    python src/ingestd.py --directory D:/Manuals --metrics-port 9101
+"""
+import argparse
+import logging
+import os
+import signal
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Make the project root (config) and src (packages) importable however the daemon is started
+SRC = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [SRC, os.path.dirname(SRC)]
+
+from config import (  # noqa: E402
+    WATCH_DIRECTORY,
+    INGESTION_MODE,
+    INGEST_LOCK_PATH,
+    INGEST_LOCK_POLL_SECONDS,
+    LOG_LEVEL,
+    QDRANT_URL
+)
+from ingestion.jobs import IngestionQueue, watch_directory  # noqa: E402
+from ingestion.lock import ProcessLock  # noqa: E402
+from monitoring.metrics import render as render_metrics  # noqa: E402
+
+logger = logging.getLogger("ingestd")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the ingestion metrics on /metrics"""
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port: int) -> ThreadingHTTPServer:
+    """Serve /metrics on a port in a background thread"""
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="ingestd-metrics", daemon=True).start()
+    logger.info("Serving metrics on port %d", server.server_port)
+    return server
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Watch a document tree and index it")
+    parser.add_argument("--directory", default=WATCH_DIRECTORY, help="Document tree to index (default: WATCH_DIRECTORY)")
+    parser.add_argument("--metrics-port", type=int, default=0, help="Serve /metrics on this port, 0 = off")
+    parser.add_argument(
+        "--no-wait", action="store_true", help="Exit instead of waiting when another instance is indexing"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if INGESTION_MODE != "daemon":
+        logger.warning(
+            "INGESTION_MODE is %r, so the API server indexes too; set INGESTION_MODE=daemon for the API processes",
+            INGESTION_MODE
+        )
+    if not QDRANT_URL:
+        logger.warning(
+            "Without QDRANT_URL the index is the embedded Qdrant, which the API cannot open while ingestd runs"
+        )
+
+    stop = threading.Event()
+    for name in ("SIGINT", "SIGTERM"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), lambda signum, frame: stop.set())
+
+    lock = ProcessLock(INGEST_LOCK_PATH)
+    if not lock.acquire():
+        if args.no_wait:
+            logger.error("Another ingestd (PID %s) holds %s", lock.holder(), lock.path)
+            return 1
+        logger.info("Another ingestd (PID %s) is indexing; waiting to take over", lock.holder())
+        # Poll in steps so a stop signal is noticed while waiting
+        while not lock.wait(INGEST_LOCK_POLL_SECONDS, timeout=INGEST_LOCK_POLL_SECONDS):
+            if stop.is_set():
+                return 0
+
+    metrics_server = None
+    watcher = None
+    try:
+        logger.info("Holding %s, indexing %s", lock.path, os.path.abspath(args.directory))
+        os.makedirs(args.directory, exist_ok=True)
+        if args.metrics_port:
+            metrics_server = serve_metrics(args.metrics_port)
+        watcher = watch_directory(IngestionQueue(), os.path.abspath(args.directory))
+
+        # Wake up regularly: on Windows a plain wait cannot be interrupted by Ctrl+C
+        while not stop.wait(1.0):
+            pass
+        logger.info("Stopping ingestion daemon")
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        # The lock is released when the process exits, after the indexing
+        # threads have stopped, so a standby never indexes alongside them
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
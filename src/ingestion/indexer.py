@@ -0,0 +1,309 @@
+import logging
+import os
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from database.qdrant_client import QdrantDB, make_point_id
+from embeddings.provider import ModelProvider
+from file_processing.document_processor import PIPELINE_VERSION
+from ingestion.manifest import FileManifest, file_hash
+from monitoring.metrics import span
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.txt')
+
+# Chunks embedded and upserted per step, so progress can be reported on large files
+INDEX_WINDOW = 256
+
+# Marks the end of a ChunkStream
+_END = object()
+
+
+def plan_file(file_path: str, manifest: Optional[FileManifest] = None) -> Dict[str, Any]:
+    """
+    Decide whether a file has to be (re)indexed
+
+    Args:
+        file_path: Path to the document
+        manifest: File manifest, defaults to the shared instance
+
+    Returns:
+        Dictionary with the file's path, size, mtime, content hash and current
+        manifest entry; its status is "unchanged" or "pending"
+    """
+    manifest = manifest or FileManifest()
+    path = os.path.abspath(file_path)
+    stat = os.stat(path)
+    entry = manifest.get(path)
+    plan = {
+        "path": path,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "content_hash": None,
+        "entry": entry,
+        "status": "pending",
+    }
+
+    if entry and entry["pipeline"] != PIPELINE_VERSION:
+        # Indexed with different chunking settings: the chunks have to be rebuilt
+        plan["content_hash"] = file_hash(path)
+        return plan
+
+    # Cheap check first: same size and mtime means nothing to do
+    if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+        plan["status"] = "unchanged"
+        return plan
+
+    plan["content_hash"] = file_hash(path)
+    if entry and entry["content_hash"] == plan["content_hash"]:
+        # Touched but not modified
+        manifest.upsert(path, stat.st_size, stat.st_mtime, plan["content_hash"], entry["point_ids"], PIPELINE_VERSION)
+        plan["status"] = "unchanged"
+    return plan
+
+
+class ChunkStream:
+    """
+    Bounded hand-off of chunks from an extraction thread to an indexing
+    thread, so embedding starts while the rest of the file is still being
+    extracted
+    """
+
+    def __init__(self, maxsize: int = INDEX_WINDOW * 2):
+        self._queue: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self._cancelled = threading.Event()
+
+    def put(self, chunk: Tuple[str, Dict[str, Any]]) -> bool:
+        """Hand over a chunk, blocking while the consumer is behind; False once the consumer gave up"""
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(chunk, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        """Mark the end of the stream; an error is re-raised in the consumer"""
+        self.put((_END, error))
+
+    def cancel(self) -> None:
+        """Stop the producer, e.g. because indexing failed"""
+        self._cancelled.set()
+
+    def __iter__(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        while True:
+            chunk = self._queue.get()
+            if chunk[0] is _END:
+                if chunk[1] is not None:
+                    raise chunk[1]
+                return
+            yield chunk
+
+
+
+def apply_chunks(
+    plan: Dict[str, Any],
+    document_chunks: Iterable[Tuple[str, Dict[str, Any]]],
+    db: QdrantDB,
+    provider: ModelProvider,
+    manifest: Optional[FileManifest] = None,
+    progress: Optional[Callable[[str, int, int], None]] = None
+) -> Dict[str, Any]:
+    """
+    Embed and upsert the new chunks of a file and delete its stale ones.
+    Chunks are consumed in windows as they arrive, so they can be streamed
+    straight from extraction.
+
+    Args:
+        plan: Result of plan_file for the file
+        document_chunks: Chunks extracted from the file, as a list or a stream
+        db: Vector database
+        provider: Model provider used to embed new chunks
+        manifest: File manifest, defaults to the shared instance
+        progress: Optional callback receiving (stage, chunks done, chunks total);
+            while a stream is still arriving the total is the number seen so far
+
+    Returns:
+        Dictionary with the outcome ("indexed", "empty" or "failed") and the
+        number of chunks added, removed and in total
+    """
+    manifest = manifest or FileManifest()
+    path = plan["path"]
+    entry = plan["entry"]
+    known = set(entry["point_ids"]) if entry else None
+    total = len(document_chunks) if isinstance(document_chunks, list) else None
+
+    point_ids: List[str] = []
+    seen = set()
+    added = 0
+    first_metadata = None
+    window: List[Tuple[str, str, Dict[str, Any]]] = []
+
+    def flush() -> bool:
+        nonlocal added
+        ids = [point_id for point_id, _, _ in window]
+        if known is not None:
+            existing = known
+        else:
+            # No manifest entry (first run or lost manifest): ask the database
+            existing = set(db.existing_ids(ids))
+        new = [(point_id, text, metadata) for point_id, text, metadata in window if point_id not in existing]
+        window.clear()
+        if not new:
+            return True
+
+        texts = [text for _, text, _ in new]
+        if progress:
+            progress("embedding", len(point_ids) - len(ids), total or len(point_ids))
+        with span("embed"):
+            embeddings = provider.get_embeddings(texts)
+        if not embeddings:
+            return False
+
+        if progress:
+            progress("upserting", len(point_ids) - len(ids), total or len(point_ids))
+        with span("upsert"):
+            db.add_texts(texts, embeddings, [metadata for _, _, metadata in new], ids=[point_id for point_id, _, _ in new])
+        added += len(new)
+        return True
+
+    for text, metadata in document_chunks:
+        # Identical chunks within a file map to the same point, keep the first one
+        point_id = make_point_id(metadata["source"], text)
+        if point_id in seen:
+            continue
+        seen.add(point_id)
+        point_ids.append(point_id)
+        if first_metadata is None:
+            first_metadata = metadata
+        window.append((point_id, text, metadata))
+        if len(window) >= INDEX_WINDOW and not flush():
+            logger.error("Failed to generate embeddings for %s", path)
+            return {"status": "failed", "added": added, "removed": 0, "chunks": 0}
+
+    if window and not flush():
+        logger.error("Failed to generate embeddings for %s", path)
+        return {"status": "failed", "added": added, "removed": 0, "chunks": 0}
+
+    if not point_ids:
+        logger.warning("No text chunks extracted from %s", path)
+        return {"status": "empty", "added": 0, "removed": 0, "chunks": 0}
+
+    if progress:
+        progress("cleanup", len(point_ids), len(point_ids))
+    return finalize_file(plan, point_ids, first_metadata, added, db, manifest)
+
+
+def finalize_file(
+    plan: Dict[str, Any],
+    point_ids: List[str],
+    first_metadata: Dict[str, Any],
+    added: int,
+    db: QdrantDB,
+    manifest: FileManifest
+) -> Dict[str, Any]:
+    """
+    Complete the indexing of a file once all its chunks are stored: delete
+    its stale chunks, then record it in the manifest, which marks it as done,
+    and in the document catalog
+
+    Args:
+        plan: Result of plan_file for the file
+        point_ids: IDs of all chunks of the file, in order
+        first_metadata: Metadata of the first chunk, for the catalog record
+        added: Number of chunks that were embedded and upserted
+        db: Vector database
+        manifest: File manifest
+
+    Returns:
+        Dictionary with the outcome "indexed" and the number of chunks added,
+        removed and in total
+    """
+    path = plan["path"]
+    entry = plan["entry"]
+    if entry:
+        current = set(point_ids)
+        stale_ids = [point_id for point_id in entry["point_ids"] if point_id not in current]
+        if stale_ids:
+            db.delete_points(stale_ids)
+        removed = len(stale_ids)
+    else:
+        # Also cleans up points written before IDs were deterministic
+        db.delete_document(path, keep_ids=point_ids)
+        removed = 0
+
+    content_hash = plan["content_hash"] or file_hash(path)
+    manifest.upsert(path, plan["size"], plan["mtime"], content_hash, point_ids, PIPELINE_VERSION)
+
+    db.upsert_document_record(
+        path,
+        title=first_metadata.get("title") or os.path.basename(path),
+        file_type=first_metadata.get("file_type", ""),
+        chunk_count=len(point_ids),
+        size=plan["size"],
+        point_ids=point_ids
+    )
+    logger.info("Indexed %s: %d new chunks, %d removed, %d total", path, added, removed, len(point_ids))
+    return {"status": "indexed", "added": added, "removed": removed, "chunks": len(point_ids)}
+
+
+def reset_stale_manifest(db: QdrantDB, manifest: FileManifest) -> None:
+    """Forget all files if the collection was reset (e.g. qdrant_data deleted) behind the manifest's back"""
+    if db.count() == 0 and manifest.paths():
+        logger.info("Vector collection is empty, resetting the file manifest")
+        manifest.clear()
+
+
+def remove_file(file_path: str, db: QdrantDB, manifest: Optional[FileManifest] = None) -> None:
+    """
+    Delete all chunks of a file from the index
+
+    Args:
+        file_path: Path to the deleted document
+        db: Vector database
+        manifest: File manifest, defaults to the shared instance
+    """
+    manifest = manifest or FileManifest()
+    path = os.path.abspath(file_path)
+    entry = manifest.get(path)
+
+    if entry:
+        db.delete_points(entry["point_ids"])
+    else:
+        db.delete_document(path)
+    db.delete_document_record(path)
+    manifest.remove(path)
+    logger.info("Removed %s from the index", path)
+
+
+def remove_path(path: str, db: QdrantDB, manifest: Optional[FileManifest] = None) -> None:
+    """
+    Delete a removed file, or every indexed file below a removed directory
+
+    Args:
+        path: Path of the deleted file or directory
+        db: Vector database
+        manifest: File manifest, defaults to the shared instance
+    """
+    manifest = manifest or FileManifest()
+    path = os.path.abspath(path)
+
+    if manifest.get(path):
+        if not os.path.exists(path):
+            remove_file(path, db, manifest)
+        return
+
+    for indexed_path in manifest.paths_under(path):
+        if not os.path.exists(indexed_path):
+            remove_file(indexed_path, db, manifest)
+
+
+def iter_documents(directory: str):
+    """Yield the paths of all supported documents below a directory"""
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                yield os.path.join(root, name)
@@ -0,0 +1,355 @@
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (
+    INGEST_QUEUE_SIZE,
+    INGEST_EXTRACT_WORKERS,
+    INGEST_INDEX_WORKERS,
+    INGEST_JOB_HISTORY
+)
+from database.qdrant_client import QdrantDB
+from embeddings.provider import get_provider
+from file_processing.document_processor import iter_document
+from ingestion.indexer import ChunkStream, apply_chunks, iter_documents, plan_file, remove_path, reset_stale_manifest
+from ingestion.manifest import FileManifest
+from ingestion.watcher import DocumentWatcher
+
+logger = logging.getLogger(__name__)
+
+# Job kinds
+INDEX = "index"
+REMOVE = "remove"
+
+# Job stages
+QUEUED = "queued"
+EXTRACTING = "extracting"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted without blocking and the queue is full"""
+
+
+@dataclass
+class IngestionJob:
+    """State of a single ingestion job, as reported by the jobs API"""
+    path: str
+    kind: str = INDEX
+    origin: str = "api"
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    stage: str = QUEUED
+    progress: Dict[str, int] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    plan: Optional[Dict[str, Any]] = field(default=None, repr=False)
+    _stage_started: float = field(default_factory=time.perf_counter, repr=False)
+
+    def set_stage(self, stage: str) -> None:
+        """Move to a new stage, adding the time spent in the previous one"""
+        now = time.perf_counter()
+        self.timings[self.stage] = self.timings.get(self.stage, 0.0) + now - self._stage_started
+        self._stage_started = now
+        self.stage = stage
+
+    @property
+    def finished(self) -> bool:
+        return self.stage in (DONE, FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "path": self.path,
+            "filename": os.path.basename(self.path),
+            "kind": self.kind,
+            "origin": self.origin,
+            "stage": self.stage,
+            "progress": dict(self.progress),
+            "timings": {stage: round(seconds, 4) for stage, seconds in self.timings.items()},
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestionQueue:
+    """
+    Bounded ingestion pipeline shared by uploads and the file watcher.
+
+    Jobs first go through extraction workers, which spread the CPU-bound
+    PDF page extraction over a process pool, and then through indexing
+    workers, which do the I/O-bound embedding and upserting. Chunks are
+    streamed from one stage to the next while the file is still being
+    extracted. Both stages are connected by bounded queues, so a slow stage
+    pushes back on the one before it and ultimately on callers of submit().
+    """
+    # Singleton instance
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(IngestionQueue, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        """Create the queues and start the worker pools"""
+        # Only initialize once
+        if self._initialized:
+            return
+
+        self.db = QdrantDB()
+        self.provider = get_provider()
+        self.manifest = FileManifest()
+
+        extract_workers = INGEST_EXTRACT_WORKERS or os.cpu_count() or 1
+        self._extract_queue: "queue.Queue[IngestionJob]" = queue.Queue(maxsize=INGEST_QUEUE_SIZE)
+        self._index_queue: "queue.Queue[Tuple[IngestionJob, Optional[ChunkStream]]]" = queue.Queue(maxsize=max(1, INGEST_INDEX_WORKERS * 2))
+        self._process_pool = ProcessPoolExecutor(max_workers=extract_workers)
+
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._queued_by_path: Dict[str, IngestionJob] = {}
+        self._path_locks: Dict[str, threading.Lock] = {}
+
+        self._threads = []
+        for i in range(extract_workers):
+            self._start_thread(self._extract_loop, f"ingest-extract-{i}")
+        for i in range(INGEST_INDEX_WORKERS):
+            self._start_thread(self._index_loop, f"ingest-index-{i}")
+        self._initialized = True
+
+    def _start_thread(self, target, name: str) -> None:
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def submit(self, path: str, kind: str = INDEX, origin: str = "api", block: bool = False) -> IngestionJob:
+        """
+        Queue a file for indexing or removal
+
+        Args:
+            path: Path of the document
+            kind: "index" or "remove"
+            origin: Who submitted the job, e.g. "upload" or "watcher"
+            block: Wait for room in the queue instead of raising QueueFullError
+
+        Returns:
+            The new job, or the job already waiting for the same path and kind
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            pending = self._queued_by_path.get(path)
+            if pending is not None and pending.kind == kind:
+                # Coalesce with the job that has not started yet
+                return pending
+
+            job = IngestionJob(path=path, kind=kind, origin=origin)
+            if not block:
+                try:
+                    self._extract_queue.put_nowait(job)
+                except queue.Full:
+                    raise QueueFullError(f"Ingestion queue is full ({INGEST_QUEUE_SIZE} jobs)")
+                self._register(job)
+                return job
+            self._register(job)
+
+        # Block outside the lock so workers can make progress
+        self._extract_queue.put(job)
+        return job
+
+    def enqueue_directory(self, directory: str, origin: str = "startup") -> int:
+        """
+        Queue every document below a directory, plus removals for indexed
+        files that no longer exist. Blocks while the queue is full.
+
+        Returns:
+            Number of jobs submitted
+        """
+        reset_stale_manifest(self.db, self.manifest)
+
+        submitted = 0
+        for path in iter_documents(directory):
+            self.submit(path, origin=origin, block=True)
+            submitted += 1
+        for path in self.manifest.paths_under(os.path.abspath(directory)):
+            if not os.path.exists(path):
+                self.submit(path, kind=REMOVE, origin=origin, block=True)
+                submitted += 1
+        return submitted
+
+    def _register(self, job: IngestionJob) -> None:
+        self._jobs[job.id] = job
+        self._queued_by_path[job.path] = job
+        # Forget the oldest finished jobs
+        while len(self._jobs) > INGEST_JOB_HISTORY:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if not oldest.finished:
+                break
+            del self._jobs[oldest_id]
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        """Return a job by ID"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, limit: int = 100) -> List[IngestionJob]:
+        """Return the most recent jobs, newest first"""
+        with self._lock:
+            return list(reversed(self._jobs.values()))[:limit]
+
+    def stats(self) -> Dict[str, int]:
+        """Return queue depths and job counts per stage"""
+        with self._lock:
+            stages: Dict[str, int] = {}
+            for job in self._jobs.values():
+                stages[job.stage] = stages.get(job.stage, 0) + 1
+        return {
+            "extract_queue": self._extract_queue.qsize(),
+            "index_queue": self._index_queue.qsize(),
+            **stages,
+        }
+
+    def _path_lock(self, path: str) -> threading.Lock:
+        with self._lock:
+            return self._path_locks.setdefault(path, threading.Lock())
+
+    def _start(self, job: IngestionJob) -> None:
+        with self._lock:
+            if self._queued_by_path.get(job.path) is job:
+                del self._queued_by_path[job.path]
+        job.started_at = time.time()
+
+    def _finish(self, job: IngestionJob, error: Optional[Exception] = None) -> None:
+        if error is not None:
+            job.error = str(error)
+            job.set_stage(FAILED)
+            logger.error("Ingestion of %s failed: %s", job.path, error)
+        else:
+            job.set_stage(DONE)
+        job.finished_at = time.time()
+        job.timings["total"] = job.finished_at - job.created_at
+
+    def _extract_loop(self) -> None:
+        """Stage 1: decide what to do and parse the document in the process pool"""
+        while True:
+            job = self._extract_queue.get()
+            self._start(job)
+            try:
+                if job.kind == REMOVE:
+                    self._index_queue.put((job, None))
+                    continue
+
+                job.set_stage(EXTRACTING)
+                if not os.path.exists(job.path):
+                    job.result = {"status": "missing"}
+                    self._finish(job)
+                    continue
+
+                plan = plan_file(job.path, self.manifest)
+                if plan["status"] == "unchanged":
+                    job.result = {"status": "unchanged", "chunks": len(plan["entry"]["point_ids"])}
+                    self._finish(job)
+                    continue
+
+                job.plan = plan
+                stream = ChunkStream()
+                # Blocks while the indexing workers are busy
+                self._index_queue.put((job, stream))
+                self._extract_into(job, stream)
+            except Exception as e:
+                self._finish(job, e)
+            finally:
+                self._extract_queue.task_done()
+
+    def _extract_into(self, job: IngestionJob, stream: ChunkStream) -> None:
+        """Feed the chunks of a document to the indexing worker as they are extracted"""
+        job.progress["chunks_extracted"] = 0
+        try:
+            for chunk in iter_document(job.path, self._process_pool):
+                if not stream.put(chunk):
+                    # Indexing gave up on this job
+                    return
+                job.progress["chunks_extracted"] += 1
+        except Exception as e:
+            stream.close(e)
+        else:
+            stream.close()
+
+    def _index_loop(self) -> None:
+        """Stage 2: embed and upsert new chunks, delete stale ones"""
+        while True:
+            job, stream = self._index_queue.get()
+
+            def progress(stage: str, done: int, total: int) -> None:
+                if stage != job.stage:
+                    job.set_stage(stage)
+                job.progress["chunks_done"] = done
+                job.progress["chunks_total"] = total
+
+            try:
+                with self._path_lock(job.path):
+                    if job.kind == REMOVE:
+                        job.set_stage("removing")
+                        remove_path(job.path, self.db, self.manifest)
+                        job.result = {"status": "removed"}
+                    else:
+                        # Another job may have indexed this file since it was planned
+                        job.plan["entry"] = self.manifest.get(job.path)
+                        job.result = apply_chunks(
+                            job.plan, stream, self.db, self.provider, self.manifest, progress
+                        )
+                        if job.result["status"] == "failed":
+                            raise RuntimeError("Failed to generate embeddings")
+                self._finish(job)
+            except Exception as e:
+                self._finish(job, e)
+            finally:
+                if stream is not None:
+                    stream.cancel()
+                job.plan = None
+                self._index_queue.task_done()
+
+
+def watch_directory(ingestion_queue: IngestionQueue, directory: str) -> DocumentWatcher:
+    """
+    Index a directory tree and keep the index up to date with it
+
+    Args:
+        ingestion_queue: Queue that indexes and removes the documents
+        directory: Root of the document tree
+
+    Returns:
+        The started watcher
+    """
+    logger.info("Starting file watcher for directory: %s", directory)
+
+    # Changes are handed to the ingestion queue, which also serves uploads
+    watcher = DocumentWatcher(
+        directory,
+        on_change=lambda path: ingestion_queue.submit(path, origin="watcher", block=True),
+        on_delete=lambda path: ingestion_queue.submit(path, kind=REMOVE, origin="watcher", block=True)
+    )
+    watcher.start()
+
+    # Catch up on files changed while nothing was watching, without delaying startup
+    threading.Thread(
+        target=ingestion_queue.enqueue_directory,
+        args=(directory,),
+        daemon=True
+    ).start()
+    return watcher
@@ -0,0 +1,100 @@
+import os
+import time
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+
+class ProcessLock:
+    """
+    Exclusive lock on a file, shared by processes on the same machine.
+
+    The operating system releases the lock when its holder exits or
+    crashes, so a waiting process takes over without any cleanup. The
+    holder's PID is written to the file for diagnostics.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Lock file; created if it does not exist
+        """
+        self.path = os.path.abspath(path)
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def acquire(self) -> bool:
+        """
+        Try to take the lock without waiting
+
+        Returns:
+            True if the lock is now held by this process
+        """
+        if self._file is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        file = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            file.close()
+            return False
+
+        file.seek(0)
+        file.truncate()
+        file.write(f"{os.getpid()}\n")
+        file.flush()
+        self._file = file
+        return True
+
+    def wait(self, poll_seconds: float, timeout: Optional[float] = None) -> bool:
+        """
+        Take the lock, waiting for the current holder to release it
+
+        Args:
+            poll_seconds: Interval between attempts
+            timeout: Give up after this many seconds; None waits forever
+
+        Returns:
+            True if the lock is now held by this process
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.acquire():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(poll_seconds)
+        return True
+
+    def holder(self) -> Optional[int]:
+        """PID written by the current or last holder, if any"""
+        try:
+            with open(self.path) as file:
+                return int(file.read().strip() or 0) or None
+        except (OSError, ValueError):
+            return None
+
+    def release(self) -> None:
+        """Release the lock if this process holds it"""
+        if self._file is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from config import MANIFEST_PATH
+
+
+def file_hash(file_path: str) -> str:
+    """Compute the sha256 of a file's content without loading it all into memory"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FileManifest:
+    """
+    Persistent record of every indexed file: its size, mtime, content hash
+    and the IDs of the points it produced in the vector database
+    """
+    # Singleton instance
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(FileManifest, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        """Open (or create) the manifest database"""
+        # Only initialize once
+        if self._initialized:
+            return
+
+        os.makedirs(os.path.dirname(os.path.abspath(MANIFEST_PATH)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(MANIFEST_PATH, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                content_hash TEXT NOT NULL,
+                point_ids TEXT NOT NULL,
+                indexed_at REAL NOT NULL,
+                pipeline TEXT NOT NULL DEFAULT ''
+            )"""
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(files)")]
+        if "pipeline" not in columns:
+            # Manifests written before chunking was versioned
+            self._conn.execute("ALTER TABLE files ADD COLUMN pipeline TEXT NOT NULL DEFAULT ''")
+        self._conn.commit()
+        self._initialized = True
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        """Return the manifest entry for a file, or None if it was never indexed"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, size, mtime, content_hash, point_ids, indexed_at, pipeline FROM files WHERE path = ?",
+                (path,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "path": row[0],
+            "size": row[1],
+            "mtime": row[2],
+            "content_hash": row[3],
+            "point_ids": json.loads(row[4]),
+            "indexed_at": row[5],
+            "pipeline": row[6],
+        }
+
+    def upsert(
+        self,
+        path: str,
+        size: int,
+        mtime: float,
+        content_hash: str,
+        point_ids: List[str],
+        pipeline: str = ""
+    ) -> None:
+        """Record the indexed state of a file and the extraction pipeline that produced it"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime, content_hash, point_ids, indexed_at, pipeline) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, size, mtime, content_hash, json.dumps(point_ids), time.time(), pipeline)
+            )
+            self._conn.commit()
+
+    def remove(self, path: str) -> None:
+        """Forget a file"""
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+            self._conn.commit()
+
+    def paths(self) -> List[str]:
+        """Return the paths of all indexed files"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT path FROM files")]
+
+    def paths_under(self, directory: str) -> List[str]:
+        """Return the paths of indexed files below a directory"""
+        prefix = directory.rstrip(os.sep) + os.sep
+        with self._lock:
+            return [
+                row[0] for row in self._conn.execute(
+                    "SELECT path FROM files WHERE path >= ? AND path < ?",
+                    (prefix, prefix + "\U0010ffff")
+                )
+            ]
+
+    def clear(self) -> None:
+        """Forget every file, e.g. after the vector collection was reset"""
+        with self._lock:
+            self._conn.execute("DELETE FROM files")
+            self._conn.commit()
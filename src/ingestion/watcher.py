@@ -0,0 +1,237 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from config import WATCHER_DEBOUNCE_SECONDS, WATCHER_POLL_INTERVAL, WATCHER_FORCE_POLLING
+from ingestion.indexer import SUPPORTED_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    from watchdog.observers.polling import PollingObserver
+except ImportError:
+    # Without watchdog the stat-based scanner is used
+    FileSystemEventHandler = object
+    Observer = None
+    PollingObserver = None
+
+# Files written by editors and browsers while saving or downloading
+IGNORED_PREFIXES = ('.', '~$')
+IGNORED_SUFFIXES = ('.tmp', '.swp', '.part', '.crdownload')
+
+CHANGE = "change"
+DELETE = "delete"
+
+
+def is_watched_file(path: str) -> bool:
+    """Return True for supported documents that are not temporary files"""
+    name = os.path.basename(path)
+    if name.startswith(IGNORED_PREFIXES) or name.lower().endswith(IGNORED_SUFFIXES):
+        return False
+    return os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+class _EventHandler(FileSystemEventHandler):
+    """Forwards watchdog events to the watcher's pending set"""
+
+    def __init__(self, watcher: "DocumentWatcher"):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_created(self, event):
+        self.watcher.record(event.src_path, CHANGE, event.is_directory)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.record(event.src_path, CHANGE)
+
+    def on_closed(self, event):
+        self.watcher.record(event.src_path, CHANGE)
+
+    def on_deleted(self, event):
+        self.watcher.record(event.src_path, DELETE, event.is_directory)
+
+    def on_moved(self, event):
+        self.watcher.record(event.src_path, DELETE, event.is_directory)
+        self.watcher.record(event.dest_path, CHANGE, event.is_directory)
+
+
+class DocumentWatcher:
+    """
+    Recursive watcher for a document tree.
+
+    File system events are coalesced per path and only delivered once a
+    path has been quiet for the debounce interval and its size and mtime
+    have stopped changing, so partial writes and editor save storms result
+    in a single callback. Native OS events (inotify, FSEvents,
+    ReadDirectoryChangesW, kqueue) are used when available; otherwise a
+    stat-based scanner compares snapshots of the tree at a fixed interval.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        on_change: Callable[[str], None],
+        on_delete: Callable[[str], None],
+        debounce_seconds: float = WATCHER_DEBOUNCE_SECONDS,
+        poll_interval: float = WATCHER_POLL_INTERVAL,
+        force_polling: bool = WATCHER_FORCE_POLLING
+    ):
+        """
+        Args:
+            directory: Root of the tree to watch
+            on_change: Called with the path of a created or modified document
+            on_delete: Called with the path of a deleted file or directory
+            debounce_seconds: Quiet period required before a change is delivered
+            poll_interval: Seconds between scans when native events are unavailable
+            force_polling: Use the stat-based scanner even if native events work
+        """
+        self.directory = os.path.abspath(directory)
+        self.on_change = on_change
+        self.on_delete = on_delete
+        self.debounce_seconds = debounce_seconds
+        self.poll_interval = poll_interval
+        self.force_polling = force_polling
+
+        # path -> (kind, time of last event, signature seen at the last check)
+        self._pending: Dict[str, Tuple[str, float, Optional[Tuple[int, int]]]] = {}
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._observer = None
+        self._threads = []
+        self.mode = None
+
+    def record(self, path: str, kind: str, is_directory: bool = False) -> None:
+        """Queue a path for delivery, replacing any earlier event for it"""
+        if not is_directory and not is_watched_file(path):
+            return
+        with self._condition:
+            self._pending[path] = (kind, time.monotonic(), None)
+            self._condition.notify()
+
+    def start(self) -> None:
+        """Start watching in background threads"""
+        if not self.force_polling and Observer is not None and Observer is not PollingObserver:
+            try:
+                observer = Observer()
+                observer.schedule(_EventHandler(self), self.directory, recursive=True)
+                observer.daemon = True
+                observer.start()
+                self._observer = observer
+                self.mode = "native"
+            except OSError as e:
+                # E.g. the inotify watch limit was reached
+                logger.warning("Native file events unavailable (%s), falling back to polling", e)
+                self._observer = None
+
+        if self._observer is None:
+            self.mode = "polling"
+            scanner = threading.Thread(target=self._scan_loop, name="document-scanner", daemon=True)
+            scanner.start()
+            self._threads.append(scanner)
+
+        dispatcher = threading.Thread(target=self._dispatch_loop, name="document-watcher", daemon=True)
+        dispatcher.start()
+        self._threads.append(dispatcher)
+        logger.info("Watching %s recursively (%s mode)", self.directory, self.mode)
+
+    def stop(self) -> None:
+        """Stop watching and wait for the background threads to exit"""
+        self._stopped.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        for thread in self._threads:
+            thread.join()
+
+    def _dispatch_loop(self) -> None:
+        """Deliver pending paths once they have settled"""
+        while not self._stopped.is_set():
+            due = []
+            with self._condition:
+                now = time.monotonic()
+                next_deadline = None
+                for path, (kind, last_event, signature) in list(self._pending.items()):
+                    deadline = last_event + self.debounce_seconds
+                    if deadline <= now:
+                        due.append((path, kind, signature))
+                        del self._pending[path]
+                    elif next_deadline is None or deadline < next_deadline:
+                        next_deadline = deadline
+
+                if not due:
+                    timeout = None if next_deadline is None else next_deadline - now
+                    self._condition.wait(timeout)
+                    continue
+
+            for path, kind, signature in due:
+                self._deliver(path, kind, signature)
+
+    def _deliver(self, path: str, kind: str, signature: Optional[Tuple[int, int]]) -> None:
+        try:
+            if kind == DELETE or not os.path.exists(path):
+                self.on_delete(path)
+            elif os.path.isdir(path):
+                # A directory was created or moved in: its files produce no events of their own
+                for root, _, files in os.walk(path):
+                    for name in files:
+                        self.record(os.path.join(root, name), CHANGE)
+            else:
+                current = _file_signature(path)
+                if current != signature:
+                    # Still being written: check again after another quiet period
+                    with self._condition:
+                        if path not in self._pending:
+                            self._pending[path] = (CHANGE, time.monotonic(), current)
+                            self._condition.notify()
+                    return
+                self.on_change(path)
+        except Exception as e:
+            logger.error("Error handling %s of %s: %s", kind, path, e)
+
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        """Collect size and mtime of every watched file in the tree"""
+        snapshot = {}
+        stack = [self.directory]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif is_watched_file(entry.name):
+                                stat = entry.stat()
+                                snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return snapshot
+
+    def _scan_loop(self) -> None:
+        """Fallback for platforms without native events: diff periodic snapshots"""
+        previous = self._snapshot()
+        while not self._stopped.wait(self.poll_interval):
+            current = self._snapshot()
+            for path, signature in current.items():
+                if previous.get(path) != signature:
+                    self.record(path, CHANGE)
+            for path in previous.keys() - current.keys():
+                self.record(path, DELETE)
+            previous = current
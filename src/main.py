@@ -1,26 +1,24 @@
+import logging
 import os
 import sys
-import time
-import threading
 import uvicorn
-from pathlib import Path
 
 # Add the project root to Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 from api.endpoints import router as api_router
 from database.qdrant_client import QdrantDB
-from embeddings.azure_openai import AzureOpenAIClient
-from file_processing.document_processor import process_document
-from config import API_HOST, API_PORT
+from ingestion.jobs import IngestionQueue, watch_directory
+from monitoring.metrics import render as render_metrics
+from config import API_HOST, API_PORT, API_WORKERS, INGESTION_MODE, LOG_LEVEL, QDRANT_URL, WATCH_DIRECTORY
 
-# Override WATCH_DIRECTORY to use a local folder instead of from config
-WATCH_DIRECTORY = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Documents'))
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
 
 # Initialize FastAPI app
 app = FastAPI(title="TalkToFiles")
@@ -44,88 +42,51 @@ async def home_page(request: Request):
     })
 
 
-# Process existing files in the directory
-def process_existing_files(db: QdrantDB, openai_client: AzureOpenAIClient):
-    print(f"Processing existing files in {WATCH_DIRECTORY}")
-    for file in Path(WATCH_DIRECTORY).glob("*.*"):
-        if file.suffix.lower() in ['.pdf', '.txt']:
-            print(f"Found existing file: {file}")
-            process_file(str(file), db, openai_client)
-
-
-def process_file(file_path: str, db: QdrantDB, openai_client: AzureOpenAIClient):
-    """Process a file and add it to the database"""
-    print(f"Processing new file: {file_path}")
-    
-    # Process the document
-    document_chunks = process_document(file_path)
-    
-    if document_chunks:
-        # Extract texts and metadata
-        texts = [chunk[0] for chunk in document_chunks]
-        metadatas = [chunk[1] for chunk in document_chunks]
-        
-        # Generate embeddings
-        embeddings = openai_client.get_embeddings(texts)
-        
-        if embeddings:
-            # Add texts to database
-            db.add_texts(texts, embeddings, metadatas)
-            print(f"Added {len(texts)} chunks from {file_path} to the database")
-        else:
-            print(f"Failed to generate embeddings for {file_path}")
-    else:
-        print(f"No text chunks extracted from {file_path}")
-
-
-# Start file watcher
-def start_file_watcher(db: QdrantDB, openai_client: AzureOpenAIClient):
-    print(f"Starting file watcher for directory: {WATCH_DIRECTORY}")
-    
-    # Create a set of already processed files
-    processed_files = set()
-    
-    # Process existing files and add them to processed_files set
-    print(f"Processing existing files in {WATCH_DIRECTORY}")
-    for file in Path(WATCH_DIRECTORY).glob("*.*"):
-        if file.suffix.lower() in ['.pdf', '.txt']:
-            file_path = str(file)
-            print(f"Found existing file: {file}")
-            process_file(file_path, db, openai_client)
-            processed_files.add(file_path)
-    
-    def watch_directory():
-        while True:
-            for file in Path(WATCH_DIRECTORY).glob("*.*"):
-                if file.suffix.lower() in ['.pdf', '.txt'] and str(file) not in processed_files:
-                    print(f"Detected new file: {file}")
-                    process_file(str(file), db, openai_client)
-                    processed_files.add(str(file))
-            time.sleep(1)
-    
-    watcher_thread = threading.Thread(target=watch_directory, daemon=True)
-    watcher_thread.start()
-    return watcher_thread
+# Prometheus scrape endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
     # Ensure the watch directory exists
     os.makedirs(WATCH_DIRECTORY, exist_ok=True)
     
-    # Initialize clients
-    db = QdrantDB()
-    openai_client = AzureOpenAIClient()
+    workers = API_WORKERS
+    if workers > 1 and not QDRANT_URL:
+        logger.warning(
+            "API_WORKERS=%d needs a Qdrant server (QDRANT_URL); the embedded Qdrant "
+            "can only be opened by one process, so a single worker is started", workers
+        )
+        workers = 1
     
-    # Start file watcher in a separate thread
-    watcher_thread = start_file_watcher(db, openai_client)
+    # Create or migrate the collections once, before any worker connects
+    QdrantDB()
+    
+    if INGESTION_MODE == "daemon":
+        # The API only reads; ingestd watches and indexes
+        logger.info("Ingestion runs in the ingestion daemon (INGESTION_MODE=daemon)")
+    else:
+        # Initialize the ingestion pipeline and start the file watcher in background threads
+        watch_directory(IngestionQueue(), os.path.abspath(WATCH_DIRECTORY))
     
     try:
-        # Start the API server
-        uvicorn.run(app, host=API_HOST, port=API_PORT)
+        # Start the API server. Worker processes import the app by name; this
+        # process keeps watching and indexing while they serve requests.
+        if workers > 1:
+            if INGESTION_MODE != "daemon":
+                # Each worker would otherwise start its own ingestion queue, indexing
+                # uploads alongside this process's watcher and keeping job IDs that
+                # other workers do not know. Workers inherit the environment, so they
+                # only save uploads to WATCH_DIRECTORY, like with the ingestion daemon.
+                os.environ["INGESTION_MODE"] = "watcher"
+            uvicorn.run("main:app", host=API_HOST, port=API_PORT, workers=workers)
+        else:
+            uvicorn.run(app, host=API_HOST, port=API_PORT)
     except KeyboardInterrupt:
-        print("Shutting down file watcher and server...")
+        logger.info("Shutting down file watcher and server...")
         # Adding a cleaner way to exit the program
         sys.exit(0)
     except Exception as e:
-        print(f"Error: {e}")
+        logger.error("Error: %s", e)
         sys.exit(1)
\ No newline at end of file
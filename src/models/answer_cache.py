@@ -0,0 +1,217 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from config import (
+    VECTOR_SIZE,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_SIMILARITY,
+    ANSWER_CACHE_TTL_SECONDS
+)
+from database.qdrant_client import QdrantDB
+from monitoring.metrics import CACHE_REQUESTS
+
+
+@dataclass
+class CachedAnswer:
+    """An answer together with what it was generated from"""
+    query: str
+    answer: str
+    source_documents: List[Dict[str, Any]]
+    point_ids: List[str]
+    # Catalog ingest time of every source document when the answer was cached
+    document_versions: Dict[str, Optional[str]]
+    # Retrieval options the answer was produced with, e.g. top_k and search mode
+    scope: str
+    created_at: float
+
+
+class SemanticAnswerCache:
+    """
+    In-memory cache of answers keyed by query embedding.
+
+    A query is a hit when a cached query with the same scope has a cosine
+    similarity of at least the configured threshold. Entries expire after a
+    TTL, the least recently used ones are evicted beyond the size limit, and
+    an entry is dropped as soon as one of its source documents has been
+    re-ingested or deleted, which is checked against the document catalog.
+    """
+    # Singleton instance
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SemanticAnswerCache, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        """Allocate the vector matrix for the configured number of entries"""
+        # Only initialize once
+        if self._initialized:
+            return
+
+        self.db = QdrantDB()
+        self.threshold = ANSWER_CACHE_SIMILARITY
+        self.ttl = ANSWER_CACHE_TTL_SECONDS
+        self.max_entries = ANSWER_CACHE_MAX_ENTRIES
+
+        self._lock = threading.Lock()
+        # Row i of the matrix holds the normalized query vector of slot i
+        self._vectors = np.zeros((self.max_entries, VECTOR_SIZE), dtype=np.float32)
+        self._occupied = np.zeros(self.max_entries, dtype=bool)
+        # slot -> entry, least recently used first
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._free = list(range(self.max_entries - 1, -1, -1))
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._initialized = True
+
+    def get(self, query_vector: List[float], scope: str) -> Optional[Dict[str, Any]]:
+        """
+        Find a cached answer for a semantically equivalent query
+
+        Args:
+            query_vector: Embedding of the query
+            scope: Retrieval options of the request, e.g. top_k and search mode
+
+        Returns:
+            Dictionary with the cached answer, its source documents, the
+            similarity to the cached query and the cached query itself, or None
+        """
+        vector = _normalize(query_vector)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            slot, similarity = self._best_match(vector, scope)
+            entry = self._entries.get(slot) if slot is not None else None
+
+        if entry is None or not self._is_current(entry):
+            with self._lock:
+                if entry is not None and self._entries.get(slot) is entry:
+                    self._remove(slot)
+                    self.invalidations += 1
+                self.misses += 1
+            CACHE_REQUESTS.inc(cache="answer", result="miss")
+            return None
+
+        with self._lock:
+            if self._entries.get(slot) is entry:
+                self._entries.move_to_end(slot)
+            self.hits += 1
+        CACHE_REQUESTS.inc(cache="answer", result="hit")
+        return {
+            "answer": entry.answer,
+            "source_documents": entry.source_documents,
+            "similarity": similarity,
+            "cached_query": entry.query,
+        }
+
+    def put(
+        self,
+        query: str,
+        query_vector: List[float],
+        scope: str,
+        answer: str,
+        search_results: List[Dict[str, Any]],
+        source_documents: List[Dict[str, Any]]
+    ) -> None:
+        """
+        Cache an answer
+
+        Args:
+            query: Question that was answered
+            query_vector: Embedding of the question
+            scope: Retrieval options of the request
+            answer: Generated answer
+            search_results: Chunks the answer was generated from, as returned by search
+            source_documents: The formatted sources returned to the client
+        """
+        sources = sorted({doc["metadata"].get("source") for doc in search_results if doc["metadata"].get("source")})
+        records = self.db.get_document_records(sources) if sources else {}
+        entry = CachedAnswer(
+            query=query,
+            answer=answer,
+            source_documents=source_documents,
+            point_ids=[doc["id"] for doc in search_results if doc.get("id")],
+            document_versions={source: records.get(source, {}).get("ingested_at") for source in sources},
+            scope=scope,
+            created_at=time.time()
+        )
+
+        vector = _normalize(query_vector)
+        with self._lock:
+            slot, similarity = self._best_match(vector, scope)
+            if slot is not None:
+                # Replace the near-duplicate rather than storing both
+                self._remove(slot)
+            if not self._free:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+            slot = self._free.pop()
+            self._vectors[slot] = vector
+            self._occupied[slot] = True
+            self._entries[slot] = entry
+
+    def clear(self) -> None:
+        """Drop every cached answer"""
+        with self._lock:
+            for slot in list(self._entries):
+                self._remove(slot)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of entries and hit, miss and invalidation counters"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+    def _best_match(self, vector: np.ndarray, scope: str):
+        """Return the slot and similarity of the closest cached query above the threshold"""
+        if not self._entries:
+            return None, 0.0
+        scores = self._vectors @ vector
+        scores[~self._occupied] = -1.0
+        for slot in np.argsort(-scores):
+            similarity = float(scores[slot])
+            if similarity < self.threshold:
+                break
+            if self._entries[int(slot)].scope == scope:
+                return int(slot), similarity
+        return None, 0.0
+
+    def _is_current(self, entry: CachedAnswer) -> bool:
+        """Check that no source document was re-ingested or deleted since the entry was cached"""
+        if not entry.document_versions:
+            return True
+        records = self.db.get_document_records(list(entry.document_versions))
+        return all(
+            source in records and records[source].get("ingested_at") == version
+            for source, version in entry.document_versions.items()
+        )
+
+    def _expire(self, now: float) -> None:
+        # Entries are in LRU order, not creation order, so check them all
+        for slot, entry in list(self._entries.items()):
+            if now - entry.created_at > self.ttl:
+                self._remove(slot)
+
+    def _remove(self, slot: int) -> None:
+        del self._entries[slot]
+        self._occupied[slot] = False
+        self._free.append(slot)
+
+
+def _normalize(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm > 0 else array
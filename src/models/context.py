@@ -0,0 +1,245 @@
+import logging
+import math
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import CONTEXT_TOKEN_BUDGET, CONTEXT_MMR_LAMBDA, CONTEXT_DUPLICATE_SIMILARITY
+from embeddings.sparse import tokenize
+from embeddings.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PackedContext:
+    """Prompt context built from retrieved chunks, with what packing changed"""
+    text: str
+    tokens: int
+    # Tokens of the context with every retrieved chunk included verbatim
+    original_tokens: int
+    chunks_used: int
+    # Passages in the context; merged neighbours count once
+    passages: int
+    merged: int
+    dropped_redundant: int
+    dropped_over_budget: int
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.tokens
+
+
+class _Candidate:
+    __slots__ = ("doc", "rank", "relevance", "tokens", "weights", "norm")
+
+    def __init__(self, doc: Dict[str, Any], rank: int, relevance: float):
+        self.doc = doc
+        self.rank = rank
+        self.relevance = relevance
+        self.tokens = count_tokens(doc["text"])
+        self.weights: Dict[str, float] = {}
+        self.norm = 0.0
+
+
+class ContextBuilder:
+    """
+    Packs retrieved chunks into the prompt context.
+
+    Chunks are picked by maximal marginal relevance: each step takes the
+    chunk with the best trade-off between its search rank and its overlap
+    with the chunks already picked. Near-duplicates of a picked chunk are
+    dropped, chunks that no longer fit the token budget are skipped, and
+    neighbouring chunks of the same document are merged into one passage
+    without repeating their overlap.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = CONTEXT_TOKEN_BUDGET,
+        mmr_lambda: float = CONTEXT_MMR_LAMBDA,
+        duplicate_similarity: float = CONTEXT_DUPLICATE_SIMILARITY
+    ):
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_similarity = duplicate_similarity
+
+    def build(self, docs: List[Dict[str, Any]]) -> PackedContext:
+        """
+        Build the context for a query
+
+        Args:
+            docs: Search results, best first
+
+        Returns:
+            The packed context and packing statistics
+        """
+        original_tokens = count_tokens(format_passages([(_label(doc["metadata"]), doc["text"]) for doc in docs]))
+        if not docs:
+            return PackedContext("", 0, 0, 0, 0, 0, 0, 0)
+
+        candidates = [_Candidate(doc, rank, 1.0 - rank / len(docs)) for rank, doc in enumerate(docs)]
+        _weigh_terms(candidates)
+        selected, dropped_redundant, dropped_over_budget = self._select(candidates)
+        passages, merged = _merge_adjacent(selected)
+
+        text = format_passages(passages)
+        context = PackedContext(
+            text=text,
+            tokens=count_tokens(text),
+            original_tokens=original_tokens,
+            chunks_used=len(selected),
+            passages=len(passages),
+            merged=merged,
+            dropped_redundant=dropped_redundant,
+            dropped_over_budget=dropped_over_budget
+        )
+        logger.debug(
+            "Context: %d of %d chunks in %d passages (%d merged, %d redundant, %d over budget), %d tokens, %d saved",
+            context.chunks_used, len(docs), context.passages, merged, dropped_redundant, dropped_over_budget,
+            context.tokens, context.saved_tokens
+        )
+        return context
+
+    def _select(self, candidates: List[_Candidate]) -> Tuple[List[_Candidate], int, int]:
+        """Pick chunks by maximal marginal relevance within the token budget"""
+        selected: List[_Candidate] = []
+        remaining = list(candidates)
+        used = 0
+        dropped_redundant = 0
+        dropped_over_budget = 0
+
+        while remaining:
+            best, best_score, best_redundancy = None, -math.inf, 0.0
+            for candidate in remaining:
+                redundancy = max((_similarity(candidate, chosen) for chosen in selected), default=0.0)
+                score = self.mmr_lambda * candidate.relevance - (1 - self.mmr_lambda) * redundancy
+                if score > best_score:
+                    best, best_score, best_redundancy = candidate, score, redundancy
+            remaining.remove(best)
+
+            if best_redundancy >= self.duplicate_similarity:
+                dropped_redundant += 1
+                continue
+            cost = best.tokens + _header_tokens(best.doc)
+            if used + cost > self.token_budget:
+                if selected:
+                    dropped_over_budget += 1
+                    continue
+                # Always keep the best chunk, cut down to the budget
+                best.doc = {**best.doc, "text": _truncate(best.doc["text"], best.tokens, self.token_budget - _header_tokens(best.doc))}
+                cost = self.token_budget
+            selected.append(best)
+            used += cost
+
+        return selected, dropped_redundant, dropped_over_budget
+
+
+def format_passages(passages: List[Tuple[str, str]]) -> str:
+    """Format (source label, text) passages as numbered documents for the prompt"""
+    context_parts = []
+    for i, (label, text) in enumerate(passages):
+        context_parts.append(f"Document {i+1} [Source: {label}]:")
+        context_parts.append(text)
+        context_parts.append("")  # Empty line for separation
+    return "\n".join(context_parts)
+
+
+def _label(metadata: Dict[str, Any], page_end: Optional[int] = None) -> str:
+    source = metadata.get("source", "Unknown")
+    page = metadata.get("page")
+    if not page:
+        return source
+    # Chunks no longer carry a "Page N:" prefix, so cite the page here
+    page_end = page_end or metadata.get("page_end") or page
+    return f"{source}, page {page}" if page_end == page else f"{source}, pages {page}-{page_end}"
+
+
+def _header_tokens(doc: Dict[str, Any]) -> int:
+    return count_tokens(f"Document 10 [Source: {_label(doc['metadata'])}]:\n\n")
+
+
+def _weigh_terms(candidates: List[_Candidate]) -> None:
+    """
+    Term weights for redundancy checks: sublinear term frequency times IDF
+    over the candidates, so shared boilerplate counts for little and chunks
+    that only differ in a part number or a figure are not mistaken for
+    duplicates
+    """
+    counts = [Counter(tokenize(candidate.doc["text"])) for candidate in candidates]
+    frequency = Counter(term for terms in counts for term in terms)
+    total = len(candidates)
+    for candidate, terms in zip(candidates, counts):
+        candidate.weights = {
+            term: (1 + math.log(count)) * math.log(1 + (total - frequency[term] + 0.5) / (frequency[term] + 0.5))
+            for term, count in terms.items()
+        }
+        candidate.norm = math.sqrt(sum(weight * weight for weight in candidate.weights.values()))
+
+
+def _similarity(a: _Candidate, b: _Candidate) -> float:
+    if not a.norm or not b.norm:
+        return 0.0
+    if len(a.weights) > len(b.weights):
+        a, b = b, a
+    dot = sum(weight * b.weights.get(term, 0.0) for term, weight in a.weights.items())
+    return dot / (a.norm * b.norm)
+
+
+def _merge_adjacent(selected: List[_Candidate]) -> Tuple[List[Tuple[str, str]], int]:
+    """
+    Merge consecutive chunks of the same document into one passage. Passages
+    are ordered by the best search rank among their chunks.
+
+    Returns:
+        (source label, text) passages and the number of chunks merged into another
+    """
+    by_position = sorted(
+        selected,
+        key=lambda c: (c.doc["metadata"].get("source", ""), c.doc["metadata"].get("chunk_id", -1), c.rank)
+    )
+    groups: List[List[_Candidate]] = []
+    for candidate in by_position:
+        if groups and _adjacent(groups[-1][-1], candidate):
+            groups[-1].append(candidate)
+        else:
+            groups.append([candidate])
+
+    groups.sort(key=lambda group: min(candidate.rank for candidate in group))
+    passages = []
+    for group in groups:
+        text = group[0].doc["text"]
+        for candidate in group[1:]:
+            text = _join_overlapping(text, candidate.doc["text"])
+        last = group[-1].doc["metadata"]
+        passages.append((_label(group[0].doc["metadata"], last.get("page_end") or last.get("page")), text))
+    return passages, len(selected) - len(groups)
+
+
+def _adjacent(a: _Candidate, b: _Candidate) -> bool:
+    first, second = a.doc["metadata"], b.doc["metadata"]
+    if first.get("source") != second.get("source"):
+        return False
+    if first.get("chunk_id") is None or second.get("chunk_id") is None:
+        return False
+    return second["chunk_id"] == first["chunk_id"] + 1
+
+
+def _join_overlapping(first: str, second: str) -> str:
+    """Append second to first, leaving out the text the chunks overlap by"""
+    probe = second[:16]
+    start = first.find(probe)
+    while probe and start != -1:
+        overlap = len(first) - start
+        if second.startswith(first[start:]):
+            return first + second[overlap:]
+        start = first.find(probe, start + 1)
+    return f"{first}\n\n{second}"
+
+
+def _truncate(text: str, tokens: int, budget: int) -> str:
+    if tokens <= budget:
+        return text
+    cut = text[:max(0, len(text) * budget // tokens)]
+    # End on a word boundary
+    return cut.rsplit(" ", 1)[0] if " " in cut else cut
@@ -1,23 +1,94 @@
-from typing import List, Dict, Any
-from src.embeddings.azure_openai import AzureOpenAIClient
+import time
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+from embeddings.provider import get_provider
+from models.context import ContextBuilder
+from monitoring.metrics import record, span
 
 
 class DocumentQueryModel:
     def __init__(self):
         """Initialize the document query model"""
-        self.client = AzureOpenAIClient()
+        self.client = get_provider()
+        self.context_builder = ContextBuilder()
     
-    def query(self, query: str, relevant_docs: List[Dict[str, Any]]) -> str:
+    def query(
+        self,
+        query: str,
+        relevant_docs: List[Dict[str, Any]],
+        history: Optional[List[Tuple[str, str]]] = None
+    ) -> str:
         """
         Query the document model with the user query and relevant documents
         
         Args:
             query: User's question
             relevant_docs: List of relevant document chunks retrieved from search
+            history: Earlier (question, answer) pairs of a chat
             
         Returns:
             Generated response from the model
         """
+        system_prompt, user_prompt = self._build_prompts(query, relevant_docs, history)
+        
+        # Get completion from the model
+        with span("completion"):
+            response = self.client.get_completion(system_prompt, user_prompt)
+        return response
+    
+    async def aquery(
+        self,
+        query: str,
+        relevant_docs: List[Dict[str, Any]],
+        history: Optional[List[Tuple[str, str]]] = None
+    ) -> str:
+        """
+        Async version of query, awaiting the completion without blocking the event loop
+        
+        Args:
+            query: User's question
+            relevant_docs: List of relevant document chunks retrieved from search
+            history: Earlier (question, answer) pairs of a chat
+            
+        Returns:
+            Generated response from the model
+        """
+        system_prompt, user_prompt = self._build_prompts(query, relevant_docs, history)
+        with span("completion"):
+            return await self.client.aget_completion(system_prompt, user_prompt)
+    
+    async def astream(
+        self,
+        query: str,
+        relevant_docs: List[Dict[str, Any]],
+        history: Optional[List[Tuple[str, str]]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Streaming version of aquery
+        
+        Args:
+            query: User's question
+            relevant_docs: List of relevant document chunks retrieved from search
+            history: Earlier (question, answer) pairs of a chat
+            
+        Yields:
+            Pieces of the generated response as they arrive
+        """
+        system_prompt, user_prompt = self._build_prompts(query, relevant_docs, history)
+        started = time.perf_counter()
+        try:
+            async for token in self.client.astream_completion(system_prompt, user_prompt):
+                yield token
+        finally:
+            # Recorded when the stream ends, also if the client went away early
+            record("completion", time.perf_counter() - started)
+    
+    def _build_prompts(
+        self,
+        query: str,
+        relevant_docs: List[Dict[str, Any]],
+        history: Optional[List[Tuple[str, str]]] = None
+    ) -> Tuple[str, str]:
+        """Build the system and user prompts for a query"""
         # Construct system prompt
         system_prompt = """You are a helpful assistant that answers questions based on the provided document context.
         - Answer only based on the context provided
@@ -27,7 +98,8 @@ class DocumentQueryModel:
         """
         
         # Format the context from relevant documents
-        context = self._format_context(relevant_docs)
+        with span("context"):
+            context = self._format_context(relevant_docs)
         
         # Construct user prompt with query and context
         user_prompt = f"""Question: {query}
@@ -37,20 +109,17 @@ class DocumentQueryModel:
         
         Please answer the question based on the provided context:"""
         
-        # Get completion from the model
-        response = self.client.get_completion(system_prompt, user_prompt)
-        return response
+        if history:
+            # Earlier turns let the model resolve follow-ups such as "and what about section 3?"
+            system_prompt += "- Use the conversation so far to understand follow-up questions\n"
+            user_prompt = f"Conversation so far:\n{self._format_history(history)}\n\n{user_prompt}"
+        
+        return system_prompt, user_prompt
+    
+    def _format_history(self, history: List[Tuple[str, str]]) -> str:
+        """Format earlier (question, answer) pairs of a chat"""
+        return "\n".join(f"User: {question}\nAssistant: {answer}" for question, answer in history)
     
     def _format_context(self, relevant_docs: List[Dict[str, Any]]) -> str:
-        """Format the relevant documents into a text context for the model"""
-        context_parts = []
-        
-        for i, doc in enumerate(relevant_docs):
-            metadata = doc["metadata"]
-            source = metadata.get("source", "Unknown")
-            
-            context_parts.append(f"Document {i+1} [Source: {source}]:")
-            context_parts.append(doc["text"])
-            context_parts.append("")  # Empty line for separation
-            
-        return "\n".join(context_parts)
\ No newline at end of file
+        """Pack the relevant documents into a text context for the model within the token budget"""
+        return self.context_builder.build(relevant_docs).text
@@ -0,0 +1,85 @@
+import math
+from typing import Any, Dict, List
+
+import numpy as np
+
+from config import RERANK_LEXICAL_WEIGHT
+from embeddings.sparse import tokenize
+
+
+class LocalReranker:
+    """
+    Rescores over-fetched search candidates on the CPU.
+
+    The score mixes two features: the exact float32 cosine similarity
+    between the query and each chunk's stored vector, and lexical coverage.
+    Lexical coverage is the IDF-weighted share of query terms that occur in
+    the chunk, with IDF taken over the candidates, so rare terms such as
+    part numbers count most. The features are mixed unscaled: stretching
+    the small cosine differences between candidates to a common range would
+    let them drown out the lexical evidence.
+    """
+
+    def __init__(self, lexical_weight: float = RERANK_LEXICAL_WEIGHT):
+        self.lexical_weight = lexical_weight
+
+    def rerank(
+        self,
+        query: str,
+        query_vector: List[float],
+        results: List[Dict[str, Any]],
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Rerank search candidates
+
+        Args:
+            query: Query text
+            query_vector: Query embedding
+            results: Search results, fetched with their vectors
+            limit: Number of results to return
+
+        Returns:
+            The best results, best first, with the rerank score in "score"
+            and the exact cosine similarity in "similarity"
+        """
+        if not results:
+            return []
+        cosine = _cosine(query_vector, results)
+        coverage = _term_coverage(query, [result["text"] for result in results])
+        # Chunks without a vector only score on their terms
+        scores = (1 - self.lexical_weight) * np.nan_to_num(cosine, nan=0.0) + self.lexical_weight * coverage
+
+        reranked = []
+        for i in np.argsort(-scores, kind="stable")[:limit]:
+            result = dict(results[i])
+            if not math.isnan(cosine[i]):
+                result["similarity"] = float(cosine[i])
+            result["score"] = float(scores[i])
+            reranked.append(result)
+        return reranked
+
+
+def _cosine(query_vector: List[float], results: List[Dict[str, Any]]) -> np.ndarray:
+    """Exact cosine similarity of every result with a vector; NaN for results without one"""
+    query = np.asarray(query_vector, dtype=np.float32)
+    scores = np.full(len(results), np.nan, dtype=np.float32)
+    rows = [i for i, result in enumerate(results) if result.get("vector") is not None]
+    if rows:
+        matrix = np.array([results[i]["vector"] for i in rows], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        scores[rows] = matrix @ query / np.maximum(norms, 1e-12)
+    return scores
+
+
+def _term_coverage(query: str, texts: List[str]) -> np.ndarray:
+    """IDF-weighted share of the query terms found in each text"""
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return np.zeros(len(texts), dtype=np.float32)
+    present = np.array([[term in found for term in terms] for found in map(set, map(tokenize, texts))], dtype=bool)
+    frequency = present.sum(axis=0)
+    # Same IDF formula as BM25 search
+    idf = np.log(1 + (len(texts) - frequency + 0.5) / (frequency + 0.5)).astype(np.float32)
+    return present @ idf / idf.sum()
+
@@ -0,0 +1,254 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from config import (
+    CHAT_SESSION_MAX_SESSIONS,
+    CHAT_SESSION_IDLE_SECONDS,
+    CHAT_SESSION_MAX_TURNS,
+    CHAT_SESSION_MAX_CHUNKS,
+    CHAT_SESSION_ANSWER_CHARS,
+    CHAT_SESSION_FOCUS_WEIGHT,
+    CHAT_SESSION_REUSE_SIMILARITY
+)
+
+
+@dataclass
+class ChatSession:
+    """History and retrieved chunks of one conversation"""
+    session_id: str
+    # (question, answer) pairs, oldest first; long answers are cut short
+    turns: Deque[Tuple[str, str]]
+    # chunk ID -> search result without its vector, least recently used first
+    chunks: "OrderedDict[str, Dict[str, Any]]"
+    # chunk ID -> normalized dense vector of the chunk
+    vectors: Dict[str, np.ndarray]
+    # Normalized embedding of the last question answered in the session
+    last_query_vector: Optional[np.ndarray]
+    # Retrieval options of that question
+    last_scope: Optional[str]
+    last_used: float
+
+    def history(self) -> List[Tuple[str, str]]:
+        """Earlier (question, answer) pairs for the prompt"""
+        return list(self.turns)
+
+
+class SessionStore:
+    """
+    In-memory store of chat sessions.
+
+    A session keeps its last turns and the chunks retrieved for them,
+    together with their vectors, so follow-up questions can be searched in
+    the context of the conversation and earlier chunks reused without
+    another search. Memory is bounded: sessions idle for longer than the
+    configured time expire, the least recently used session is evicted
+    beyond the session limit, and every session keeps a fixed number of
+    turns and chunks.
+    """
+    # Singleton instance
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SessionStore, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        """Set up the empty store"""
+        # Only initialize once
+        if self._initialized:
+            return
+
+        self.max_sessions = CHAT_SESSION_MAX_SESSIONS
+        self.idle_seconds = CHAT_SESSION_IDLE_SECONDS
+        self.max_turns = CHAT_SESSION_MAX_TURNS
+        self.max_chunks = CHAT_SESSION_MAX_CHUNKS
+        self.answer_chars = CHAT_SESSION_ANSWER_CHARS
+        self.focus_weight = CHAT_SESSION_FOCUS_WEIGHT
+        self.reuse_similarity = CHAT_SESSION_REUSE_SIMILARITY
+
+        self._lock = threading.Lock()
+        # session ID -> session, least recently used first
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self.expired = 0
+        self.evicted = 0
+        self._initialized = True
+
+    def create(self, messages: Iterable[Tuple[str, str]] = ()) -> ChatSession:
+        """
+        Start a session
+
+        Args:
+            messages: Earlier (role, content) messages of the conversation, if
+                the client had one before the session; user messages followed
+                by an assistant message become turns of the history
+
+        Returns:
+            The new session
+        """
+        session = ChatSession(
+            session_id=uuid.uuid4().hex,
+            turns=deque(maxlen=self.max_turns),
+            chunks=OrderedDict(),
+            vectors={},
+            last_query_vector=None,
+            last_scope=None,
+            last_used=time.time()
+        )
+        question = None
+        for role, content in messages:
+            if role == "user":
+                question = content
+            elif role == "assistant" and question is not None:
+                session.turns.append((question, content[:self.answer_chars]))
+                question = None
+
+        with self._lock:
+            self._expire(session.last_used)
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+            self._sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        """Return a session and mark it as used, or None if it is unknown or expired"""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = now
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        """End a session; returns False if it did not exist"""
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def search_vector(self, session: ChatSession, query_vector: List[float]) -> List[float]:
+        """
+        Vector to search with for a question: its embedding blended with the
+        previous question's, so a follow-up such as "and what about section
+        3?" stays on the topic of the conversation
+        """
+        vector = _normalize(query_vector)
+        if session.last_query_vector is None:
+            return query_vector
+        return _normalize(vector + self.focus_weight * session.last_query_vector).tolist()
+
+    def reusable(self, session: ChatSession, query_vector: List[float], scope: str) -> bool:
+        """Check whether a question repeats the previous one closely enough to answer it from the session's chunks"""
+        if session.last_query_vector is None or session.last_scope != scope or not session.chunks:
+            return False
+        return float(_normalize(query_vector) @ session.last_query_vector) >= self.reuse_similarity
+
+    def related_chunks(
+        self,
+        session: ChatSession,
+        vector: List[float],
+        limit: int,
+        scope: str,
+        exclude: Iterable[str] = ()
+    ) -> List[Dict[str, Any]]:
+        """
+        The session's chunks most similar to a vector
+
+        Args:
+            session: Chat session
+            vector: Query or search vector
+            limit: Maximum number of chunks
+            scope: Retrieval options of the request; chunks retrieved with
+                other options (e.g. other filters) are not returned
+            exclude: IDs of chunks to leave out
+
+        Returns:
+            Search results with their vector, cosine similarity as
+            "similarity" and "score", best first
+        """
+        with self._lock:
+            if session.last_scope != scope:
+                return []
+            excluded = set(exclude)
+            ids = [chunk_id for chunk_id in session.chunks if chunk_id not in excluded]
+            if not ids or limit <= 0:
+                return []
+            matrix = np.stack([session.vectors[chunk_id] for chunk_id in ids])
+            chunks = [session.chunks[chunk_id] for chunk_id in ids]
+        scores = matrix @ _normalize(vector)
+        return [
+            {**chunks[i], "vector": matrix[i].tolist(), "similarity": float(scores[i]), "score": float(scores[i])}
+            for i in np.argsort(-scores)[:limit]
+        ]
+
+    def record_turn(
+        self,
+        session: ChatSession,
+        question: str,
+        query_vector: List[float],
+        scope: str,
+        answer: str,
+        search_results: List[Dict[str, Any]]
+    ) -> None:
+        """
+        Add an answered question to a session
+
+        Args:
+            session: Chat session
+            question: The question
+            query_vector: Its embedding
+            scope: Retrieval options of the request
+            answer: Generated answer
+            search_results: Chunks the answer was generated from; those with a
+                "vector" are kept for later turns
+        """
+        with self._lock:
+            session.turns.append((question, answer[:self.answer_chars]))
+            if session.last_scope != scope:
+                # Chunks found with other filters or options must not leak into this scope
+                session.chunks.clear()
+                session.vectors.clear()
+            for result in search_results:
+                if result.get("vector") is None:
+                    continue
+                session.chunks[result["id"]] = {key: value for key, value in result.items() if key != "vector"}
+                session.chunks.move_to_end(result["id"])
+                session.vectors[result["id"]] = _normalize(result["vector"])
+            while len(session.chunks) > self.max_chunks:
+                chunk_id, _ = session.chunks.popitem(last=False)
+                del session.vectors[chunk_id]
+            session.last_query_vector = _normalize(query_vector)
+            session.last_scope = scope
+            session.last_used = time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of sessions and the expiry and eviction counters"""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+    def _expire(self, now: float) -> None:
+        # Sessions are in least recently used order, so the idle ones come first
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_used <= self.idle_seconds:
+                break
+            self._sessions.popitem(last=False)
+            self.expired += 1
+
+
+def _normalize(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm > 0 else array
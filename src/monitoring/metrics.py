@@ -0,0 +1,218 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from 1 ms (cached lookups) to 60 s (large embedding batches)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Every metric, in definition order, for render()
+_REGISTRY: List["_Metric"] = []
+
+# Stage timings of the current request, in milliseconds, inside collect_timings()
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+class _Metric:
+    """Named metric with optional labels, exported in the Prometheus text format"""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, e.g. of tokens or retries"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Add to the count of the given label values"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Current count of the given label values"""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{self._labels(key)} {_number(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values, e.g. latencies, in cumulative buckets"""
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (count per bucket, with +Inf last; sum)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record one observation for the given label values"""
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of a block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{self.name}_bucket{self._labels(key, (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# Pipeline stages: extract, chunk, embed, upsert, search, rerank, context, completion
+STAGE_SECONDS = Histogram(
+    "talktofiles_stage_duration_seconds", "Time spent in each ingestion and query pipeline stage", ["stage"]
+)
+QDRANT_SEARCH_SECONDS = Histogram(
+    "talktofiles_qdrant_search_duration_seconds",
+    "Latency of Qdrant search calls by retriever (dense, sparse or subset for document-restricted searches)",
+    ["retriever", "batch"]
+)
+TIME_TO_FIRST_TOKEN_SECONDS = Histogram(
+    "talktofiles_time_to_first_token_seconds", "Time from request to the first streamed answer token"
+)
+OPENAI_TOKENS = Counter(
+    "talktofiles_openai_tokens_total", "Tokens sent to or generated by Azure OpenAI", ["type"]
+)
+EMBEDDING_BATCHES = Counter(
+    "talktofiles_embedding_batches_total", "Embedding requests sent to the provider"
+)
+EMBEDDING_RETRIES = Counter(
+    "talktofiles_embedding_retries_total",
+    "Embedding requests retried, by HTTP status (none for connection errors)",
+    ["status"]
+)
+QDRANT_UPSERT_RETRIES = Counter(
+    "talktofiles_qdrant_upsert_retries_total", "Qdrant upsert batches retried after a transient error"
+)
+CACHE_REQUESTS = Counter(
+    "talktofiles_cache_requests_total", "Embedding and answer cache lookups", ["cache", "result"]
+)
+
+
+def record(stage: str, seconds: float) -> None:
+    """Record the duration of a pipeline stage"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds * 1000
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    Time a block as a pipeline stage, in the stage histogram and, inside
+    collect_timings(), in the current request's breakdown
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+@contextmanager
+def collect_timings() -> Iterator[Dict[str, float]]:
+    """
+    Collect the stage timings of the current request. Tasks and worker
+    threads started inside the block add to the same breakdown.
+
+    Yields:
+        Dictionary of stage -> milliseconds, filled as stages complete
+    """
+    timings: Dict[str, float] = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+class IterationTimer:
+    """Iterator wrapper adding up the time spent producing items, e.g. pages being extracted"""
+
+    def __init__(self, iterable: Iterable):
+        self._iterator = iter(iterable)
+        self.seconds = 0.0
+
+    def __iter__(self) -> "IterationTimer":
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            return next(self._iterator)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    return "\n".join(line for metric in _REGISTRY for line in metric.render()) + "\n"